@@ -9,26 +9,42 @@ from flask_compress import Compress
 # from werkzeug.datastructures import FileStorage
 # from flask_uploads import UploadSet, configure_uploads, IMAGES
 
-db = SQLAlchemy()
+# Reads of ``replica_reads`` views go to DB_REPLICA_URLS (app.replicas).
+from .replicas import RoutingSession
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-cache = Cache()
+# ``{% cache %}`` is provided by app.fragment_cache (tagged invalidation).
+cache = Cache(with_jinja2_ext=False)
 assets = Environment()
 migrate = Migrate()
 compress = Compress()
 # photos = UploadSet('photos', IMAGES)
 
-def create_app():
+def create_app(lazy_admin=None, parent=None):
     app = Flask(__name__)
 
-    # Load config from config.py
-    app.config.from_object('config.Config')
-
-    db.init_app(app)  # Initialize SQLAlchemy with the app
+    from . import database
+    if parent is None:
+        # Load config from config.py
+        app.config.from_object('config.Config')
+        # Pool options for DB_PROFILE; Flask-SQLAlchemy reads them in db.init_app.
+        database.configure(app)
+        db.init_app(app)  # Initialize SQLAlchemy with the app
+        cache.init_app(app)
+        migrate.init_app(app, db)
+    else:
+        # The deferred admin app (app.lazy_admin) reuses the public app's
+        # config and extension state: engines and pools, replicas, cache
+        # backend, ingest flusher, live broker.  The init_app calls below
+        # only add its own request hooks and template globals.
+        app.config = parent.config
+        app.extensions = parent.extensions
+        database.share_engines(parent, app)
+    if lazy_admin is None:
+        lazy_admin = app.config['LAZY_ADMIN_BLUEPRINT']
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
-    cache.init_app(app)
     assets.init_app(app)
-    migrate.init_app(app, db)
     compress.init_app(app)
     # configure_uploads(app, photos)
 
@@ -36,15 +52,65 @@ def create_app():
     css_bundle = Bundle('css/bootstrap.min.css', 'css/style.css', filters='cssmin', output='gen/packed.css')
     js_bundle = Bundle('js/bootstrap.bundle.min.js', 'js/script.js', filters='jsmin', output='gen/packed.js')
 
-    assets.register('css_all', css_bundle)
-    assets.register('js_all', js_bundle)
+    # The asset environment is module-global; a second create_app() in the
+    # same process (lazy admin app, benchmarks) must not re-register.
+    if 'css_all' not in assets:
+        assets.register('css_all', css_bundle)
+        assets.register('js_all', js_bundle)
+
+    # First, so its request hooks wrap everything registered after it.
+    from . import sql_profiler
+    sql_profiler.init_app(app)
+
+    from . import metrics
+    metrics.init_app(app)
+    database.init_app(app)
+
+    from . import replicas
+    replicas.init_app(app)
+
+    # After compress.init_app: it wraps the Flask-Compress after_request hook.
+    from . import tracing
+    tracing.init_app(app)
+
+    from . import css_purge
+    css_purge.init_app(app)
+
+    from . import service_worker
+    service_worker.init_app(app)
+
+    from . import template_cache
+    template_cache.init_app(app)
+
+    from . import fragment_cache
+    fragment_cache.init_app(app)
+
+    from . import ingest_queue
+    ingest_queue.init_app(app)
+
+    from . import live
+    live.init_app(app)
+
+    from . import customers
+    customers.init_app(app)
+
+    if parent is None:
+        from .commands import register_commands
+        register_commands(app)
 
     from .routes import main
     from .auth import auth
-    from .admin_routes import admin
+    from .api import api
     app.register_blueprint(main)
     app.register_blueprint(auth)
-    app.register_blueprint(admin, url_prefix='/admin')
+    app.register_blueprint(api, url_prefix='/api')
+    if lazy_admin:
+        # Admin routes, forms and their dependencies load on the first /admin hit.
+        from .lazy_admin import LazyAdminDispatcher
+        app.wsgi_app = LazyAdminDispatcher(app, lambda: create_app(lazy_admin=False, parent=app))
+    else:
+        from .admin_routes import admin
+        app.register_blueprint(admin, url_prefix='/admin')
 
     @login_manager.user_loader
     def load_user(user_id):
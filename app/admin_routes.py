@@ -1,12 +1,13 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 from io import BytesIO
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, send_file, Response, current_app
+from flask import (
+    Blueprint, render_template, redirect, url_for, flash, request, send_file, Response, current_app, jsonify,
+    stream_with_context, abort,
+)
 from flask_login import login_required, current_user
-from sqlalchemy import func
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import joinedload, selectinload
 import bleach
 
 from .models import (
@@ -17,6 +18,8 @@ from .models import (
     Banner,
     FAQ,
     Query,
+    ArchivedQuery,
+    Customer,
     QueryResponse,
     QueryResponseTemplate,
     Testimonial,
@@ -39,28 +42,39 @@ from .forms import (
     QueryResponseForm,
     QueryTemplateForm,
     QueryEscalationForm,
+    QueryBulkActionForm,
+    ArchiveRestoreForm,
+    SQLProfileResetForm,
 )
+from .bulk_actions import BulkActionError, apply_bulk_action
+from .customers import phone_search_key
+from .fragment_cache import invalidate_fragments
+from . import archive, conversation, live, sql_profiler
+from .outbox import queue_query_email
+from .replicas import replica_reads
+from .sla import sla_state_for
+from .tags import has_tag, normalize_tag, tag_facets
 
 
 admin = Blueprint('admin', __name__)
 
 
-def send_query_email(query_obj, subject, body, attachments=None):
-    """
-    Placeholder email sender that logs the outbound message.
-    Replace with Flask-Mail / external provider when ready.
-    """
-    current_app.logger.info(
-        "Sending email to %s (%s) | Subject: %s | Attachments: %s",
-        query_obj.customer_name,
-        query_obj.customer_email,
-        subject,
-        attachments or [],
-    )
+def _send_excel(data, sheet_name, download_name):
+    # pandas is only needed for exports; importing it here keeps it out of
+    # worker start-up.
+    import pandas as pd
+
+    df = pd.DataFrame(data)
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name=sheet_name)
+    output.seek(0)
+    return send_file(output, download_name=download_name, as_attachment=True)
 
 
 @admin.route('/')
 @login_required
+@replica_reads
 def dashboard():
     packages = Package.query.all()
     events = Event.query.all()
@@ -81,25 +95,12 @@ def dashboard():
     dest_counts = [d[1] for d in destination_counts]
 
     # Query analytics
-    now = datetime.utcnow()
     query_counts = db.session.query(Query.status, func.count(Query.id)).group_by(Query.status).all()
     status_labels = [qc[0] for qc in query_counts]
     status_counts = [qc[1] for qc in query_counts]
     total_queries = sum(status_counts)
-    overdue_queries = (
-        Query.query.filter(
-            Query.sla_deadline != None,  # noqa: E711
-            Query.sla_deadline < now,
-            Query.status.notin_(('Resolved', 'Closed')),
-        ).count()
-    )
-    due_soon_queries = (
-        Query.query.filter(
-            Query.sla_deadline != None,  # noqa: E711
-            Query.sla_deadline.between(now, now + timedelta(hours=2)),
-            Query.status.notin_(('Resolved', 'Closed')),
-        ).count()
-    )
+    overdue_queries = Query.query.filter(Query.sla_state == 'overdue').count()
+    due_soon_queries = Query.query.filter(Query.sla_state == 'due_soon').count()
     unassigned_queries = Query.query.filter(Query.assigned_staff_id.is_(None)).count()
     query_type_rows = (
         db.session.query(Query.query_type, func.count(Query.id))
@@ -160,76 +161,92 @@ def dashboard():
                          staff_performance=staff_performance)
 
 # Query inbox route with filters and search
-@admin.route('/queries')
-@login_required
-def query_inbox():
-    from sqlalchemy import or_
+def _inbox_filters(args, now, model=Query):
+    """SQL conditions for the inbox filter in ``args`` (shared with bulk actions).
 
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 15, type=int)
-    status = request.args.get('status')
-    query_type = request.args.get('query_type')
-    priority = request.args.get('priority')
-    assigned_staff_id = request.args.get('assigned_staff')
-    search = request.args.get('search')
-    from_date = request.args.get('from_date')
-    to_date = request.args.get('to_date')
-    sla_filter = request.args.get('sla', 'all')
-
-    now = datetime.utcnow()
-    query = Query.query.options(joinedload(Query.assigned_staff))
+    ``model`` is ``Query`` or ``ArchivedQuery``, which has the same columns.
+    """
+    conditions = []
+    # Invalid values are reported once, by the live filter.
+    warn = flash if model is Query else (lambda message, category: None)
+    status = args.get('status')
+    query_type = args.get('query_type')
+    priority = args.get('priority')
+    assigned_staff_id = args.get('assigned_staff')
+    search = args.get('search')
+    from_date = args.get('from_date')
+    to_date = args.get('to_date')
+    sla_filter = args.get('sla', 'all')
 
     if status:
-        query = query.filter(Query.status == status)
+        conditions.append(model.status == status)
     if query_type:
-        query = query.filter(Query.query_type.ilike(f'%{query_type}%'))
+        conditions.append(model.query_type.ilike(f'%{query_type}%'))
     if priority:
-        query = query.filter(Query.priority == priority)
+        conditions.append(model.priority == priority)
     if assigned_staff_id:
         try:
             assigned_staff_value = int(assigned_staff_id)
-            query = query.filter(Query.assigned_staff_id == assigned_staff_value)
+            conditions.append(model.assigned_staff_id == assigned_staff_value)
         except (TypeError, ValueError):
-            flash('Invalid staff filter supplied.', 'warning')
+            warn('Invalid staff filter supplied.', 'warning')
     if from_date:
         try:
             start_dt = datetime.strptime(from_date, '%Y-%m-%d')
-            query = query.filter(Query.created_at >= start_dt)
+            conditions.append(model.created_at >= start_dt)
         except ValueError:
-            flash('Invalid start date filter', 'warning')
+            warn('Invalid start date filter', 'warning')
     if to_date:
         try:
             end_dt = datetime.strptime(to_date, '%Y-%m-%d') + timedelta(days=1)
-            query = query.filter(Query.created_at < end_dt)
+            conditions.append(model.created_at < end_dt)
         except ValueError:
-            flash('Invalid end date filter', 'warning')
-    if sla_filter == 'overdue':
-        query = query.filter(
-            Query.sla_deadline != None,  # noqa: E711
-            Query.sla_deadline < now,
-            Query.status.notin_(('Resolved', 'Closed')),
-        )
-    elif sla_filter == 'due_soon':
-        query = query.filter(
-            Query.sla_deadline != None,  # noqa: E711
-            Query.sla_deadline.between(now, now + timedelta(hours=2)),
-            Query.status.notin_(('Resolved', 'Closed')),
-        )
+            warn('Invalid end date filter', 'warning')
+    if sla_filter in ('overdue', 'due_soon'):
+        conditions.append(model.sla_state == sla_filter)
     elif sla_filter == 'met':
-        query = query.filter(
-            Query.sla_deadline != None,  # noqa: E711
-            Query.sla_deadline >= now,
-            Query.status.in_(('Responded', 'Resolved', 'Closed')),
-        )
+        conditions.extend([
+            model.sla_deadline != None,  # noqa: E711
+            model.sla_deadline >= now,
+            model.status.in_(('Responded', 'Resolved', 'Closed')),
+        ])
+    for tag in args.getlist('tag'):
+        if normalize_tag(tag):
+            conditions.append(has_tag(normalize_tag(tag)) if model is Query
+                              else archive.archived_has_tag(normalize_tag(tag)))
     if search:
-        query = query.filter(
-            or_(
-                Query.customer_name.ilike(f'%{search}%'),
-                Query.customer_email.ilike(f'%{search}%'),
-                Query.ticket_number.ilike(f'%{search}%'),
-                Query.message.ilike(f'%{search}%'),
-            )
-        )
+        matches = [
+            model.customer_name.ilike(f'%{search}%'),
+            model.customer_email.ilike(f'%{search}%'),
+            model.ticket_number.ilike(f'%{search}%'),
+            model.message.ilike(f'%{search}%'),
+        ]
+        phone = phone_search_key(search)
+        if phone:
+            # "+91 98765-43210" finds the customer stored as "+919876543210".
+            matches.append(model.customer_id.in_(
+                select(Customer.id).where(Customer.phone_normalized == phone)))
+        conditions.append(or_(*matches))
+    return conditions
+
+
+@admin.route('/queries')
+@login_required
+def query_inbox():
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 15, type=int)
+    status = request.args.get('status')
+    query_type = request.args.get('query_type')
+    priority = request.args.get('priority')
+    assigned_staff_id = request.args.get('assigned_staff')
+    search = request.args.get('search')
+    from_date = request.args.get('from_date')
+    to_date = request.args.get('to_date')
+    sla_filter = request.args.get('sla', 'all')
+
+    now = datetime.utcnow()
+    conditions = _inbox_filters(request.args, now)
+    query = Query.query.options(joinedload(Query.assigned_staff), selectinload(Query.tags)).filter(*conditions)
 
     query = query.order_by(Query.priority.desc(), Query.created_at.desc())
 
@@ -246,17 +263,24 @@ def query_inbox():
     priority_breakdown = dict(db.session.query(Query.priority, func.count(Query.id)).group_by(Query.priority).all())
     total_tickets = sum(status_breakdown.values()) if status_breakdown else 0
     total_priority = sum(priority_breakdown.values()) if priority_breakdown else 0
+    include_archived = request.args.get('include_archived') == '1'
+    archived_pagination = None
+    if include_archived:
+        archived_pagination = (
+            ArchivedQuery.query.options(joinedload(ArchivedQuery.assigned_staff))
+            .filter(*_inbox_filters(request.args, now, ArchivedQuery))
+            .order_by(ArchivedQuery.created_at.desc())
+            .paginate(page=request.args.get('archived_page', 1, type=int), per_page=per_page, error_out=False)
+        )
+    sla_states = dict(
+        db.session.query(Query.sla_state, func.count(Query.id))
+        .filter(Query.sla_state.in_(('overdue', 'due_soon')))
+        .group_by(Query.sla_state)
+        .all()
+    )
     sla_overview = {
-        'overdue': Query.query.filter(
-            Query.sla_deadline != None,  # noqa: E711
-            Query.sla_deadline < now,
-            Query.status.notin_(('Resolved', 'Closed')),
-        ).count(),
-        'due_soon': Query.query.filter(
-            Query.sla_deadline != None,  # noqa: E711
-            Query.sla_deadline.between(now, now + timedelta(hours=2)),
-            Query.status.notin_(('Resolved', 'Closed')),
-        ).count(),
+        'overdue': sla_states.get('overdue', 0),
+        'due_soon': sla_states.get('due_soon', 0),
         'met': Query.query.filter(
             Query.sla_deadline != None,  # noqa: E711
             Query.sla_deadline >= now,
@@ -284,31 +308,110 @@ def query_inbox():
         sla_overview=sla_overview,
         total_tickets=total_tickets,
         total_priority=total_priority,
+        include_archived=include_archived,
+        archived_pagination=archived_pagination,
+        live_cursor=live.current_cursor(),
+        tag_facets=tag_facets(conditions),
+        active_tags=[normalize_tag(tag) for tag in request.args.getlist('tag') if normalize_tag(tag)],
+        filter_args={key: value for key, value in request.args.items() if key not in ('page', 'archived_page', 'tag')},
+        bulk_form=_bulk_form(staff_list),
     )
 
+
+def _bulk_form(staff_list):
+    form = QueryBulkActionForm()
+    form.assigned_staff_id.choices = [(0, 'Unassigned')] + [(staff.id, staff.username) for staff in staff_list]
+    return form
+
+
+@admin.route('/queries/bulk', methods=['POST'])
+@login_required
+def query_inbox_bulk():
+    form = _bulk_form(User.query.order_by(User.username).all())
+    # The inbox posts here with its filter in the query string.
+    filters = request.args.to_dict(flat=False)
+    filters.pop('page', None)
+    back = redirect(url_for('admin.query_inbox', **filters))
+    if not form.validate_on_submit():
+        flash('Bulk action was not applied: ' + '; '.join(
+            f'{field}: {", ".join(errors)}' for field, errors in form.errors.items()), 'danger')
+        return back
+
+    now = datetime.utcnow()
+    if form.scope.data == 'filter':
+        conditions = _inbox_filters(request.args, now)
+        if not conditions and not form.older_than_days.data:
+            flash('Choose a filter before applying an action to all matching tickets.', 'warning')
+            return back
+    else:
+        ids = [int(value) for value in request.form.getlist('query_ids') if value.isdigit()]
+        if not ids:
+            flash('Select at least one ticket.', 'warning')
+            return back
+        conditions = [Query.id.in_(ids)]
+    if form.older_than_days.data:
+        conditions.append(Query.updated_at < now - timedelta(days=form.older_than_days.data))
+
+    action = form.action.data
+    value = {
+        'assign': form.assigned_staff_id.data,
+        'status': form.status.data,
+        'priority': form.priority.data,
+        'tag': form.tag.data,
+        'untag': form.tag.data,
+    }.get(action)
+    try:
+        changed = apply_bulk_action(action, value, and_(*conditions), staff_id=current_user.id, now=now)
+    except BulkActionError as exc:
+        flash(str(exc), 'danger')
+        return back
+    flash(f'{dict(form.action.choices)[action]} applied to {changed} ticket(s).' if changed
+          else 'No tickets needed changing.', 'success' if changed else 'info')
+    return back
+
+
+def _live_cursor():
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    try:
+        return max(int(cursor), 0)
+    except (TypeError, ValueError):
+        return live.current_cursor()
+
+
+@admin.route('/queries/stream')
+@login_required
+def query_inbox_stream():
+    response = Response(stream_with_context(live.stream(_live_cursor())), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@admin.route('/queries/changes')
+@login_required
+def query_inbox_changes():
+    # Long-poll fallback for clients or proxies that cannot hold an event stream open.
+    cursor = _live_cursor()
+    timeout = min(request.args.get('timeout', current_app.config['LIVE_INBOX_LONG_POLL_SECONDS'], type=float),
+                  current_app.config['LIVE_INBOX_LONG_POLL_SECONDS'])
+    events, reset = live.wait_for_events(cursor, timeout)
+    if events:
+        cursor = events[-1]['id']
+    response = jsonify(cursor=cursor, events=events, reset=reset)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 # Query detail route to view and update query
 @admin.route('/query/<int:query_id>', methods=['GET', 'POST'])
 @login_required
 def query_detail(query_id):
-    query_obj = (
-        Query.query.options(
-            joinedload(Query.responses).joinedload(QueryResponse.staff),
-            joinedload(Query.assigned_staff),
-        )
-        .filter_by(id=query_id)
-        .first_or_404()
-    )
+    query_obj = Query.query.options(joinedload(Query.assigned_staff)).filter_by(id=query_id).first()
+    if query_obj is None:
+        return _archived_query_detail(query_id)
     staff_list = User.query.order_by(User.username).all()
     templates = QueryResponseTemplate.query.filter_by(is_active=True).order_by(QueryResponseTemplate.name).all()
-    related_queries = (
-        Query.query.filter(
-            Query.customer_email == query_obj.customer_email,
-            Query.id != query_obj.id,
-        )
-        .order_by(Query.created_at.desc())
-        .limit(5)
-        .all()
-    )
+    customer = query_obj.customer
+    related_queries = _related_queries(customer, query_obj.id)
 
     update_form = QueryUpdateForm(obj=query_obj)
     update_form.assigned_staff_id.choices = [(0, 'Unassigned')] + [(staff.id, staff.username) for staff in staff_list]
@@ -334,6 +437,7 @@ def query_detail(query_id):
                 query_obj.first_response_at = datetime.utcnow()
             if query_obj.status in ('Resolved', 'Closed'):
                 query_obj.resolved_at = datetime.utcnow()
+            query_obj.sla_state = sla_state_for(query_obj.status, query_obj.sla_deadline)
             db.session.commit()
             flash('Query updated successfully.', 'success')
             return redirect(url_for('admin.query_detail', query_id=query_id))
@@ -358,7 +462,6 @@ def query_detail(query_id):
                 used_template_id=template_id,
                 status_after=query_obj.status,
             )
-            query_obj.responses.append(response_entry)
             query_obj.last_contact_channel = response_form.channel.data
             query_obj.last_response_summary = response_form.body.data[:500]
             if not query_obj.first_response_at:
@@ -366,10 +469,10 @@ def query_detail(query_id):
             query_obj.status = 'Responded' if query_obj.status in ('Open', 'Pending', 'In Progress') else query_obj.status
             query_obj.updated_at = datetime.utcnow()
             db.session.add(response_entry)
-            db.session.commit()
-
             if response_form.send_email.data and not response_form.log_internal_note.data:
-                send_query_email(query_obj, response_entry.subject, response_entry.body, attachments)
+                # Delivered by the outbox workers (``flask send-outbox``), not in this request.
+                queue_query_email(query_obj, response_entry, response_entry.subject, response_entry.body, attachments)
+            db.session.commit()
 
             flash('Response recorded successfully.', 'success')
             return redirect(url_for('admin.query_detail', query_id=query_id))
@@ -396,9 +499,119 @@ def query_detail(query_id):
         escalation_form=escalation_form,
         templates=templates,
         related_queries=related_queries,
+        customer=customer,
         templates_payload=templates_payload,
+        thread=conversation.load_thread(query_obj.id, before=request.args.get('before')),
+        query_id=query_obj.id,
+    )
+
+
+def _related_queries(customer, exclude_id, limit=5):
+    """The customer's latest other tickets, live and archived."""
+    if customer is None:
+        return []
+    live_rows = customer.queries.filter(Query.id != exclude_id).order_by(Query.created_at.desc()).limit(limit).all()
+    archived_rows = (
+        ArchivedQuery.query.filter(ArchivedQuery.customer_id == customer.id, ArchivedQuery.id != exclude_id)
+        .order_by(ArchivedQuery.created_at.desc()).limit(limit).all()
+    )
+    return sorted(live_rows + archived_rows, key=lambda row: row.created_at, reverse=True)[:limit]
+
+
+def _archived_query_detail(query_id):
+    archived = (
+        ArchivedQuery.query
+        .options(joinedload(ArchivedQuery.assigned_staff), selectinload(ArchivedQuery.responses))
+        .filter_by(id=query_id)
+        .first_or_404()
+    )
+    customer = db.session.get(Customer, archived.customer_id) if archived.customer_id else None
+    return render_template(
+        'admin/query_archived.html',
+        query=archived,
+        customer=customer,
+        related_queries=_related_queries(customer, archived.id),
+        restore_form=ArchiveRestoreForm(),
     )
 
+
+@admin.route('/sql-profile')
+@login_required
+def sql_profile():
+    window = request.args.get('window', current_app.config['SQL_PROFILER_WINDOW_SECONDS'], type=int)
+    return render_template(
+        'admin/sql_profile.html',
+        enabled=current_app.config['SQL_PROFILER'],
+        window=window,
+        endpoints=sql_profiler.worst_endpoints(window),
+        reset_form=SQLProfileResetForm(),
+    )
+
+
+@admin.route('/sql-profile/reset', methods=['POST'])
+@login_required
+def sql_profile_reset():
+    if SQLProfileResetForm().validate_on_submit():
+        sql_profiler.request_log.clear()
+    else:
+        flash('The reset request expired; please try again.', 'danger')
+    return redirect(url_for('admin.sql_profile'))
+
+
+@admin.route('/query/<int:query_id>/restore', methods=['POST'])
+@login_required
+def query_restore(query_id):
+    if not ArchiveRestoreForm().validate_on_submit():
+        flash('The restore request expired; please try again.', 'danger')
+        return redirect(url_for('admin.query_detail', query_id=query_id))
+    try:
+        restored = archive.restore_query(query_id)
+    except archive.ArchiveError as exc:
+        flash(str(exc), 'danger')
+        return redirect(url_for('admin.query_detail', query_id=query_id))
+    if not restored:
+        abort(404)
+    flash('Ticket restored from the archive.', 'success')
+    return redirect(url_for('admin.query_detail', query_id=query_id))
+
+
+@admin.route('/customers/<int:customer_id>')
+@login_required
+def customer_detail(customer_id):
+    customer = db.get_or_404(Customer, customer_id)
+    page = request.args.get('page', 1, type=int)
+    pagination = (
+        customer.queries.options(joinedload(Query.assigned_staff))
+        .order_by(Query.created_at.desc())
+        .paginate(page=page, per_page=25, error_out=False)
+    )
+    archived_queries = (
+        ArchivedQuery.query.options(joinedload(ArchivedQuery.assigned_staff))
+        .filter_by(customer_id=customer.id)
+        .order_by(ArchivedQuery.created_at.desc())
+        .limit(50)
+        .all()
+    )
+    return render_template('admin/customer_detail.html', customer=customer, pagination=pagination,
+                           archived_queries=archived_queries)
+
+
+@admin.route('/query/<int:query_id>/responses')
+@login_required
+def query_thread(query_id):
+    # Fragment for the "Load older responses" button on the detail page.
+    thread = conversation.load_thread(query_id, before=request.args.get('before'))
+    return render_template('admin/query_thread.html', thread=thread, query_id=query_id)
+
+
+@admin.route('/query/<int:query_id>/responses/<int:response_id>')
+@login_required
+def query_response(query_id, response_id):
+    response = conversation.load_response(query_id, response_id)
+    if response is None:
+        abort(404)
+    return render_template('admin/query_response.html', response=response)
+
 # Query response templates management
 @admin.route('/query-templates', methods=['GET', 'POST'])
 @login_required
@@ -514,6 +727,7 @@ def new_package():
         )
         db.session.add(package)
         db.session.commit()
+        invalidate_fragments('packages')
         flash('Package added successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/package_form.html', form=form, title='Add Package')
@@ -599,6 +813,7 @@ def edit_package(id):
         package.map_location = form.map_location.data
         package.version = form.version.data
         db.session.commit()
+        invalidate_fragments('packages')
         flash('Package updated successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/package_form.html', form=form, title='Edit Package')
@@ -609,6 +824,7 @@ def delete_package(id):
     package = Package.query.get_or_404(id)
     db.session.delete(package)
     db.session.commit()
+    invalidate_fragments('packages')
     flash('Package deleted successfully!')
     return redirect(url_for('admin.dashboard'))
 
@@ -627,6 +843,7 @@ def new_event():
         )
         db.session.add(event)
         db.session.commit()
+        invalidate_fragments('events')
         flash('Event added successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/event_form.html', form=form, title='Add Event')
@@ -639,6 +856,7 @@ def edit_event(id):
     if form.validate_on_submit():
         form.populate_obj(event)
         db.session.commit()
+        invalidate_fragments('events')
         flash('Event updated successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/event_form.html', form=form, title='Edit Event')
@@ -649,12 +867,14 @@ def delete_event(id):
     event = Event.query.get_or_404(id)
     db.session.delete(event)
     db.session.commit()
+    invalidate_fragments('events')
     flash('Event deleted successfully!')
     return redirect(url_for('admin.dashboard'))
 
 # Bulk Import/Export
 @admin.route('/export/packages')
 @login_required
+@replica_reads
 def export_packages():
     packages = Package.query.all()
     data = [{
@@ -683,15 +903,11 @@ def export_packages():
         'map_location': p.map_location,
         'version': p.version
     } for p in packages]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Packages')
-    output.seek(0)
-    return send_file(output, download_name='packages.xlsx', as_attachment=True)
+    return _send_excel(data, 'Packages', 'packages.xlsx')
 
 @admin.route('/export/events')
 @login_required
+@replica_reads
 def export_events():
     events = Event.query.all()
     data = [{
@@ -702,15 +918,11 @@ def export_events():
         'image': e.image,
         'link': e.link
     } for e in events]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Events')
-    output.seek(0)
-    return send_file(output, download_name='events.xlsx', as_attachment=True)
+    return _send_excel(data, 'Events', 'events.xlsx')
 
 @admin.route('/export/contacts')
 @login_required
+@replica_reads
 def export_contacts():
     contacts = Contact.query.all()
     data = [{
@@ -721,12 +933,7 @@ def export_contacts():
         'message': c.message,
         'created_at': c.created_at
     } for c in contacts]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Contacts')
-    output.seek(0)
-    return send_file(output, download_name='contacts.xlsx', as_attachment=True)
+    return _send_excel(data, 'Contacts', 'contacts.xlsx')
 
 # Package duplication
 @admin.route('/package/<int:id>/duplicate')
@@ -760,6 +967,7 @@ def duplicate_package(id):
     )
     db.session.add(new_package)
     db.session.commit()
+    invalidate_fragments('packages')
     flash('Package duplicated successfully!')
     return redirect(url_for('admin.dashboard'))
 
@@ -833,6 +1041,7 @@ def new_banner():
         )
         db.session.add(banner)
         db.session.commit()
+        invalidate_fragments('banners')
         flash('Banner added successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/banner_form.html', form=form, title='Add Banner')
@@ -845,6 +1054,7 @@ def edit_banner(id):
     if form.validate_on_submit():
         form.populate_obj(banner)
         db.session.commit()
+        invalidate_fragments('banners')
         flash('Banner updated successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/banner_form.html', form=form, title='Edit Banner')
@@ -855,6 +1065,7 @@ def delete_banner(id):
     banner = Banner.query.get_or_404(id)
     db.session.delete(banner)
     db.session.commit()
+    invalidate_fragments('banners')
     flash('Banner deleted successfully!')
     return redirect(url_for('admin.dashboard'))
 
@@ -873,6 +1084,7 @@ def new_faq():
         )
         db.session.add(faq)
         db.session.commit()
+        invalidate_fragments('faqs')
         flash('FAQ added successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/faq_form.html', form=form, title='Add FAQ')
@@ -885,6 +1097,7 @@ def edit_faq(id):
     if form.validate_on_submit():
         form.populate_obj(faq)
         db.session.commit()
+        invalidate_fragments('faqs')
         flash('FAQ updated successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/faq_form.html', form=form, title='Edit FAQ')
@@ -895,6 +1108,7 @@ def delete_faq(id):
     faq = FAQ.query.get_or_404(id)
     db.session.delete(faq)
     db.session.commit()
+    invalidate_fragments('faqs')
     flash('FAQ deleted successfully!')
     return redirect(url_for('admin.dashboard'))
 
@@ -914,6 +1128,7 @@ def new_testimonial():
         )
         db.session.add(testimonial)
         db.session.commit()
+        invalidate_fragments('testimonials')
         flash('Testimonial added successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/testimonial_form.html', form=form, title='Add Testimonial')
@@ -926,6 +1141,7 @@ def edit_testimonial(id):
     if form.validate_on_submit():
         form.populate_obj(testimonial)
         db.session.commit()
+        invalidate_fragments('testimonials')
         flash('Testimonial updated successfully!')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/testimonial_form.html', form=form, title='Edit Testimonial')
@@ -936,6 +1152,7 @@ def delete_testimonial(id):
     testimonial = Testimonial.query.get_or_404(id)
     db.session.delete(testimonial)
     db.session.commit()
+    invalidate_fragments('testimonials')
     flash('Testimonial deleted successfully!')
     return redirect(url_for('admin.dashboard'))
 
@@ -1032,12 +1249,7 @@ def export_pages():
         'created_at': p.created_at,
         'updated_at': p.updated_at
     } for p in pages]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Pages')
-    output.seek(0)
-    return send_file(output, download_name='pages.xlsx', as_attachment=True)
+    return _send_excel(data, 'Pages', 'pages.xlsx')
 
 @admin.route('/export/banners')
 @login_required
@@ -1053,12 +1265,7 @@ def export_banners():
         'order': b.order,
         'created_at': b.created_at
     } for b in banners]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Banners')
-    output.seek(0)
-    return send_file(output, download_name='banners.xlsx', as_attachment=True)
+    return _send_excel(data, 'Banners', 'banners.xlsx')
 
 @admin.route('/export/faqs')
 @login_required
@@ -1073,12 +1280,7 @@ def export_faqs():
         'order': f.order,
         'created_at': f.created_at
     } for f in faqs]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='FAQs')
-    output.seek(0)
-    return send_file(output, download_name='faqs.xlsx', as_attachment=True)
+    return _send_excel(data, 'FAQs', 'faqs.xlsx')
 
 @admin.route('/export/testimonials')
 @login_required
@@ -1094,12 +1296,7 @@ def export_testimonials():
         'is_active': t.is_active,
         'created_at': t.created_at
     } for t in testimonials]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Testimonials')
-    output.seek(0)
-    return send_file(output, download_name='testimonials.xlsx', as_attachment=True)
+    return _send_excel(data, 'Testimonials', 'testimonials.xlsx')
 
 @admin.route('/export/seoconfigs')
 @login_required
@@ -1111,12 +1308,7 @@ def export_seoconfigs():
         'value': s.value,
         'description': s.description
     } for s in seoconfigs]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='SEOConfigs')
-    output.seek(0)
-    return send_file(output, download_name='seoconfigs.xlsx', as_attachment=True)
+    return _send_excel(data, 'SEOConfigs', 'seoconfigs.xlsx')
 
 @admin.route('/export/languages')
 @login_required
@@ -1129,9 +1321,4 @@ def export_languages():
         'is_active': l.is_active,
         'is_default': l.is_default
     } for l in languages]
-    df = pd.DataFrame(data)
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Languages')
-    output.seek(0)
-    return send_file(output, download_name='languages.xlsx', as_attachment=True)
+    return _send_excel(data, 'Languages', 'languages.xlsx')
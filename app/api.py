@@ -0,0 +1,72 @@
+import hmac
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user
+from flask_wtf.csrf import validate_csrf
+from wtforms import ValidationError
+
+from . import archive
+from .bulk_ingest import BulkIngestError, ingest_queries, parse_payload, summarize
+from .sla import sweep
+
+api = Blueprint('api', __name__)
+
+
+# Content types a cross-site HTML form cannot send without a CORS preflight.
+SESSION_CONTENT_TYPES = ('application/json', 'application/x-ndjson', 'application/jsonlines')
+
+
+def _authorized():
+    """A configured ``Authorization: Bearer`` token, or a staff session on a JSON request with a CSRF token."""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        token = header[len('Bearer '):].strip()
+        return any(hmac.compare_digest(token, allowed) for allowed in current_app.config['INGEST_API_TOKENS'])
+    if not current_user.is_authenticated or request.mimetype not in SESSION_CONTENT_TYPES:
+        return False
+    # The session cookie rides along on cross-site requests; the token does not.
+    try:
+        validate_csrf(request.headers.get('X-CSRFToken'))
+    except ValidationError:
+        return False
+    return True
+
+
+@api.route('/queries/bulk', methods=['POST'])
+def bulk_create_queries():
+    if not _authorized():
+        return jsonify(error='Authentication required'), 401
+    try:
+        items = parse_payload(request.get_data(), request.mimetype)
+    except BulkIngestError as exc:
+        return jsonify(error=str(exc)), 400
+    limit = current_app.config['BULK_INGEST_MAX_ITEMS']
+    if len(items) > limit:
+        return jsonify(error=f'At most {limit} queries per request'), 413
+    results = ingest_queries(items, default_source=request.args.get('source'), channel=request.args.get('channel'))
+    return jsonify(summary=summarize(results), results=results)
+
+
+def _cron_authorized():
+    # Scheduler hook (e.g. Vercel Cron sends ``Authorization: Bearer $CRON_SECRET``).
+    secret = current_app.config['CRON_SECRET']
+    header = request.headers.get('Authorization', '')
+    return bool(secret) and hmac.compare_digest(header, f'Bearer {secret}')
+
+
+@api.route('/cron/sla-sweep', methods=['GET', 'POST'])
+def sla_sweep():
+    if not _cron_authorized():
+        return jsonify(error='Authentication required'), 401
+    return jsonify(sweep())
+
+
+@api.route('/cron/archive', methods=['GET', 'POST'])
+def archive_queries():
+    # A few batches per call; the next call resumes the same run.
+    if not _cron_authorized():
+        return jsonify(error='Authentication required'), 401
+    run = archive.latest_unfinished_run() or archive.start_run()
+    run = archive.run_archive(run, max_batches=current_app.config['ARCHIVE_CRON_MAX_BATCHES'], pause=0)
+    return jsonify(run=run.id, status=run.status, archived=run.archived_count, responses=run.response_count,
+                   last_query_id=run.last_query_id)
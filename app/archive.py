@@ -0,0 +1,218 @@
+"""
+Hot/cold archival of old closed tickets.
+
+Resolved and closed tickets whose last change is older than
+``ARCHIVE_AFTER_DAYS`` are moved, with their responses, from ``query`` and
+``query_response`` into ``query_archive`` and ``query_response_archive``,
+so the inbox, dashboard counts and SLA sweeps only scan live tickets.
+Archived rows keep their ids; tags are folded into ``tag_names``, outbox
+history is detached from the moved responses and the ``query_audit`` trail
+stays where it is.
+
+Each batch of ``ARCHIVE_BATCH_SIZE`` tickets is one transaction: copy with
+``INSERT ... SELECT``, delete the live rows, advance the ``ArchiveRun``
+checkpoint.  An interrupted run therefore loses nothing and
+``flask archive-queries --resume`` continues after the last committed
+batch with the same cutoff.  Rows are claimed with ``FOR UPDATE SKIP
+LOCKED`` on PostgreSQL so a ticket being edited is left for the next run,
+as are tickets with email still waiting in the outbox.
+
+Archived tickets stay readable: ``query_detail`` falls back to the archive
+for an unknown id, the inbox lists archive matches with "Include archived",
+customer counters count both tables and ``restore_query`` moves a ticket
+back when it needs work again.
+
+Run it with ``flask archive-queries`` (``--dry-run`` to preview) or from a
+scheduler with ``POST /api/cron/archive``.
+"""
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db, tracing
+from .live import record_event
+from .models import (
+    ArchiveRun, ArchivedQuery, ArchivedQueryResponse, OutboundEmail, Query, QueryResponse, Tag, query_tag,
+)
+from .sla import CLOSED_STATUSES
+from .sql_helpers import string_agg
+from .tags import link_tags
+
+
+class ArchiveError(RuntimeError):
+    """An archived ticket cannot be restored."""
+
+
+def default_cutoff(days=None, now=None):
+    days = days if days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    return (now or datetime.utcnow()) - timedelta(days=days)
+
+
+def _eligible(cutoff):
+    newest_response = select(func.max(QueryResponse.id)).scalar_subquery()
+    pending_email = (
+        select(OutboundEmail.id)
+        .join(QueryResponse, OutboundEmail.query_response_id == QueryResponse.id)
+        .where(QueryResponse.query_id == Query.id, OutboundEmail.status.in_(('pending', 'sending')))
+    )
+    return and_(
+        Query.status.in_(CLOSED_STATUSES),
+        func.coalesce(Query.updated_at, Query.resolved_at, Query.created_at) < cutoff,
+        ~pending_email.exists(),
+        # SQLite hands out max(id) + 1, so the newest rows stay live; an
+        # archived id must never be given to a new ticket or response.
+        Query.id < select(func.max(Query.id)).scalar_subquery(),
+        ~select(QueryResponse.id).where(QueryResponse.query_id == Query.id,
+                                        QueryResponse.id == newest_response).exists(),
+    )
+
+
+def preview(cutoff):
+    """What a run with ``cutoff`` would move: ticket and response counts and the date range."""
+    eligible = select(Query.id).where(_eligible(cutoff))
+    tickets, oldest, newest = db.session.execute(
+        select(func.count(Query.id), func.min(Query.created_at), func.max(Query.created_at))
+        .where(Query.id.in_(eligible))
+    ).one()
+    responses = db.session.execute(
+        select(func.count(QueryResponse.id)).where(QueryResponse.query_id.in_(eligible))
+    ).scalar()
+    return {'tickets': tickets, 'responses': responses, 'oldest': oldest, 'newest': newest}
+
+
+def _copy_columns(table):
+    return [column.name for column in table.columns]
+
+
+@tracing.traced('archive.batch', root=True)
+def _archive_batch(run, now):
+    """Move the next batch of ``run``; return the number of tickets moved."""
+    ids = db.session.execute(
+        select(Query.id)
+        .where(_eligible(run.cutoff), Query.id > run.last_query_id)
+        .order_by(Query.id)
+        .limit(run.batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        return 0
+    connection = db.session.connection()
+    query, response = Query.__table__, QueryResponse.__table__
+    tag_names = (
+        select(string_agg(connection, Tag.name))
+        .join(query_tag, query_tag.c.tag_id == Tag.id)
+        .where(query_tag.c.query_id == query.c.id)
+        .scalar_subquery()
+    )
+    archived_at = literal(now, db.DateTime)
+
+    connection.execute(insert(ArchivedQuery.__table__).from_select(
+        _copy_columns(query) + ['tag_names', 'archived_at'],
+        select(*query.columns, tag_names, archived_at).where(query.c.id.in_(ids)),
+    ))
+    responses = connection.execute(insert(ArchivedQueryResponse.__table__).from_select(
+        _copy_columns(response) + ['archived_at'],
+        select(*response.columns, archived_at).where(response.c.query_id.in_(ids)),
+    )).rowcount
+    moved_responses = select(response.c.id).where(response.c.query_id.in_(ids))
+    connection.execute(update(OutboundEmail.__table__)
+                       .where(OutboundEmail.query_response_id.in_(moved_responses))
+                       .values(query_response_id=None))
+    connection.execute(delete(query_tag).where(query_tag.c.query_id.in_(ids)))
+    connection.execute(delete(response).where(response.c.query_id.in_(ids)))
+    connection.execute(delete(query).where(query.c.id.in_(ids)))
+
+    run.last_query_id = ids[-1]
+    run.archived_count += len(ids)
+    run.response_count += responses
+    record_event('bulk', {'action': 'archive', 'count': len(ids), 'query_ids': ids})
+    db.session.commit()
+    return len(ids)
+
+
+def latest_unfinished_run():
+    return ArchiveRun.query.filter_by(status='running').order_by(ArchiveRun.id.desc()).first()
+
+
+def start_run(cutoff=None, batch_size=None):
+    """Open a new run; runs left unfinished are marked ``abandoned``."""
+    ArchiveRun.query.filter_by(status='running').update({'status': 'abandoned'})
+    run = ArchiveRun(cutoff=cutoff or default_cutoff(),
+                     batch_size=batch_size or current_app.config['ARCHIVE_BATCH_SIZE'])
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def run_archive(run, max_batches=None, pause=None, progress=None):
+    """Archive batches for ``run`` until nothing is eligible or ``max_batches`` ran.
+
+    ``pause`` seconds are slept between batches (``ARCHIVE_PAUSE`` by
+    default) to leave the database room for live traffic.
+    """
+    pause = pause if pause is not None else current_app.config['ARCHIVE_PAUSE']
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        if not _archive_batch(run, datetime.utcnow()):
+            run.status = 'done'
+            run.finished_at = datetime.utcnow()
+            db.session.commit()
+            break
+        batches += 1
+        if progress:
+            progress(run)
+        if pause:
+            time.sleep(pause)
+    return run
+
+
+def archived_has_tag(name):
+    """``has_tag`` for ``ArchivedQuery``."""
+    padded = literal(',') + func.coalesce(ArchivedQuery.tag_names, '') + literal(',')
+    return padded.contains(f',{name},', autoescape=True)
+
+
+def restore_query(query_id):
+    """Move an archived ticket and its responses back to the live tables; return whether it existed."""
+    archived = db.session.get(ArchivedQuery, query_id)
+    if archived is None:
+        return False
+    if db.session.get(Query, query_id) is not None:
+        raise ArchiveError(f'Ticket {query_id} exists in both the live and archive tables.')
+    # A replayed import or an older ticket-number collision may have taken its unique keys meanwhile.
+    clashes = []
+    if archived.ticket_number:
+        clashes.append(Query.ticket_number == archived.ticket_number)
+    if archived.external_id:
+        clashes.append(and_(Query.source == archived.source, Query.external_id == archived.external_id))
+    clash = db.session.execute(select(Query.id).where(or_(*clashes)).limit(1)).scalar() if clashes else None
+    if clash is not None:
+        raise ArchiveError(f'Ticket {query_id} cannot be restored: live ticket {clash} has the same '
+                           f'ticket number or source item.')
+    connection = db.session.connection()
+    query, response = Query.__table__, QueryResponse.__table__
+    archive, response_archive = ArchivedQuery.__table__, ArchivedQueryResponse.__table__
+    columns, response_columns = _copy_columns(query), _copy_columns(response)
+
+    # A fresh ``updated_at`` keeps the next run from archiving it again straight away.
+    restored = [literal(datetime.utcnow(), db.DateTime) if name == 'updated_at' else archive.c[name] for name in columns]
+    try:
+        connection.execute(insert(query).from_select(columns, select(*restored).where(archive.c.id == query_id)))
+    except IntegrityError as exc:
+        # Lost a race with a concurrent import of the same source item.
+        db.session.rollback()
+        raise ArchiveError(f'Ticket {query_id} cannot be restored: a live ticket now has the same '
+                           f'ticket number or source item.') from exc
+    connection.execute(insert(response).from_select(
+        response_columns,
+        select(*[response_archive.c[name] for name in response_columns]).where(response_archive.c.query_id == query_id),
+    ))
+    link_tags([(query_id, name) for name in archived.tag_list], connection)
+    connection.execute(delete(response_archive).where(response_archive.c.query_id == query_id))
+    connection.execute(delete(archive).where(archive.c.id == query_id))
+    record_event('bulk', {'action': 'restore', 'count': 1, 'query_ids': [query_id]})
+    db.session.commit()
+    return True
@@ -0,0 +1,126 @@
+"""
+Set-based bulk actions for the admin query inbox.
+
+``apply_bulk_action`` changes every ticket matching a condition (the
+selected ids, or the inbox filter) with two statements instead of one
+page load and ORM round trip per ticket:
+
+1. ``INSERT INTO query_audit ... SELECT`` writes one audit row per ticket
+   that will actually change, with its old and new value and a shared
+   ``batch_id``.  Tickets already in the target state are skipped.
+2. ``UPDATE query ... WHERE id IN (audited ids)`` applies the change to
+   exactly those tickets; tag and untag first insert into or delete from
+   ``query_tag`` for the same ids.
+
+Status changes keep the same bookkeeping as ``query_detail``:
+``first_response_at`` is set on the first move to Responded/Resolved,
+``resolved_at`` is stamped when a ticket is resolved or closed (kept if it
+already was) and cleared when it is reopened, and ``sla_state`` is cleared
+or recomputed in SQL, as are the affected customers' ticket counters.  The
+ORM hooks in ``app.live`` do not see Core updates, so the batch is
+published as a single ``bulk`` event.
+"""
+import uuid
+from datetime import datetime
+
+from sqlalchemy import String, case, cast, delete, func, insert, literal, select, update
+
+from . import db
+from .customers import refresh_counters
+from .live import record_event
+from .models import Query, QueryAudit, query_tag
+from .sla import CLOSED_STATUSES, sla_state_expression
+from .tags import ensure_tags, has_tag, normalize_tag, tag_id_for
+
+ACTIONS = ('assign', 'status', 'priority', 'tag', 'untag', 'close')
+
+
+class BulkActionError(ValueError):
+    """The requested action or value is not valid."""
+
+
+def _status_change(status, now):
+    values = {'status': status}
+    if status in ('Responded', 'Resolved'):
+        values['first_response_at'] = func.coalesce(Query.first_response_at, now)
+    if status in CLOSED_STATUSES:
+        # SET expressions see the row before the update, so this keeps the
+        # original resolution time for tickets moving Resolved -> Closed.
+        values['resolved_at'] = case((Query.status.in_(CLOSED_STATUSES), Query.resolved_at), else_=now)
+        values['sla_state'] = None
+    else:
+        values['resolved_at'] = None
+        values['sla_state'] = sla_state_expression(now)
+    return values
+
+
+def _plan(action, value, now):
+    """Return ``(field, old_value, new_value, changed_condition, values, link)`` for an action.
+
+    ``values`` are the ``query`` columns to set; ``link`` is ``None`` or a
+    function applying the change to ``query_tag`` for the audited ids.
+    """
+    if action == 'assign':
+        staff_id = int(value) if value else None
+        return ('assigned_staff_id', cast(Query.assigned_staff_id, String), staff_id,
+                Query.assigned_staff_id.is_distinct_from(staff_id), {'assigned_staff_id': staff_id}, None)
+    if action in ('status', 'close'):
+        status = 'Closed' if action == 'close' else value
+        if not status:
+            raise BulkActionError('Choose a status.')
+        return ('status', Query.status, status, Query.status.is_distinct_from(status),
+                _status_change(status, now), None)
+    if action == 'priority':
+        if not value:
+            raise BulkActionError('Choose a priority.')
+        return ('priority', Query.priority, value, Query.priority.is_distinct_from(value), {'priority': value}, None)
+    if action in ('tag', 'untag'):
+        tag = normalize_tag(value)
+        if not tag or ',' in tag:
+            raise BulkActionError('Tags cannot be empty or contain commas.')
+        if action == 'tag':
+            tag_id = ensure_tags([tag])[tag]
+            link = lambda audited: db.session.execute(
+                insert(query_tag).from_select(['query_id', 'tag_id'], audited.add_columns(literal(tag_id))))
+            return ('tags', literal(None, String), tag, ~has_tag(tag), {}, link)
+        link = lambda audited: db.session.execute(
+            delete(query_tag).where(query_tag.c.tag_id == tag_id_for(tag), query_tag.c.query_id.in_(audited)))
+        return ('tags', literal(tag), None, has_tag(tag), {}, link)
+    raise BulkActionError(f'Unknown bulk action: {action}')
+
+
+def apply_bulk_action(action, value, condition, staff_id=None, now=None):
+    """Apply ``action`` to the tickets matching ``condition``; return the number changed."""
+    now = now or datetime.utcnow()
+    field, old_value, new_value, changed, values, link = _plan(action, value, now)
+    batch_id = uuid.uuid4().hex
+    audit = QueryAudit.__table__
+
+    db.session.execute(insert(audit).from_select(
+        ['query_id', 'staff_id', 'action', 'field', 'old_value', 'new_value', 'batch_id', 'created_at'],
+        select(
+            Query.id,
+            literal(staff_id, db.Integer),
+            literal(action),
+            literal(field),
+            old_value,
+            literal(None if new_value is None else str(new_value), String),
+            literal(batch_id),
+            literal(now, db.DateTime),
+        ).where(condition, changed),
+    ))
+    audited = select(audit.c.query_id).where(audit.c.batch_id == batch_id)
+    if link:
+        link(audited)
+    result = db.session.execute(
+        update(Query).where(Query.id.in_(audited)).values(updated_at=now, **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount and field == 'status':
+        refresh_counters(select(Query.customer_id).where(Query.id.in_(audited)).distinct())
+    if result.rowcount:
+        ids = db.session.execute(audited.limit(500)).scalars().all()
+        record_event('bulk', {'action': action, 'field': field, 'value': new_value,
+                              'count': result.rowcount, 'query_ids': ids})
+    db.session.commit()
+    return result.rowcount
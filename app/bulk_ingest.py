@@ -0,0 +1,258 @@
+"""
+Bulk creation of queries from other channels (WhatsApp, phone, partners).
+
+``ingest_queries`` takes a list of dicts and returns one result per item,
+in order, so a caller can retry just the items that failed:
+
+    {"index": 0, "status": "created", "ticket_number": "Q-1A2B3C4D", ...}
+    {"index": 1, "status": "duplicate", "ticket_number": "Q-...", ...}
+    {"index": 2, "status": "invalid", "errors": {"customer_email": "..."}}
+
+Items are deduplicated on ``(source, external_id)`` against the payload
+itself and both the ``query`` and ``query_archive`` tables, so replaying an
+item whose ticket was archived does not create it again.  Ticket numbers and SLA deadlines are
+assigned here for the whole batch, and rows are written with COPY into a
+staging table on PostgreSQL (``INSERT ... ON CONFLICT DO NOTHING`` from
+there) or with a single ``executemany`` elsewhere.
+"""
+import csv
+import io
+import json
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .customers import refresh_counters, resolve_customer_ids
+from .live import record_event
+from .models import ArchivedQuery, Query, default_sla_deadline, new_ticket_numbers
+from .sla import sla_state_for
+from .tags import link_tags, parse_tags
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+REQUIRED_FIELDS = ('customer_name', 'customer_email', 'message')
+OPTIONAL_FIELDS = ('customer_phone', 'query_type', 'source', 'external_id', 'priority')
+PRIORITIES = ('Normal', 'Urgent', 'Escalated')
+
+# Columns written for every ingested row, in COPY order.
+COLUMNS = (
+    'customer_name', 'customer_email', 'customer_phone', 'query_type', 'status', 'priority',
+    'message', 'created_at', 'updated_at', 'sla_deadline', 'response_due_at', 'ticket_number',
+    'source', 'external_id', 'last_contact_channel', 'sla_state', 'customer_id',
+)
+
+
+class BulkIngestError(ValueError):
+    """The payload as a whole could not be read."""
+
+
+def parse_payload(data, content_type=''):
+    """Decode a JSON array (or ``{"queries": [...]}``) or NDJSON body into a list of items."""
+    text = data.decode('utf-8') if isinstance(data, bytes) else data
+    try:
+        if 'ndjson' in content_type or 'jsonlines' in content_type:
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        payload = json.loads(text)
+    except ValueError as exc:
+        raise BulkIngestError(f'Invalid JSON: {exc}') from exc
+    if isinstance(payload, dict):
+        payload = payload.get('queries')
+    if not isinstance(payload, list):
+        raise BulkIngestError('Expected a JSON array of queries')
+    return payload
+
+
+def _column_length(name):
+    return getattr(Query.__table__.c[name].type, 'length', None)
+
+
+def validate_item(item, default_source=None):
+    """Return ``(row, errors)`` for one submitted item."""
+    if not isinstance(item, dict):
+        return None, {'item': 'must be an object'}
+    row, errors = {}, {}
+    for field in REQUIRED_FIELDS + OPTIONAL_FIELDS:
+        value = item.get(field)
+        if value is not None and not isinstance(value, str):
+            value = str(value)
+        value = value.strip() if value else None
+        if not value:
+            if field in REQUIRED_FIELDS:
+                errors[field] = 'is required'
+            continue
+        length = _column_length(field)
+        if length and len(value) > length:
+            errors[field] = f'is longer than {length} characters'
+        row[field] = value
+    row['source'] = row.get('source') or default_source
+    if row.get('external_id') and not row['source']:
+        errors['source'] = 'is required with external_id'
+    if row.get('customer_email') and not EMAIL_RE.match(row['customer_email']):
+        errors['customer_email'] = 'is not a valid email address'
+    if row.get('priority') and row['priority'] not in PRIORITIES:
+        errors['priority'] = f"must be one of {', '.join(PRIORITIES)}"
+    tags = item.get('tags')
+    if tags:
+        if isinstance(tags, (str, list)):
+            row['tags'] = parse_tags(tags)
+        else:
+            errors['tags'] = 'must be a comma-separated string or a list'
+
+    received_at = item.get('received_at')
+    if received_at:
+        try:
+            received = datetime.fromisoformat(str(received_at).replace('Z', '+00:00'))
+        except ValueError:
+            errors['received_at'] = 'is not an ISO 8601 timestamp'
+        else:
+            # Stored as naive UTC, like every other timestamp column.
+            if received.tzinfo is not None:
+                received = received.astimezone(timezone.utc).replace(tzinfo=None)
+            row['created_at'] = received
+    return (None, errors) if errors else (row, None)
+
+
+def _existing_tickets(keys):
+    """Map ``(source, external_id)`` to the ticket number already stored for it, live or archived."""
+    by_source = {}
+    for source, external_id in keys:
+        by_source.setdefault(source, []).append(external_id)
+    found = {}
+    for table in (ArchivedQuery.__table__, Query.__table__):
+        for source, external_ids in by_source.items():
+            for start in range(0, len(external_ids), 1000):
+                chunk = external_ids[start:start + 1000]
+                rows = db.session.execute(
+                    select(table.c.external_id, table.c.ticket_number)
+                    .where(table.c.source == source, table.c.external_id.in_(chunk))
+                )
+                found.update({(source, external_id): ticket for external_id, ticket in rows})
+    return found
+
+
+def _copy_rows(rows):
+    """PostgreSQL: COPY into a staging table, then insert what does not conflict."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row.get(column) is None else row[column] for column in COLUMNS])
+    buffer.seek(0)
+    columns = ', '.join(COLUMNS)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute(
+            'CREATE TEMP TABLE query_ingest (LIKE query INCLUDING DEFAULTS) ON COMMIT DROP'
+        )
+        cursor.copy_expert(f"COPY query_ingest ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        cursor.execute(
+            f'INSERT INTO query ({columns}) SELECT {columns} FROM query_ingest '
+            f'ON CONFLICT (source, external_id) DO NOTHING RETURNING ticket_number'
+        )
+        return {ticket for (ticket,) in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def _insert_rows(rows):
+    """Insert rows; return the set of ticket numbers actually written."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return _copy_rows(rows)
+    db.session.execute(insert(Query.__table__), [{column: row.get(column) for column in COLUMNS} for row in rows])
+    return {row['ticket_number'] for row in rows}
+
+
+def _link_written_tags(rows, written):
+    tagged = {row['ticket_number']: row['tags'] for row in rows if row.get('tags') and row['ticket_number'] in written}
+    if not tagged:
+        return
+    table = Query.__table__
+    ids = dict(db.session.execute(
+        select(table.c.ticket_number, table.c.id).where(table.c.ticket_number.in_(list(tagged)))
+    ).all())
+    link_tags([(ids[ticket], name) for ticket, names in tagged.items() for name in names])
+
+
+def ingest_queries(items, default_source=None, channel=None):
+    """Create queries for ``items``; return one result dict per item, in order."""
+    results = [None] * len(items)
+    pending = []
+    seen = {}
+    for index, item in enumerate(items):
+        row, errors = validate_item(item, default_source)
+        external_id = item.get('external_id') if isinstance(item, dict) else None
+        result = {'index': index, 'external_id': external_id}
+        results[index] = result
+        if errors:
+            result.update(status='invalid', errors=errors)
+            continue
+        key = (row['source'], row['external_id']) if row.get('external_id') else None
+        if key and key in seen:
+            result.update(status='duplicate', duplicate_of=seen[key])
+            continue
+        if key:
+            seen[key] = index
+        pending.append((index, key, row))
+
+    for attempt in range(2):
+        existing = _existing_tickets([key for _, key, _ in pending if key])
+        rows = []
+        for index, key, row in pending:
+            if key in existing:
+                results[index].update(status='duplicate', ticket_number=existing[key])
+                continue
+            received_at = row.get('created_at') or datetime.utcnow()
+            sla_deadline = default_sla_deadline(received_at)
+            row.update(
+                status='Open',
+                priority=row.get('priority') or 'Normal',
+                created_at=received_at,
+                updated_at=received_at,
+                sla_deadline=sla_deadline,
+                response_due_at=sla_deadline,
+                sla_state=sla_state_for('Open', sla_deadline),
+                last_contact_channel=channel or row['source'],
+            )
+            rows.append((index, row))
+        if not rows:
+            break
+        for (_, row), ticket_number in zip(rows, new_ticket_numbers(len(rows))):
+            row['ticket_number'] = ticket_number
+        try:
+            customer_ids = resolve_customer_ids([row for _, row in rows])
+            written = _insert_rows([row for _, row in rows])
+            refresh_counters(customer_ids)
+            _link_written_tags([row for _, row in rows], written)
+            if written:
+                record_event('bulk', {'action': 'created', 'count': len(written), 'tickets': sorted(written)[:50]})
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent import stored some of the same external ids; the
+            # second pass marks those as duplicates and inserts the rest.
+            db.session.rollback()
+            pending = [(index, key, row) for index, key, row in pending if results[index].get('status') is None]
+            if attempt:
+                raise
+            continue
+        for index, row in rows:
+            if row['ticket_number'] in written:
+                results[index].update(status='created', ticket_number=row['ticket_number'])
+            else:
+                results[index].update(status='duplicate')
+        break
+
+    # Rows skipped by ON CONFLICT lost a race with another import.
+    raced = {key: index for index, key, _ in pending if results[index]['status'] == 'duplicate'
+             and 'ticket_number' not in results[index]}
+    for key, ticket in _existing_tickets(list(raced)).items():
+        results[raced[key]]['ticket_number'] = ticket
+    return results
+
+
+def summarize(results):
+    summary = {'created': 0, 'duplicate': 0, 'invalid': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return summary
@@ -0,0 +1,215 @@
+import json
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+@click.command('build-css')
+@click.option('--download/--no-download', default=True, help='Fetch Bootstrap CSS from the CDN if it is not vendored yet.')
+@with_appcontext
+def build_css_command(download):
+    """Purge unused CSS and extract per-template critical CSS."""
+    from .css_purge import build_css
+
+    manifest = build_css(current_app, download=download)
+    click.echo(f"Purged stylesheet: {manifest['stylesheet']}")
+    click.echo(f"{'template':<24}{'original':>10}{'purged':>10}{'critical':>10}{'saved':>10}{'blocking saved':>16}")
+    for template_name, row in sorted(manifest['report'].items()):
+        click.echo(
+            f"{template_name:<24}{row['original_bytes']:>10}{row['purged_bytes']:>10}"
+            f"{row['critical_bytes']:>10}{row['saved_bytes']:>10}{row['render_blocking_saved_bytes']:>16}"
+        )
+
+
+@click.command('build-sw')
+@with_appcontext
+def build_sw_command():
+    """Hash static assets and generate the versioned service worker."""
+    from .service_worker import build_service_worker
+
+    context = build_service_worker(current_app)
+    click.echo(f"Service worker version {context['version']} precaching {len(context['precache'])} URLs")
+    for url in context['precache']:
+        click.echo(f"  {url}")
+
+
+@click.command('precompile-templates')
+@click.option('--clear', is_flag=True, help='Remove existing bytecode before compiling.')
+@with_appcontext
+def precompile_templates_command(clear):
+    """Compile all templates into the Jinja bytecode cache."""
+    from .template_cache import precompile_templates
+
+    timings = precompile_templates(current_app, clear=clear)
+    click.echo(f"Compiled {len(timings)} templates into {current_app.jinja_env.bytecode_cache.directory}")
+    for name, ms in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        click.echo(f"  {name:<36}{ms:>8.1f} ms")
+
+
+@click.command('flush-ingest-queue')
+@click.option('--loop', is_flag=True, help='Keep flushing every INGEST_FLUSH_INTERVAL seconds.')
+@click.option('--batch-size', type=int, default=None, help='Rows per multi-row INSERT.')
+@with_appcontext
+def flush_ingest_queue_command(loop, batch_size):
+    """Write queued form submissions to the query table."""
+    from .ingest_queue import drain, get_queue
+
+    while True:
+        totals = drain(current_app, batch_size=batch_size)
+        stats = get_queue(current_app).stats()
+        if totals['inserted'] or totals['skipped'] or totals['failed'] or not loop:
+            click.echo(f"inserted {totals['inserted']}, skipped {totals['skipped']}, failed {totals['failed']}; "
+                       f"{stats['pending']} pending, {stats['dead']} dead")
+        if not loop:
+            break
+        time.sleep(current_app.config['INGEST_FLUSH_INTERVAL'])
+
+
+@click.command('ingest-queries')
+@click.argument('source_file', type=click.File('rb'))
+@click.option('--source', default=None, help='Source for items that do not set one (e.g. whatsapp).')
+@click.option('--channel', default=None, help='Contact channel recorded on the new queries.')
+@click.option('--ndjson', is_flag=True, help='Read one JSON object per line (implied by .ndjson/.jsonl).')
+@click.option('--chunk-size', type=int, default=1000, show_default=True, help='Queries per transaction.')
+@click.option('--results', 'results_file', type=click.File('w'), default=None, help='Write per-item results as NDJSON.')
+@with_appcontext
+def ingest_queries_command(source_file, source, channel, ndjson, chunk_size, results_file):
+    """Bulk-create queries from a JSON or NDJSON file ('-' for stdin)."""
+    from .bulk_ingest import BulkIngestError, ingest_queries, parse_payload, summarize
+
+    name = getattr(source_file, 'name', '')
+    content_type = 'application/x-ndjson' if ndjson or name.endswith(('.ndjson', '.jsonl')) else 'application/json'
+    try:
+        items = parse_payload(source_file.read(), content_type)
+    except BulkIngestError as exc:
+        raise click.ClickException(str(exc))
+
+    totals = {'created': 0, 'duplicate': 0, 'invalid': 0}
+    for start in range(0, len(items), chunk_size):
+        results = ingest_queries(items[start:start + chunk_size], default_source=source, channel=channel)
+        for result in results:
+            result['index'] += start
+            if 'duplicate_of' in result:
+                result['duplicate_of'] += start
+            if results_file:
+                results_file.write(json.dumps(result) + '\n')
+        for key, value in summarize(results).items():
+            totals[key] += value
+    click.echo(f"{len(items)} queries: {totals['created']} created, {totals['duplicate']} duplicate, "
+               f"{totals['invalid']} invalid")
+
+
+@click.command('send-outbox')
+@click.option('--workers', type=int, default=None, help='Sender threads (default OUTBOX_WORKERS).')
+@click.option('--once', is_flag=True, help='Exit when no email is due instead of polling.')
+@click.option('--retry-dead', is_flag=True, help='Re-queue dead-lettered emails first.')
+@with_appcontext
+def send_outbox_command(workers, once, retry_dead):
+    """Deliver queued customer emails."""
+    from . import outbox
+
+    if retry_dead:
+        click.echo(f"Re-queued {outbox.retry_dead()} dead-lettered emails")
+    totals = outbox.run_workers(current_app._get_current_object(), workers=workers, once=once)
+    click.echo(f"sent {totals['sent']}, retrying {totals['retry']}, dead {totals['dead']}, "
+               f"deferred {totals['deferred']}; outbox: {outbox.stats()}")
+
+
+@click.command('sweep-sla')
+@click.option('--loop', is_flag=True, help='Sweep every SLA_SWEEP_INTERVAL seconds.')
+@with_appcontext
+def sweep_sla_command(loop):
+    """Refresh persisted SLA states and auto-escalate breached tickets."""
+    from .sla import sweep
+
+    while True:
+        counts = sweep()
+        click.echo(', '.join(f'{key} {value}' for key, value in counts.items()))
+        if not loop:
+            break
+        time.sleep(current_app.config['SLA_SWEEP_INTERVAL'])
+
+
+@click.command('prune-live-events')
+@click.option('--hours', type=int, default=None, help='Keep this many hours (default LIVE_INBOX_RETENTION_HOURS).')
+@with_appcontext
+def prune_live_events_command(hours):
+    """Delete old entries from the live inbox change log."""
+    from .live import prune_events
+
+    click.echo(f'Deleted {prune_events(hours)} live inbox events')
+
+
+@click.command('archive-queries')
+@click.option('--older-than-days', type=int, default=None,
+              help='Archive closed tickets unchanged for this many days (default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, default=None, help='Tickets per transaction (default ARCHIVE_BATCH_SIZE).')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches; resume later.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be archived.')
+@click.option('--resume', is_flag=True, help='Continue the last unfinished run with its cutoff.')
+@with_appcontext
+def archive_queries_command(older_than_days, batch_size, max_batches, dry_run, resume):
+    """Move old closed tickets and their responses into the archive tables."""
+    from . import archive
+
+    run = archive.latest_unfinished_run() if resume else None
+    if resume and run is None:
+        click.echo('No unfinished archive run to resume; starting a new one.')
+    cutoff = run.cutoff if run else archive.default_cutoff(older_than_days)
+    if dry_run:
+        summary = archive.preview(cutoff)
+        click.echo(f"Would archive {summary['tickets']} tickets and {summary['responses']} responses "
+                   f"last changed before {cutoff:%Y-%m-%d} (created {summary['oldest'] or '-'} to {summary['newest'] or '-'})")
+        return
+    if run is None:
+        run = archive.start_run(cutoff, batch_size)
+    elif batch_size:
+        run.batch_size = batch_size
+    click.echo(f'Archive run {run.id}: tickets last changed before {run.cutoff:%Y-%m-%d}, '
+               f'continuing after id {run.last_query_id}')
+    run = archive.run_archive(run, max_batches=max_batches, progress=lambda current: click.echo(
+        f'  {current.archived_count} tickets, {current.response_count} responses (last id {current.last_query_id})'))
+    click.echo(f'Run {run.id} {run.status}: {run.archived_count} tickets and {run.response_count} responses archived')
+
+
+@click.command('generate-data')
+@click.option('--packages', type=int, default=0, show_default=True)
+@click.option('--events', type=int, default=0, show_default=True)
+@click.option('--testimonials', type=int, default=0, show_default=True)
+@click.option('--queries', type=int, default=0, show_default=True, help='Tickets, each with its response thread.')
+@click.option('--responses-per-query', type=float, default=2.0, show_default=True,
+              help='Mean thread length of answered tickets.')
+@click.option('--days', type=int, default=365, show_default=True, help='Spread ticket arrivals over this many days.')
+@click.option('--seed', type=int, default=0, show_default=True, help='Same seed, same data.')
+@click.option('--chunk-size', type=int, default=None, help='Rows per chunk and commit (default SYNTHETIC_CHUNK_SIZE).')
+@with_appcontext
+def generate_data_command(packages, events, testimonials, queries, responses_per_query, days, seed, chunk_size):
+    """Bulk-load reproducible synthetic data for capacity testing."""
+    from .synthetic import generate
+
+    def progress(label, rows, seconds):
+        click.echo(f'\r  {label}: {rows} rows, {rows / seconds * 60 if seconds else 0:,.0f} rows/min', nl=False)
+
+    started = time.perf_counter()
+    written = generate(packages=packages, events=events, testimonials=testimonials, queries=queries,
+                       responses_per_query=responses_per_query, days=days, seed=seed, chunk_size=chunk_size,
+                       progress=progress)
+    elapsed = time.perf_counter() - started
+    click.echo('')
+    click.echo(', '.join(f'{rows} {table}' for table, rows in written.items()) +
+               f' in {elapsed:.1f} s ({sum(written.values()) / elapsed * 60 if elapsed else 0:,.0f} rows/min)')
+
+
+def register_commands(app):
+    app.cli.add_command(build_css_command)
+    app.cli.add_command(build_sw_command)
+    app.cli.add_command(precompile_templates_command)
+    app.cli.add_command(flush_ingest_queue_command)
+    app.cli.add_command(ingest_queries_command)
+    app.cli.add_command(send_outbox_command)
+    app.cli.add_command(sweep_sla_command)
+    app.cli.add_command(prune_live_events_command)
+    app.cli.add_command(archive_queries_command)
+    app.cli.add_command(generate_data_command)
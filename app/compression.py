@@ -0,0 +1,143 @@
+"""
+Compress-once response caching.
+
+``cached_response`` replaces ``cache.cached`` on hot public views.  The
+rendered body is stored in the app cache together with one compressed
+variant per content-encoding, so a cache hit is served straight from the
+stored bytes instead of being gzip/brotli-compressed again by
+Flask-Compress on every request.  Variants are produced lazily the first
+time a client asks for that encoding and use the ``COMPRESS_CACHED_*``
+levels (higher than the per-request ``COMPRESS_*`` levels, because the
+cost is paid once per cache entry).  The encoding is negotiated here from
+``Accept-Encoding`` and ``COMPRESS_ALGORITHM``, with the same preference
+rules as Flask-Compress.
+"""
+import functools
+import gzip
+import hashlib
+import time
+import zlib
+from urllib.parse import urlencode
+
+try:
+    import brotlicffi as brotli
+except ImportError:
+    import brotli
+
+from flask import Response, current_app, make_response, request
+
+from . import cache, tracing
+from .metrics import cache_lookup
+
+
+def _cache_key(prefix):
+    args = urlencode(sorted(request.args.items(multi=True)))
+    digest = hashlib.md5(args.encode('utf-8')).hexdigest() if args else ''
+    return f'{prefix}{request.path}?{digest}'
+
+
+def compress_bytes(data, algorithm, config):
+    with tracing.span('compress', {'http.content_encoding': algorithm, 'compress.input_bytes': len(data)}):
+        return _compress_bytes(data, algorithm, config)
+
+
+def _compress_bytes(data, algorithm, config):
+    if algorithm == 'gzip':
+        return gzip.compress(data, compresslevel=config['COMPRESS_CACHED_LEVEL'])
+    if algorithm == 'deflate':
+        return zlib.compress(data, config['COMPRESS_CACHED_DEFLATE_LEVEL'])
+    if algorithm == 'br':
+        return brotli.compress(
+            data,
+            mode=config['COMPRESS_BR_MODE'],
+            quality=config['COMPRESS_CACHED_BR_LEVEL'],
+            lgwin=config['COMPRESS_BR_WINDOW'],
+            lgblock=config['COMPRESS_BR_BLOCK'],
+        )
+    raise ValueError(f'Unsupported content-encoding: {algorithm}')
+
+
+def _enabled_encodings(config):
+    algorithms = config['COMPRESS_ALGORITHM']
+    if isinstance(algorithms, str):
+        algorithms = [name.strip() for name in algorithms.split(',')]
+    return [name for name in algorithms if name in ('br', 'gzip', 'deflate')]
+
+
+def choose_encoding(config):
+    """The content-encoding to send for this request, or ``None``: the client's
+    highest ``q`` wins, ties go to the first in ``COMPRESS_ALGORITHM``."""
+    return request.accept_encodings.best_match(_enabled_encodings(config))
+
+
+def _is_cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and 'Content-Encoding' not in response.headers
+        and 'Set-Cookie' not in response.headers
+    )
+
+
+def _entry_from_response(response, timeout):
+    return {
+        'body': response.get_data(),
+        'mimetype': response.mimetype,
+        'content_type': response.content_type,
+        'expires_at': time.time() + timeout,
+        'variants': {},
+    }
+
+
+def _response_from_entry(entry, key, status):
+    config = current_app.config
+    body = entry['body']
+    algorithm = None
+    if entry['mimetype'] in config['COMPRESS_MIMETYPES'] and len(body) >= config['COMPRESS_MIN_SIZE']:
+        algorithm = choose_encoding(config)
+
+    if algorithm:
+        variant = entry['variants'].get(algorithm)
+        if variant is None:
+            variant = compress_bytes(body, algorithm, config)
+            entry['variants'][algorithm] = variant
+            remaining = int(entry['expires_at'] - time.time())
+            if remaining > 0:
+                cache.set(key, entry, timeout=remaining)
+        response = Response(variant, content_type=entry['content_type'])
+        response.headers['Content-Encoding'] = algorithm
+    else:
+        response = Response(body, content_type=entry['content_type'])
+
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-Cache'] = status
+    return response
+
+
+def cached_response(timeout=300, key_prefix='view-compressed'):
+    """Cache a GET view's body and its compressed variants for ``timeout`` seconds."""
+
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET' or not current_app.config.get('COMPRESS_CACHE_RESPONSES', True):
+                return f(*args, **kwargs)
+
+            key = _cache_key(key_prefix)
+            entry = cache.get(key)
+            if entry is not None and 'content_type' not in entry:
+                entry = None  # stored by an older release
+            cache_lookup(key_prefix, entry is not None)
+            if entry is not None:
+                return _response_from_entry(entry, key, 'HIT')
+
+            response = make_response(f(*args, **kwargs))
+            if not _is_cacheable(response):
+                return response
+            entry = _entry_from_response(response, timeout)
+            cache.set(key, entry, timeout=timeout)
+            return _response_from_entry(entry, key, 'MISS')
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,89 @@
+"""
+Paged conversation thread for the query detail page.
+
+``query_detail`` used to join every response (and its staff user) onto the
+ticket row.  ``load_thread`` instead fetches the newest
+``THREAD_PAGE_SIZE`` responses, newest first, with keyset paging on the
+response id (served by ``ix_query_response_thread``) and ``selectinload``
+for staff, so the ticket row is never repeated.  Bodies and attachment
+lists are deferred: only a ``THREAD_PREVIEW_CHARS`` prefix is selected, and
+the full entry is fetched when a reader expands it.
+
+Ids grow with creation time, so the cursor is just the id of the oldest
+response shown.  ``created_at`` is not used: the server default writes it
+without fractional seconds, and SQLite compares a bound datetime against
+that text form wrongly.
+"""
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import defer, selectinload
+
+from . import db
+from .models import QueryResponse
+
+
+class ThreadPage:
+    def __init__(self, entries, older_cursor, total):
+        self.entries = entries  # [(response, preview, truncated, has_attachments)], oldest first
+        self.older_cursor = older_cursor
+        self.total = total
+
+
+def encode_cursor(response):
+    return str(response.id)
+
+
+def decode_cursor(cursor):
+    """Return the response id or ``None`` for a malformed cursor."""
+    try:
+        return int(cursor)
+    except (TypeError, ValueError):
+        return None
+
+
+def count_responses(query_id):
+    return db.session.execute(
+        select(func.count()).select_from(QueryResponse).where(QueryResponse.query_id == query_id)
+    ).scalar_one()
+
+
+def load_thread(query_id, before=None, limit=None):
+    """One page of responses older than ``before`` (newest page when ``None``)."""
+    config = current_app.config
+    limit = limit or config['THREAD_PAGE_SIZE']
+    preview_chars = config['THREAD_PREVIEW_CHARS']
+    stmt = (
+        select(
+            QueryResponse,
+            func.substr(QueryResponse.body, 1, preview_chars),
+            func.length(QueryResponse.body) > preview_chars,
+            QueryResponse.attachment_urls != None,  # noqa: E711
+        )
+        .where(QueryResponse.query_id == query_id)
+        .options(
+            defer(QueryResponse.body),
+            defer(QueryResponse.attachment_urls),
+            selectinload(QueryResponse.staff),
+        )
+        .order_by(QueryResponse.id.desc())
+        .limit(limit + 1)
+    )
+    response_id = decode_cursor(before) if before else None
+    if response_id is not None:
+        stmt = stmt.where(QueryResponse.id < response_id)
+    rows = db.session.execute(stmt).all()
+    older_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    entries = [
+        (response, preview, bool(truncated), bool(has_attachments))
+        for response, preview, truncated, has_attachments in reversed(rows[:limit])
+    ]
+    return ThreadPage(entries, older_cursor, count_responses(query_id))
+
+
+def load_response(query_id, response_id):
+    """A single response with its full body and attachments, or ``None``."""
+    return db.session.execute(
+        select(QueryResponse)
+        .where(QueryResponse.id == response_id, QueryResponse.query_id == query_id)
+        .options(selectinload(QueryResponse.staff))
+    ).scalar_one_or_none()
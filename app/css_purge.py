@@ -0,0 +1,454 @@
+"""
+Build-time CSS purging and critical-CSS extraction for the public templates.
+
+``build_css`` scans the Jinja templates (and the public JS that toggles
+classes) for the selectors that are actually used, writes a purged copy of
+Bootstrap + ``style.css`` and one above-the-fold stylesheet per page
+template.  ``base.html`` inlines the critical CSS for the template being
+rendered and loads the purged stylesheet asynchronously; when no build has
+been run the templates fall back to the CDN stylesheet.
+"""
+import hashlib
+import json
+import os
+import re
+from urllib.request import urlopen
+
+from flask import current_app, g, url_for, before_render_template
+from markupsafe import Markup
+
+
+BOOTSTRAP_CSS_URL = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css'
+
+# Classes that Bootstrap's JS (collapse, carousel, dropdown, alert, modal)
+# adds at runtime and which therefore never appear in the templates.
+DEFAULT_SAFELIST = (
+    'active', 'show', 'showing', 'hiding', 'fade', 'collapse', 'collapsing',
+    'carousel-item-start', 'carousel-item-end', 'carousel-item-next',
+    'carousel-item-prev', 'pointer-event', 'dropdown-menu-end',
+    'modal-open', 'modal-backdrop', 'offcanvas-backdrop', 'was-validated',
+    'is-valid', 'is-invalid', 'disabled',
+)
+
+_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_BLOCK = re.compile(r'{%-?\s*block\s+(\w+)\s*-?%}(.*?){%-?\s*endblock(?:\s+\w+)?\s*-?%}', re.S)
+_INCLUDE = re.compile(r'{%-?\s*include\s+[\'"]([^\'"]+)[\'"]\s*-?%}')
+_EXTENDS = re.compile(r'{%-?\s*extends\s+[\'"]base\.html[\'"]\s*-?%}')
+_JINJA_TAG = re.compile(r'{%.*?%}|{#.*?#}', re.S)
+_JINJA_EXPR = re.compile(r'{{(.*?)}}', re.S)
+_STRING = re.compile(r'\'([^\'\\]*)\'|"([^"\\]*)"')
+_CLASS_ATTR = re.compile(r'\bclass\s*=\s*("([^"]*)"|\'([^\']*)\')', re.S)
+_ID_ATTR = re.compile(r'\bid\s*=\s*["\']([^"\']+)["\']')
+_TAG_OPEN = re.compile(r'<([a-zA-Z][\w-]*)')
+_TOKEN = re.compile(r'^-?[A-Za-z_][\w-]*$')
+
+_PSEUDO_FN = re.compile(r'::?[\w-]+\((?:[^()]|\([^()]*\))*\)')
+_PSEUDO = re.compile(r'::?[\w-]+')
+_ATTR_SEL = re.compile(r'\[[^\]]*\]')
+_CLASS_SEL = re.compile(r'\.((?:\\.|[\w-])+)')
+_ID_SEL = re.compile(r'#((?:\\.|[\w-])+)')
+_TAG_SEL = re.compile(r'[a-zA-Z][\w-]*')
+_KEYFRAMES = re.compile(r'@(?:-webkit-)?keyframes\s+([\w-]+)')
+
+_GROUP_AT_RULES = {'media', 'supports', 'container', 'layer', 'document'}
+
+
+class UsedSelectors:
+    """Classes, ids and element names found in a piece of markup."""
+
+    def __init__(self, classes=(), ids=(), tags=(), prefixes=()):
+        self.classes = set(classes)
+        self.ids = set(ids)
+        self.tags = set(tags) | {'html', 'body'}
+        self.prefixes = set(prefixes)
+
+    def update(self, other):
+        self.classes |= other.classes
+        self.ids |= other.ids
+        self.tags |= other.tags
+        self.prefixes |= other.prefixes
+        return self
+
+    def has_class(self, name):
+        if name in self.classes:
+            return True
+        return any(name.startswith(prefix) for prefix in self.prefixes)
+
+
+# --------------------------------------------------------------------------
+# Template scanning
+# --------------------------------------------------------------------------
+
+def _class_tokens(value):
+    """Yield class names from a class attribute that may contain Jinja."""
+    for expression in _JINJA_EXPR.findall(value):
+        for single, double in _STRING.findall(expression):
+            for token in (single or double).split():
+                yield token, False
+    value = _JINJA_EXPR.sub('\x00', value)
+    value = _JINJA_TAG.sub(' ', value)
+    for token in value.split():
+        # ``alert-{{ category }}`` leaves ``alert-\x00``: keep it as a prefix.
+        is_prefix = '\x00' in token
+        token = token.split('\x00')[0]
+        if token:
+            yield token, is_prefix
+
+
+def scan_markup(markup):
+    used = UsedSelectors()
+    for match in _CLASS_ATTR.finditer(markup):
+        for token, is_prefix in _class_tokens(match.group(2) if match.group(2) is not None else match.group(3)):
+            if is_prefix:
+                used.prefixes.add(token)
+            elif _TOKEN.match(token):
+                used.classes.add(token)
+    used.ids.update(_ID_ATTR.findall(markup))
+    used.tags.update(tag.lower() for tag in _TAG_OPEN.findall(markup))
+    return used
+
+
+def scan_script(source):
+    """Conservatively treat every identifier-like JS string as a class name."""
+    used = UsedSelectors()
+    for single, double in _STRING.findall(source):
+        for token in (single or double).split():
+            token = token.lstrip('.#')
+            if _TOKEN.match(token):
+                used.classes.add(token)
+    return used
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as fh:
+        return fh.read()
+
+
+def _template_dir(app):
+    return os.path.join(app.root_path, app.template_folder)
+
+
+def _iter_templates(app):
+    root = _template_dir(app)
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.endswith('.html'):
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, root).replace(os.sep, '/'), path
+
+
+def page_templates(app):
+    """Top-level public templates that extend ``base.html``."""
+    pages = []
+    for name, path in _iter_templates(app):
+        if '/' not in name and _EXTENDS.search(_read(path)):
+            pages.append(name)
+    return pages
+
+
+def _resolve_includes(app, source, depth=0):
+    if depth > 3:
+        return source
+
+    def _include(match):
+        path = os.path.join(_template_dir(app), match.group(1))
+        if not os.path.exists(path):
+            return ''
+        return _resolve_includes(app, _read(path), depth + 1)
+
+    return _INCLUDE.sub(_include, source)
+
+
+def render_skeleton(app, template_name):
+    """Approximate the page markup by splicing the page blocks into base.html."""
+    root = _template_dir(app)
+    blocks = dict(_BLOCK.findall(_read(os.path.join(root, template_name))))
+    base = _read(os.path.join(root, 'base.html'))
+
+    def _block(match):
+        return blocks.get(match.group(1), match.group(2))
+
+    skeleton = _BLOCK.sub(_block, base)
+    return _resolve_includes(app, skeleton)
+
+
+def above_the_fold(markup, fold_chars):
+    body = markup.find('<body')
+    if body == -1:
+        body = 0
+    return markup[body:body + fold_chars]
+
+
+# --------------------------------------------------------------------------
+# Stylesheet parsing and filtering
+# --------------------------------------------------------------------------
+
+def _scan_to(css, pos, stops):
+    """Return the index of the next stop character outside strings and parens."""
+    depth = 0
+    quote = None
+    n = len(css)
+    while pos < n:
+        ch = css[pos]
+        if quote:
+            if ch == '\\':
+                pos += 1
+            elif ch == quote:
+                quote = None
+        elif ch in '"\'':
+            quote = ch
+        elif ch in '([':
+            depth += 1
+        elif ch in ')]':
+            depth -= 1
+        elif depth <= 0 and ch in stops:
+            return pos
+        pos += 1
+    return n
+
+
+def _read_block(css, pos):
+    """``pos`` points at ``{``; return the block text and the index after ``}``."""
+    depth = 0
+    start = pos
+    while pos < len(css):
+        pos = _scan_to(css, pos, '{}')
+        if pos >= len(css):
+            break
+        depth += 1 if css[pos] == '{' else -1
+        pos += 1
+        if depth == 0:
+            break
+    return css[start:pos], pos
+
+
+def parse_css(css, pos=0):
+    """Parse a stylesheet into ``('rule'|'group'|'raw', prelude, body)`` nodes."""
+    nodes = []
+    n = len(css)
+    while pos < n:
+        while pos < n and css[pos].isspace():
+            pos += 1
+        if pos >= n:
+            break
+        if css[pos] == '}':
+            return nodes, pos + 1
+        end = _scan_to(css, pos, '{;}')
+        prelude = css[pos:end].strip()
+        if end >= n or css[end] in ';}':
+            if prelude:
+                nodes.append(('raw', prelude, prelude + ';'))
+            pos = end + 1 if end < n and css[end] == ';' else end
+            continue
+        if prelude.startswith('@'):
+            name = re.match(r'@(?:-\w+-)?([\w-]+)', prelude)
+            name = name.group(1).lower() if name else ''
+            if name in _GROUP_AT_RULES:
+                children, pos = parse_css(css, end + 1)
+                nodes.append(('group', prelude, children))
+            else:
+                block, pos = _read_block(css, end)
+                nodes.append(('raw', prelude, prelude + block))
+            continue
+        block, pos = _read_block(css, end)
+        nodes.append(('rule', prelude, block[1:-1].strip()))
+    return nodes, pos
+
+
+def _split_selectors(selector_text):
+    parts = []
+    start = 0
+    while start <= len(selector_text):
+        end = _scan_to(selector_text, start, ',')
+        part = selector_text[start:end].strip()
+        if part:
+            parts.append(part)
+        start = end + 1
+    return parts
+
+
+def _selector_matches(selector, used):
+    bare = _PSEUDO_FN.sub('', selector)
+    bare = _ATTR_SEL.sub('', bare)
+    bare = _PSEUDO.sub('', bare)
+    for name in _CLASS_SEL.findall(bare):
+        if not used.has_class(name.replace('\\', '')):
+            return False
+    for name in _ID_SEL.findall(bare):
+        if name.replace('\\', '') not in used.ids:
+            return False
+    rest = _ID_SEL.sub(' ', _CLASS_SEL.sub(' ', bare))
+    for tag in _TAG_SEL.findall(rest):
+        if tag.lower() not in used.tags:
+            return False
+    return True
+
+
+def _minify_block(body):
+    return re.sub(r'\s*\n\s*', ' ', body).strip()
+
+
+def filter_nodes(nodes, used):
+    out = []
+    for kind, prelude, body in nodes:
+        if kind == 'rule':
+            selectors = [s for s in _split_selectors(prelude) if _selector_matches(s, used)]
+            if selectors:
+                out.append('%s{%s}' % (','.join(selectors), _minify_block(body)))
+        elif kind == 'group':
+            inner = filter_nodes(body, used)
+            if inner:
+                out.append('%s{%s}' % (prelude, ''.join(inner)))
+        else:
+            out.append(body)
+    return out
+
+
+def _drop_unused_keyframes(chunks):
+    """Remove ``@keyframes`` blocks whose name is not referenced elsewhere."""
+    names = {}
+    for index, chunk in enumerate(chunks):
+        match = _KEYFRAMES.match(chunk)
+        if match:
+            names.setdefault(match.group(1), []).append(index)
+    if not names:
+        return chunks
+    others = ''.join(c for c in chunks if not _KEYFRAMES.match(c))
+    drop = set()
+    for name, indexes in names.items():
+        if not re.search(r'(?<![\w-])%s(?![\w-])' % re.escape(name), others):
+            drop.update(indexes)
+    return [c for i, c in enumerate(chunks) if i not in drop]
+
+
+def purge(css, used):
+    nodes, _ = parse_css(_COMMENT.sub('', css))
+    return ''.join(_drop_unused_keyframes(filter_nodes(nodes, used)))
+
+
+# --------------------------------------------------------------------------
+# Build
+# --------------------------------------------------------------------------
+
+def _static_path(app, filename):
+    return os.path.join(app.static_folder, *filename.split('/'))
+
+
+def _ensure_source(app, filename, download):
+    path = _static_path(app, filename)
+    if not os.path.exists(path) and filename == app.config['CSS_PURGE_BOOTSTRAP']:
+        if not download:
+            raise FileNotFoundError(f'{filename} is missing; re-run with downloads enabled')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urlopen(BOOTSTRAP_CSS_URL, timeout=30) as response:
+            payload = response.read()
+        with open(path, 'wb') as fh:
+            fh.write(payload)
+    return path
+
+
+def _write(app, filename, content):
+    path = _static_path(app, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(content)
+
+
+def build_css(app, download=True):
+    """Write the purged stylesheet, per-template critical CSS and a manifest."""
+    config = app.config
+    sources = [config['CSS_PURGE_BOOTSTRAP']] + list(config['CSS_PURGE_SOURCES'])
+    css = '\n'.join(_read(_ensure_source(app, filename, download)) for filename in sources)
+    original_bytes = len(css.encode('utf-8'))
+
+    safelist = UsedSelectors(classes=DEFAULT_SAFELIST).update(
+        UsedSelectors(classes=config.get('CSS_PURGE_SAFELIST', ())))
+    used = UsedSelectors().update(safelist)
+    for _name, path in _iter_templates(app):
+        used.update(scan_markup(_read(path)))
+    scripts_dir = os.path.join(app.static_folder, 'js')
+    for filename in config['CSS_PURGE_SCRIPTS']:
+        path = os.path.join(scripts_dir, filename)
+        if os.path.exists(path):
+            used.update(scan_script(_read(path)))
+
+    purged = purge(css, used)
+    digest = hashlib.md5(purged.encode('utf-8')).hexdigest()[:10]
+    output_dir = config['CSS_PURGE_OUTPUT_DIR']
+    stylesheet = f'{output_dir}/site.{digest}.css'
+    _write(app, stylesheet, purged)
+    purged_bytes = len(purged.encode('utf-8'))
+
+    critical = {}
+    pages = {}
+    for template_name in page_templates(app):
+        fold = above_the_fold(render_skeleton(app, template_name), config['CSS_CRITICAL_FOLD_CHARS'])
+        fold_used = scan_markup(fold).update(safelist)
+        critical_css = purge(purged, fold_used)
+        filename = f'{output_dir}/critical/{template_name[:-len(".html")]}.css'
+        _write(app, filename, critical_css)
+        critical[template_name] = filename
+        critical_bytes = len(critical_css.encode('utf-8'))
+        pages[template_name] = {
+            'original_bytes': original_bytes,
+            'purged_bytes': purged_bytes,
+            'critical_bytes': critical_bytes,
+            'saved_bytes': original_bytes - purged_bytes,
+            'render_blocking_saved_bytes': original_bytes - critical_bytes,
+        }
+
+    manifest = {'stylesheet': stylesheet, 'critical': critical, 'report': pages}
+    _write(app, config['CSS_PURGE_MANIFEST'], json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+# --------------------------------------------------------------------------
+# Runtime helpers used by base.html
+# --------------------------------------------------------------------------
+
+def _manifest():
+    state = current_app.extensions['css_purge']
+    if state.get('manifest') is None or current_app.debug:
+        path = _static_path(current_app, current_app.config['CSS_PURGE_MANIFEST'])
+        manifest = {}
+        if current_app.config.get('CSS_CRITICAL_INLINE') and os.path.exists(path):
+            manifest = json.loads(_read(path))
+        state['manifest'] = manifest
+        state['critical'] = {}
+    return state['manifest']
+
+
+def purged_stylesheet_url():
+    stylesheet = _manifest().get('stylesheet')
+    if not stylesheet:
+        return None
+    return url_for('static', filename=stylesheet)
+
+
+def critical_css():
+    """Inline critical CSS for the template currently being rendered."""
+    manifest = _manifest()
+    template_name = g.get('page_template')
+    filename = manifest.get('critical', {}).get(template_name)
+    if not filename:
+        return Markup('')
+    cache = current_app.extensions['css_purge']['critical']
+    if filename not in cache:
+        path = _static_path(current_app, filename)
+        cache[filename] = _read(path) if os.path.exists(path) else ''
+    # The stylesheet is our own build output; only guard the closing tag.
+    return Markup(cache[filename].replace('</', '<\\/'))
+
+
+def _remember_template(sender, template, context, **extra):
+    if 'page_template' not in g:
+        g.page_template = template.name
+
+
+def init_app(app):
+    app.extensions.setdefault('css_purge', {'manifest': None, 'critical': {}})
+    before_render_template.connect(_remember_template, app)
+    app.jinja_env.globals.update(
+        critical_css=critical_css,
+        purged_stylesheet_url=purged_stylesheet_url,
+    )
@@ -0,0 +1,198 @@
+"""
+Customer profiles behind the query detail "Customer history" panel.
+
+Each ``Query`` links to a ``Customer`` keyed on the normalized
+(trimmed, lower-cased) email, so "Ali@Example.com " and "ali@example.com"
+are one customer and related tickets are an indexed ``customer_id`` lookup
+instead of a scan of ``query.customer_email``.  The customer row carries
+``ticket_count``, ``open_ticket_count`` and first/last contact times.
+
+Customers are resolved and counters refreshed in the same transaction as
+the ticket write: from the ORM flush hooks below for ordinary saves, and by
+``resolve_customer_ids``/``refresh_counters`` in the Core write paths (the
+write-behind flusher, bulk ingestion, inbox bulk actions).  Counters are
+recomputed from the ticket rows of the affected customers rather than
+incremented, so they cannot drift; a status-only change recounts just the
+open tickets.  Archived tickets (``app.archive``) still count towards
+``ticket_count`` and the contact times.
+
+``phone_normalized`` serves the inbox search: a search that looks like a
+phone number also matches customers by their normalized phone.
+"""
+import re
+
+from sqlalchemy import case, event, func, inspect, literal, or_, select, union_all, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from . import db
+from .models import ArchivedQuery, Customer, Query
+from .sla import CLOSED_STATUSES
+from .sql_helpers import insert_ignore
+
+
+def normalize_email(email):
+    email = (email or '').strip().lower()
+    return email or None
+
+
+def normalize_phone(phone):
+    """Digits only, with an international ``00`` prefix folded into ``+``."""
+    if not phone:
+        return None
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return None
+    if phone.strip().startswith('+'):
+        return '+' + digits
+    if digits.startswith('00'):
+        return '+' + digits[2:]
+    return digits
+
+
+def _lookup(connection, keys):
+    table = Customer.__table__
+    found = {}
+    keys = list(keys)
+    for start in range(0, len(keys), 1000):
+        found.update(connection.execute(
+            select(table.c.email_normalized, table.c.id).where(table.c.email_normalized.in_(keys[start:start + 1000]))
+        ).all())
+    return found
+
+
+def resolve_customer_ids(rows, connection=None):
+    """Set ``customer_id`` on ticket row dicts, creating missing customers; return the ids."""
+    connection = connection or db.session.connection()
+    latest = {}
+    for row in rows:
+        key = normalize_email(row.get('customer_email'))
+        if key:
+            latest[key] = row
+    ids = _lookup(connection, latest)
+    missing = [key for key in latest if key not in ids]
+    if missing:
+        insert_ignore(connection, Customer.__table__, [
+            {
+                'email_normalized': key,
+                'email': latest[key]['customer_email'].strip(),
+                'name': latest[key].get('customer_name'),
+                'phone': latest[key].get('customer_phone'),
+                'phone_normalized': normalize_phone(latest[key].get('customer_phone')),
+                'ticket_count': 0,
+                'open_ticket_count': 0,
+            }
+            for key in missing
+        ], ['email_normalized'])
+        ids.update(_lookup(connection, missing))
+    for row in rows:
+        row['customer_id'] = ids.get(normalize_email(row.get('customer_email')))
+    return set(ids.values())
+
+
+def phone_search_key(text):
+    """``normalize_phone`` of an inbox search that looks like a phone number, else None."""
+    if not text or not re.fullmatch(r'\+?[\d\s().-]+', text.strip()):
+        return None
+    normalized = normalize_phone(text)
+    return normalized if normalized and len(normalized.lstrip('+')) >= 6 else None
+
+
+def _open_condition(query):
+    return or_(query.c.status == None, query.c.status.notin_(CLOSED_STATUSES))  # noqa: E711
+
+
+def refresh_counters(customer_ids, connection=None):
+    """Recompute counters for ``customer_ids`` (a collection or a select of ids).
+
+    One grouped aggregate per table over the ``(customer_id, created_at)``
+    indexes, joined into a single ``UPDATE ... FROM``.
+    """
+    if not isinstance(customer_ids, Select) and not customer_ids:
+        return
+    connection = connection or db.session.connection()
+    customer = Customer.__table__
+    query = Query.__table__
+    archive = ArchivedQuery.__table__
+
+    def grouped(table, open_tickets):
+        return select(
+            table.c.customer_id, func.count().label('tickets'), open_tickets.label('open_tickets'),
+            func.min(table.c.created_at).label('first_contact_at'),
+            func.max(table.c.created_at).label('last_contact_at'),
+        ).where(table.c.customer_id.in_(customer_ids)).group_by(table.c.customer_id)
+
+    # Archived tickets are always closed.
+    both = union_all(grouped(query, func.count(case((_open_condition(query), 1)))),
+                     grouped(archive, literal(0))).subquery()
+    stats = select(
+        both.c.customer_id, func.sum(both.c.tickets).label('tickets'),
+        func.sum(both.c.open_tickets).label('open_tickets'),
+        func.min(both.c.first_contact_at).label('first_contact_at'),
+        func.max(both.c.last_contact_at).label('last_contact_at'),
+    ).group_by(both.c.customer_id).subquery()
+    connection.execute(update(customer).where(customer.c.id == stats.c.customer_id).values(
+        ticket_count=stats.c.tickets,
+        open_ticket_count=stats.c.open_tickets,
+        first_contact_at=stats.c.first_contact_at,
+        last_contact_at=stats.c.last_contact_at,
+    ))
+    # Customers whose last ticket was deleted have no row in ``stats``.
+    connection.execute(update(customer).where(
+        customer.c.id.in_(customer_ids),
+        ~select(query.c.id).where(query.c.customer_id == customer.c.id).exists(),
+        ~select(archive.c.id).where(archive.c.customer_id == customer.c.id).exists(),
+    ).values(ticket_count=0, open_ticket_count=0, first_contact_at=None, last_contact_at=None))
+
+
+def refresh_open_counts(customer_ids, connection=None):
+    """Recompute only ``open_ticket_count``, for status changes; live tickets only."""
+    if not customer_ids:
+        return
+    connection = connection or db.session.connection()
+    customer = Customer.__table__
+    query = Query.__table__
+    connection.execute(update(customer).where(customer.c.id.in_(customer_ids)).values(
+        open_ticket_count=select(func.count()).where(
+            query.c.customer_id == customer.c.id, _open_condition(query)).scalar_subquery(),
+    ))
+
+
+def _before_flush(session, flush_context, instances):
+    new = [obj for obj in session.new if isinstance(obj, Query) and obj.customer_id is None and obj.customer is None]
+    if not new:
+        return
+    rows = [{'customer_email': obj.customer_email, 'customer_name': obj.customer_name,
+             'customer_phone': obj.customer_phone} for obj in new]
+    with session.no_autoflush:
+        resolve_customer_ids(rows, session.connection())
+    for obj, row in zip(new, rows):
+        obj.customer_id = row['customer_id']
+
+
+def _after_flush(session, flush_context):
+    touched = {obj.customer_id for obj in session.new if isinstance(obj, Query)}
+    touched |= {obj.customer_id for obj in session.deleted if isinstance(obj, Query)}
+    status_only = set()
+    for obj in session.dirty:
+        if not isinstance(obj, Query):
+            continue
+        attrs = inspect(obj).attrs
+        if attrs.customer_id.history.has_changes():
+            touched.add(obj.customer_id)
+            touched.update(attrs.customer_id.history.deleted)
+        elif attrs.status.history.has_changes():
+            status_only.add(obj.customer_id)
+    touched.discard(None)
+    status_only -= touched
+    status_only.discard(None)
+    if touched:
+        refresh_counters(touched, session.connection())
+    if status_only:
+        refresh_open_counts(status_only, session.connection())
+
+
+def init_app(app):
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
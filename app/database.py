@@ -0,0 +1,210 @@
+"""
+Connection pooling profiles.
+
+``DB_PROFILE`` picks the engine options that ``create_app`` hands to
+Flask-SQLAlchemy (``auto`` means ``serverless`` on Vercel/Lambda and
+``server`` elsewhere):
+
+- ``serverless``: one short-lived process per request burst behind the
+  Neon pooler.  No pool of our own by default (``NullPool``; set
+  ``DB_SERVERLESS_POOL_SIZE`` to keep a connection or two between
+  invocations), a short connect timeout and no startup parameters, which
+  PgBouncer in transaction mode rejects.
+- ``server``: long-lived gunicorn workers and CLI jobs.  A ``DB_POOL_SIZE``
+  + ``DB_MAX_OVERFLOW`` LIFO pool with pre-ping, ``DB_POOL_RECYCLE`` below
+  the idle timeout of the server or pooler, TCP keepalives and a
+  ``DB_STATEMENT_TIMEOUT_MS`` per statement.  The timeout is a startup
+  parameter, so it is skipped (with a warning) on a ``-pooler`` host; use
+  the direct endpoint for long-lived workers.  Under the ``flask`` CLI
+  (migrations and their backfills, ``archive-queries``, ``generate-data``)
+  ``DB_CLI_STATEMENT_TIMEOUT_MS`` applies instead, by default none.
+
+Options already present in ``SQLALCHEMY_ENGINE_OPTIONS`` win over the
+profile.  SQLite keeps Flask-SQLAlchemy's defaults.
+
+The pool is instrumented for ``/metrics``: connection attempts and their
+duration, invalidations (failed pre-pings, dropped connections) and the
+active profile, next to the checkout and pool size metrics in
+``app.metrics``.  With ``DB_WARMUP`` the server profile opens
+``DB_POOL_SIZE`` connections in the background on each worker's first
+request, so later requests skip the TLS and auth round trips; call
+``warm_up(app)`` from a gunicorn ``post_fork`` hook to do it before any
+traffic.
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+
+import click
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from . import db
+from .metrics import registry
+
+log = logging.getLogger(__name__)
+
+PROFILES = ('serverless', 'server')
+
+CONNECTS = registry.counter(
+    'db_connections_opened_total', 'Database connection attempts by pool profile and outcome.', ('profile', 'outcome'))
+CONNECT_SECONDS = registry.histogram(
+    'db_connect_seconds', 'Time to open a database connection.',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+INVALIDATIONS = registry.counter(
+    'db_connections_invalidated_total', 'Pooled connections discarded after an error or failed pre-ping.',
+    ('profile',))
+_active = {}  # profile -> pool class name, for the info gauge
+_instrumented = weakref.WeakSet()
+registry.gauge('db_pool_profile', 'Pool profile in use (always 1).', ('profile', 'pool'),
+               lambda: {(profile, pool): 1 for profile, pool in _active.items()})
+
+
+def resolve_profile(config):
+    profile = config['DB_PROFILE']
+    if profile == 'auto':
+        serverless = os.environ.get('VERCEL') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+        return 'serverless' if serverless else 'server'
+    if profile not in PROFILES:
+        raise ValueError(f"DB_PROFILE must be 'auto', 'serverless' or 'server', not {profile!r}")
+    return profile
+
+
+def _is_pooler(url):
+    return '-pooler' in (url.host or '') or url.port == 6432
+
+
+def engine_options(config, profile):
+    """Engine options for ``profile`` and the configured database URL."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+        return {}
+    connect_args = {
+        'connect_timeout': config['DB_CONNECT_TIMEOUT'],
+        'application_name': f"{config['DB_APPLICATION_NAME']}-{profile}",
+    }
+    if profile == 'serverless':
+        size = config['DB_SERVERLESS_POOL_SIZE']
+        if not size:
+            return {'poolclass': NullPool, 'connect_args': connect_args}
+        return {'pool_size': size, 'max_overflow': 0, 'pool_timeout': config['DB_CONNECT_TIMEOUT'],
+                'pool_recycle': min(config['DB_POOL_RECYCLE'], 60), 'pool_pre_ping': True,
+                'connect_args': connect_args}
+
+    connect_args.update(keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+    # Batch jobs and migrations legitimately run statements longer than a request should.
+    cli = click.get_current_context(silent=True) is not None
+    timeout = config['DB_CLI_STATEMENT_TIMEOUT_MS' if cli else 'DB_STATEMENT_TIMEOUT_MS']
+    if timeout and _is_pooler(url):
+        log.warning('DB_STATEMENT_TIMEOUT_MS is not applied through the connection pooler at %s; '
+                    'use the direct endpoint for the server profile', url.host)
+    elif timeout:
+        connect_args['options'] = f'-c statement_timeout={int(timeout)}'
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+        'pool_use_lifo': True,
+        'connect_args': connect_args,
+    }
+
+
+def configure(app):
+    """Fill ``SQLALCHEMY_ENGINE_OPTIONS`` from the profile; call before ``db.init_app``."""
+    profile = resolve_profile(app.config)
+    options = engine_options(app.config, profile)
+    explicit = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    if 'connect_args' in explicit and 'connect_args' in options:
+        explicit = dict(explicit, connect_args=dict(options['connect_args'], **explicit['connect_args']))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(options, **explicit)
+    app.extensions['database'] = {'profile': profile, 'warmed': None, 'lock': threading.Lock()}
+
+
+def share_engines(parent, app):
+    """Let ``app`` use ``parent``'s engines (and pools) instead of creating its own; see ``app.lazy_admin``."""
+    # Flask-SQLAlchemy (pinned in requirements.txt) keys engines by app
+    # object and has no public way to alias them.
+    db._app_engines[app] = db._app_engines[parent]
+    app.teardown_appcontext(_remove_session)
+
+
+def _remove_session(exc):
+    db.session.remove()
+
+
+def _instrument(engine, profile):
+    if engine in _instrumented:
+        return
+    _instrumented.add(engine)
+
+    @event.listens_for(engine, 'do_connect')
+    def timed_connect(dialect, connection_record, cargs, cparams):
+        # Returning a connection replaces the dialect's own connect call.
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            connection = dialect.connect(*cargs, **cparams)
+            outcome = 'ok'
+            return connection
+        finally:
+            with registry.lock:
+                CONNECTS.inc(profile, outcome)
+                CONNECT_SECONDS.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'invalidate')
+    def invalidated(dbapi_connection, connection_record, exception):
+        with registry.lock:
+            INVALIDATIONS.inc(profile)
+
+    _active[profile] = type(engine.pool).__name__
+
+
+def warm_up(app=None, connections=None):
+    """Open ``connections`` pooled connections (default: the pool size); return how many opened."""
+    app = app or current_app._get_current_object()
+    with app.app_context():
+        engine = db.engine
+        size = getattr(engine.pool, 'size', lambda: 0)()
+        wanted = connections if connections is not None else size
+        opened = []
+        started = time.perf_counter()
+        try:
+            for _ in range(wanted):
+                opened.append(engine.connect())
+        except Exception:
+            log.warning('Database warm-up stopped after %d connections', len(opened), exc_info=True)
+        finally:
+            for connection in opened:
+                connection.close()
+        log.info('Warmed %d database connections in %.0f ms', len(opened), (time.perf_counter() - started) * 1000)
+        return len(opened)
+
+
+def _warm_up_once():
+    # On the first request of each process, so a pool created before a fork
+    # is never shared with the children.
+    app = current_app._get_current_object()
+    state = app.extensions['database']
+    if state['warmed'] == os.getpid():
+        return
+    with state['lock']:
+        if state['warmed'] == os.getpid():
+            return
+        state['warmed'] = os.getpid()
+    threading.Thread(target=warm_up, args=(app,), name='db-warm-up', daemon=True).start()
+
+
+def init_app(app):
+    profile = app.extensions['database']['profile']
+    with app.app_context():
+        engine = db.engine
+    if app.config['METRICS_ENABLED']:
+        _instrument(engine, profile)
+    if app.config['DB_WARMUP'] and profile == 'server' and engine.dialect.name == 'postgresql':
+        app.before_request(_warm_up_once)
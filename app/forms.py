@@ -160,6 +160,48 @@ class QueryUpdateForm(FlaskForm):
     submit = SubmitField('Update Query')
 
 
+# Form for inbox bulk actions over selected tickets or the current filter
+class QueryBulkActionForm(FlaskForm):
+    action = SelectField(
+        'Action',
+        choices=[
+            ('assign', 'Assign to'),
+            ('status', 'Set status'),
+            ('priority', 'Set priority'),
+            ('tag', 'Add tag'),
+            ('untag', 'Remove tag'),
+            ('close', 'Close'),
+        ],
+        validators=[DataRequired()],
+    )
+    scope = SelectField(
+        'Apply to',
+        choices=[('selected', 'Selected tickets'), ('filter', 'All tickets matching the filter')],
+        default='selected',
+    )
+    assigned_staff_id = SelectField('Staff', coerce=int, choices=[], default=0, validators=[Optional()])
+    status = SelectField(
+        'Status',
+        choices=[
+            ('Open', 'Open'),
+            ('Pending', 'Pending'),
+            ('In Progress', 'In Progress'),
+            ('Responded', 'Responded'),
+            ('Resolved', 'Resolved'),
+            ('Closed', 'Closed'),
+        ],
+        validators=[Optional()],
+    )
+    priority = SelectField(
+        'Priority',
+        choices=[('Normal', 'Normal'), ('Urgent', 'Urgent'), ('Escalated', 'Escalated')],
+        validators=[Optional()],
+    )
+    tag = StringField('Tag', validators=[Optional(), Length(max=50)])
+    older_than_days = IntegerField('Not updated for (days)', validators=[Optional(), NumberRange(min=1)])
+    submit = SubmitField('Apply')
+
+
 class QueryResponseForm(FlaskForm):
     template_id = SelectField('Use Template', coerce=int, validators=[Optional()], choices=[], default=0)
     channel = SelectField(
@@ -193,3 +235,11 @@ class QueryEscalationForm(FlaskForm):
         default='Escalated',
     )
     submit = SubmitField('Escalate')
+
+
+class ArchiveRestoreForm(FlaskForm):
+    submit = SubmitField('Restore to inbox')
+
+
+class SQLProfileResetForm(FlaskForm):
+    submit = SubmitField('Reset')
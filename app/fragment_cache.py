@@ -0,0 +1,79 @@
+"""
+Tagged template fragment caching.
+
+    {% cache 'home-banners', 3600, ['banners'] %} ... {% endcache %}
+
+The rendered fragment is stored in the app cache under its key plus the
+current version of each tag.  ``invalidate_fragments('banners')`` gives the
+tag a new version, so every fragment tagged with it misses on the next
+render without the cache backend having to know about tags.  Views pass
+unevaluated queries to cached fragments so a hit skips the database too.
+"""
+import uuid
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from . import cache
+from .metrics import cache_lookup
+from .replicas import note_invalidation
+
+TAG_PREFIX = 'fragment-tag:'
+
+
+def _tag_versions(tags):
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = dict(zip(keys, cache.get_many(*keys))) if keys else {}
+    missing = {key: uuid.uuid4().hex[:8] for key, version in versions.items() if version is None}
+    if missing:
+        cache.set_many(missing, timeout=0)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate_fragments(*tags):
+    """Expire every cached fragment carrying any of ``tags``."""
+    cache.set_many({TAG_PREFIX + tag: uuid.uuid4().hex[:8] for tag in tags}, timeout=0)
+    note_invalidation()
+
+
+def render_fragment(key, timeout, tags, render):
+    """Return the cached fragment for ``key``, rendering it on a miss."""
+    if not current_app.config['FRAGMENT_CACHE_ENABLED']:
+        return render()
+    tags = sorted(tags or ())
+    cache_key = ':'.join(['fragment', str(key)] + _tag_versions(tags))
+    body = cache.get(cache_key)
+    cache_lookup('fragment', body is not None)
+    if body is None:
+        body = str(render())
+        if timeout is None:
+            timeout = current_app.config['FRAGMENT_CACHE_DEFAULT_TIMEOUT']
+        cache.set(cache_key, body, timeout=timeout)
+    return Markup(body)
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key[, timeout[, tags]] %}...{% endcache %}``"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        if len(args) > 3:
+            parser.fail('cache takes at most three arguments: key, timeout, tags', lineno)
+        args += [nodes.Const(None)] * (3 - len(args))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache', args), [], [], body).set_lineno(lineno)
+
+    def _cache(self, key, timeout, tags, caller):
+        return render_fragment(key, timeout, tags, caller)
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
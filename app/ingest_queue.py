@@ -0,0 +1,308 @@
+"""
+Write-behind ingestion for the public enquiry forms.
+
+With ``INGEST_QUEUE_ENABLED`` the home and contact forms do not touch the
+main database: ``enqueue_query`` assigns the ticket number and SLA, appends
+the row to a local SQLite queue (WAL, ``synchronous=FULL``) and returns.
+A flusher thread (or ``flask flush-ingest-queue``) claims batches with a
+lease and writes them to the ``query`` table with one multi-row INSERT.
+Every row carries an ``ingest_key`` assigned at enqueue time; rows whose key
+is already in the table are skipped, so a batch that was committed but not
+acknowledged is harmless to replay.  A row whose ticket number is already
+taken by another live or archived query is given a new one rather than
+dropped.  The flusher starts with the app (and again in each forked
+worker), so rows left behind by a restart are not stranded.  A failing batch is
+retried row by row; rows that keep failing back off exponentially and are
+parked as dead after ``INGEST_MAX_ATTEMPTS``.
+
+With tracing on, each row carries the submitting request's ``traceparent``
+and the flusher's batch span links back to those requests.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import insert, select
+
+from . import db, tracing
+from .customers import refresh_counters, resolve_customer_ids
+from .live import record_event
+from .models import Query, default_sla_deadline, new_ticket_number, taken_ticket_numbers
+
+log = logging.getLogger(__name__)
+
+DATETIME_FIELDS = ('created_at', 'updated_at', 'sla_deadline', 'response_due_at')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_query (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_number TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_pending_query_available ON pending_query (dead, available_at);
+"""
+
+
+class IngestQueue:
+    """Durable FIFO of pending ``query`` rows in a local SQLite file."""
+
+    def __init__(self, path, lease_seconds=60):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+        return conn
+
+    def put(self, row):
+        now = time.time()
+        payload = json.dumps(row, default=lambda value: value.isoformat())
+        self._connect().execute(
+            'INSERT INTO pending_query (ticket_number, payload, enqueued_at, available_at) VALUES (?, ?, ?, ?)',
+            (row['ticket_number'], payload, now, now),
+        )
+
+    def claim(self, limit):
+        """Lease up to ``limit`` due rows; return ``[(id, row, attempts)]``."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            items = conn.execute(
+                'SELECT id, payload, attempts FROM pending_query '
+                'WHERE dead = 0 AND available_at <= ? ORDER BY id LIMIT ?',
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                'UPDATE pending_query SET available_at = ? WHERE id = ?',
+                [(now + self.lease_seconds, item_id) for item_id, _, _ in items],
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return [(item_id, _decode(payload), attempts) for item_id, payload, attempts in items]
+
+    def ack(self, ids):
+        if ids:
+            self._connect().execute(
+                f"DELETE FROM pending_query WHERE id IN ({','.join('?' * len(ids))})", list(ids)
+            )
+
+    def retry(self, item_id, attempts, error, max_attempts, backoff):
+        attempts += 1
+        self._connect().execute(
+            'UPDATE pending_query SET attempts = ?, last_error = ?, available_at = ?, dead = ? WHERE id = ?',
+            (attempts, error[:1000], time.time() + backoff * 2 ** attempts,
+             int(attempts >= max_attempts), item_id),
+        )
+
+    def stats(self):
+        pending, dead = self._connect().execute(
+            'SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM pending_query'
+        ).fetchone()
+        return {'pending': pending, 'dead': dead}
+
+
+def _decode(payload):
+    row = json.loads(payload)
+    for field in DATETIME_FIELDS:
+        if row.get(field):
+            row[field] = datetime.fromisoformat(row[field])
+    return row
+
+
+def get_queue(app=None):
+    app = app or current_app
+    state = app.extensions['ingest_queue']
+    if state['queue'] is None:
+        with state['lock']:
+            if state['queue'] is None:
+                state['queue'] = IngestQueue(app.config['INGEST_QUEUE_PATH'])
+    return state['queue']
+
+
+def enqueue_query(**fields):
+    """Queue a new enquiry and return its ticket number."""
+    now = datetime.utcnow()
+    sla_deadline = default_sla_deadline(now)
+    row = dict(
+        fields,
+        ingest_key=uuid.uuid4().hex,
+        ticket_number=new_ticket_number(),
+        status='Open',
+        priority='Normal',
+        created_at=now,
+        updated_at=now,
+        sla_deadline=sla_deadline,
+        response_due_at=sla_deadline,
+        sla_state='ok',
+    )
+    traceparent = tracing.current_traceparent()
+    if traceparent:
+        row['traceparent'] = traceparent
+    app = current_app._get_current_object()
+    queue = get_queue(app)
+    while True:
+        try:
+            queue.put(row)
+            break
+        except sqlite3.IntegrityError:
+            row['ticket_number'] = new_ticket_number()  # already pending under another submission
+    _ensure_flusher(app)
+    return row['ticket_number']
+
+
+def _insert_rows(rows):
+    """Insert rows not already present (by ingest key); return (inserted, skipped)."""
+    table = Query.__table__
+    keys = [row['ingest_key'] for row in rows]
+    existing = set(db.session.execute(
+        select(table.c.ingest_key).where(table.c.ingest_key.in_(keys))
+    ).scalars())
+    fresh = [row for row in rows if row['ingest_key'] not in existing]
+    if fresh:
+        _reissue_taken_tickets(fresh)
+        customer_ids = resolve_customer_ids(fresh)
+        db.session.execute(insert(table).values(fresh))
+        refresh_counters(customer_ids)
+        record_event('bulk', {'action': 'created', 'count': len(fresh),
+                              'tickets': [row['ticket_number'] for row in fresh[:50]]})
+    db.session.commit()
+    return len(fresh), len(rows) - len(fresh)
+
+
+def _reissue_taken_tickets(rows):
+    # The visitor was shown the queued number; a collision is rare enough
+    # that logging it beats losing the enquiry.
+    taken = taken_ticket_numbers([row['ticket_number'] for row in rows])
+    for row in rows:
+        if row['ticket_number'] in taken:
+            ticket_number = new_ticket_number()
+            while taken_ticket_numbers([ticket_number]):
+                ticket_number = new_ticket_number()
+            log.warning('Queued query %s: ticket %s is taken, issued %s', row['ingest_key'],
+                        row['ticket_number'], ticket_number)
+            row['ticket_number'] = ticket_number
+
+
+def flush_batch(queue, batch_size, max_attempts, backoff):
+    """Move one batch into the database; return counts, or ``None`` when idle."""
+    claimed = queue.claim(batch_size)
+    if not claimed:
+        return None
+    traceparents = [row.pop('traceparent', None) for _, row, _ in claimed]
+    with tracing.span('ingest.flush_batch', {'batch.size': len(claimed)}, root=True,
+                      links=tracing.link_to(traceparents)) as current:
+        result = _flush_claimed(queue, claimed, max_attempts, backoff)
+        if current is not None:
+            for key, value in result.items():
+                current.set(f'batch.{key}', value)
+    return result
+
+
+def _flush_claimed(queue, claimed, max_attempts, backoff):
+    result = {'inserted': 0, 'skipped': 0, 'failed': 0}
+    try:
+        inserted, skipped = _insert_rows([row for _, row, _ in claimed])
+        queue.ack([item_id for item_id, _, _ in claimed])
+        result.update(inserted=inserted, skipped=skipped)
+        return result
+    except Exception:
+        db.session.rollback()
+        log.warning('Batch insert of %d queued queries failed; retrying one by one', len(claimed), exc_info=True)
+
+    for item_id, row, attempts in claimed:
+        try:
+            inserted, skipped = _insert_rows([row])
+        except Exception as exc:
+            db.session.rollback()
+            queue.retry(item_id, attempts, repr(exc), max_attempts, backoff)
+            result['failed'] += 1
+            continue
+        queue.ack([item_id])
+        result['inserted'] += inserted
+        result['skipped'] += skipped
+    return result
+
+
+def drain(app=None, batch_size=None):
+    """Flush every due row; return the summed counts."""
+    app = app or current_app
+    config = app.config
+    queue = get_queue(app)
+    totals = {'inserted': 0, 'skipped': 0, 'failed': 0}
+    while True:
+        result = flush_batch(queue, batch_size or config['INGEST_BATCH_SIZE'],
+                             config['INGEST_MAX_ATTEMPTS'], config['INGEST_RETRY_BACKOFF'])
+        if result is None:
+            return totals
+        for key, value in result.items():
+            totals[key] += value
+        if result['failed'] and not (result['inserted'] or result['skipped']):
+            return totals
+
+
+class QueueFlusher(threading.Thread):
+    """Background thread draining the queue every ``INGEST_FLUSH_INTERVAL`` seconds."""
+
+    def __init__(self, app):
+        super().__init__(name='ingest-queue-flusher', daemon=True)
+        self.app = app
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = self.app.config['INGEST_FLUSH_INTERVAL']
+        while not self.stopped.wait(interval):
+            with self.app.app_context():
+                try:
+                    drain(self.app)
+                except Exception:
+                    log.exception('Flushing the ingestion queue failed')
+                finally:
+                    db.session.remove()
+
+
+def _ensure_flusher(app):
+    # Threads do not survive a fork: a worker forked from a preloading master
+    # starts its own on its first request.
+    state = app.extensions['ingest_queue']
+    if not app.config['INGEST_FLUSH_IN_PROCESS'] or (state['flusher'] and state['flusher'].is_alive()):
+        return
+    with state['lock']:
+        if not (state['flusher'] and state['flusher'].is_alive()):
+            state['flusher'] = QueueFlusher(app)
+            state['flusher'].start()
+
+
+def _flusher_hook():
+    _ensure_flusher(current_app._get_current_object())
+
+
+def init_app(app):
+    app.extensions.setdefault('ingest_queue', {'queue': None, 'flusher': None, 'lock': threading.Lock()})
+    if not (app.config['INGEST_QUEUE_ENABLED'] and app.config['INGEST_FLUSH_IN_PROCESS']):
+        return
+    app.before_request(_flusher_hook)
+    # Drain what a previous process left behind without waiting for a
+    # request, except under the flask CLI (migrations, flush-ingest-queue).
+    if click.get_current_context(silent=True) is None:
+        _ensure_flusher(app)
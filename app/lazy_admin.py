@@ -0,0 +1,42 @@
+"""
+Deferred admin application for fast cold starts.
+
+With ``LAZY_ADMIN_BLUEPRINT`` enabled, ``create_app`` builds the public site
+without importing ``admin_routes`` (and the admin-only forms and
+dependencies behind it).  ``LazyAdminDispatcher`` wraps the public app's
+WSGI callable and hands any request under ``LAZY_ADMIN_PREFIXES`` to an
+admin app that is only built on the first such request.  That app is built
+on top of the public one (``create_app(parent=...)``): it shares its config,
+database engines and every extension's state, so loading it opens no
+second pool and starts no second set of background services.
+"""
+import threading
+
+
+class LazyAdminDispatcher:
+    """WSGI middleware routing admin URLs to an app built on first use."""
+
+    def __init__(self, public_app, factory):
+        self.public_app = public_app
+        self.public_wsgi_app = public_app.wsgi_app
+        self.factory = factory
+        self.prefixes = tuple(p.rstrip('/') for p in public_app.config['LAZY_ADMIN_PREFIXES'])
+        self.admin_app = None
+        self._lock = threading.Lock()
+
+    def _is_admin_path(self, path):
+        return any(path == prefix or path.startswith(prefix + '/') for prefix in self.prefixes)
+
+    def get_admin_app(self):
+        if self.admin_app is None:
+            with self._lock:
+                if self.admin_app is None:
+                    admin_app = self.factory()
+                    self.public_app.logger.info('Admin application loaded on first request')
+                    self.admin_app = admin_app
+        return self.admin_app
+
+    def __call__(self, environ, start_response):
+        if self._is_admin_path(environ.get('PATH_INFO', '')):
+            return self.get_admin_app().wsgi_app(environ, start_response)
+        return self.public_wsgi_app(environ, start_response)
@@ -0,0 +1,301 @@
+"""
+Live updates for the admin query inbox.
+
+Every ticket change worth showing (new ticket, status, priority,
+assignment) is appended to ``query_event`` in the same transaction as the
+change itself, from the ORM flush hooks below, so any worker that writes a
+ticket publishes it and any worker can serve it.  Event ids come from the
+table's own sequence, so concurrent writers never wait on each other; the
+price is that ids may commit out of order and a rolled-back transaction
+leaves a hole.  Readers therefore stop at the first missing id until it
+commits or, after ``LIVE_INBOX_GAP_GRACE`` seconds, is taken to be a
+rollback and skipped.  Clients resume with ``Last-Event-ID`` (SSE) or
+``?cursor=`` (long-poll).  A cursor at or below the prune watermark (the
+``query_event_pruned`` row of ``change_counter``, written only by
+``prune_events``) gets a ``reset`` event instead.
+
+Core-level writes (bulk ingestion, the write-behind flusher, the SLA
+sweeper) bypass the ORM hooks and call ``record_event`` themselves.
+
+Waking idle streams is the broker's job and it only carries the latest id;
+the events themselves are always read from the table.  ``LIVE_INBOX_BROKER``
+picks the transport: ``local`` notifies streams in this process only (the
+dev server, single-worker deployments), ``database`` additionally polls the
+newest event id every ``LIVE_INBOX_POLL_INTERVAL`` seconds so commits from other
+workers and processes are picked up.  The latter is the stand-in for a real
+pub/sub channel; a Redis or ``LISTEN/NOTIFY`` broker only needs the same
+``publish``/``wait`` pair.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import ChangeCounter, Query, QueryEvent
+
+PRUNED_COUNTER = 'query_event_pruned'
+TRACKED_FIELDS = (('status', 'status'), ('priority', 'priority'), ('assigned_staff_id', 'assigned'))
+_SESSION_KEY = 'live_inbox_seq'
+
+
+def _snapshot(query_obj):
+    return {
+        'query_id': query_obj.id,
+        'ticket_number': query_obj.ticket_number,
+        'status': query_obj.status,
+        'priority': query_obj.priority,
+        'assigned_staff_id': query_obj.assigned_staff_id,
+        'sla_state': query_obj.sla_state,
+    }
+
+
+def _write_events(session, events):
+    """Insert ``[(kind, query_id, payload)]`` on the session's connection."""
+    if not events:
+        return
+    table = QueryEvent.__table__
+    now = datetime.utcnow()
+    ids = session.connection().execute(insert(table).returning(table.c.id), [
+        {'query_id': query_id, 'kind': kind, 'payload': json.dumps(payload, default=str), 'created_at': now}
+        for kind, query_id, payload in events
+    ]).scalars().all()
+    session.info[_SESSION_KEY] = max(ids + [session.info.get(_SESSION_KEY, 0)])
+
+
+def record_event(kind, payload, query_id=None, session=None):
+    """Publish an event for a change made outside the ORM; commits with the caller."""
+    _write_events(session or db.session(), [(kind, query_id, payload)])
+
+
+def _after_flush(session, flush_context):
+    events = []
+    for obj in session.new:
+        if isinstance(obj, Query):
+            snapshot = _snapshot(obj)
+            snapshot.update(customer_name=obj.customer_name, query_type=obj.query_type, source=obj.source)
+            events.append(('created', obj.id, snapshot))
+    for obj in session.dirty:
+        if not isinstance(obj, Query):
+            continue
+        state = inspect(obj)
+        for field, kind in TRACKED_FIELDS:
+            history = state.attrs[field].history
+            if not history.added or (history.deleted and history.deleted[0] == history.added[0]):
+                continue
+            snapshot = _snapshot(obj)
+            snapshot['previous'] = history.deleted[0] if history.deleted else None
+            events.append((kind, obj.id, snapshot))
+    _write_events(session, events)
+
+
+def _load_previous(target, value, oldvalue, initiator):
+    # Registered with ``active_history`` so the old value is loaded even when
+    # the attribute was expired by a commit; otherwise re-saving an unchanged
+    # status would look like a change and ``previous`` would be unknown.
+    return value
+
+
+def _after_commit(session):
+    seq = session.info.pop(_SESSION_KEY, None)
+    if seq is not None and has_app_context() and 'live_inbox' in current_app.extensions:
+        get_broker().publish(seq)
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+class LocalBroker:
+    """Wakes streams waiting in this process."""
+
+    def __init__(self):
+        self.latest = 0
+        self._condition = threading.Condition()
+
+    def publish(self, seq):
+        with self._condition:
+            if seq > self.latest:
+                self.latest = seq
+            self._condition.notify_all()
+
+    def wait(self, cursor, timeout):
+        """Block until an id above ``cursor`` is known or ``timeout`` passes."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.latest > cursor, timeout)
+
+
+class DatabaseBroker(LocalBroker):
+    """Local wake-ups plus polling of the newest event id for other workers' commits."""
+
+    def __init__(self, app, poll_interval):
+        super().__init__()
+        self.app = app
+        self.poll_interval = poll_interval
+
+    def wait(self, cursor, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if super().wait(cursor, min(self.poll_interval, max(remaining, 0))):
+                return True
+            with self.app.app_context():
+                with db.engine.connect() as connection:
+                    latest = _latest(connection)
+            if latest > cursor:
+                self.publish(latest)
+                return True
+            if remaining <= self.poll_interval:
+                return False
+
+
+def get_broker(app=None):
+    app = app or current_app._get_current_object()
+    state = app.extensions['live_inbox']
+    if state['broker'] is None:
+        with state['lock']:
+            if state['broker'] is None:
+                if app.config['LIVE_INBOX_BROKER'] == 'local':
+                    state['broker'] = LocalBroker()
+                else:
+                    state['broker'] = DatabaseBroker(app, app.config['LIVE_INBOX_POLL_INTERVAL'])
+    return state['broker']
+
+
+def _latest(connection):
+    return connection.execute(select(func.max(QueryEvent.id))).scalar() or 0
+
+
+def _pruned_through(connection):
+    table = ChangeCounter.__table__
+    return connection.execute(select(table.c.value).where(table.c.name == PRUNED_COUNTER)).scalar() or 0
+
+
+def current_cursor():
+    """The id of the newest event; pages start following from here."""
+    return _latest(db.session.connection())
+
+
+def _read(cursor, limit):
+    """``(events, reset, held)``: ``held`` is the highest id left behind a gap, or 0."""
+    connection = db.session.connection()
+    rows = db.session.execute(
+        select(QueryEvent).where(QueryEvent.id > cursor).order_by(QueryEvent.id).limit(limit)
+    ).scalars().all()
+    if (not rows or rows[0].id != cursor + 1) and cursor:
+        # Only a cursor that is not followed by its next id can be stale.
+        if cursor < _pruned_through(connection) or (not rows and cursor > _latest(connection)):
+            return [], True, 0
+    settled = datetime.utcnow() - timedelta(seconds=current_app.config['LIVE_INBOX_GAP_GRACE'])
+    events = []
+    expected = cursor + 1
+    for row in rows:
+        if row.id != expected and row.created_at > settled:
+            # ``expected`` may still commit; hold everything after it for now.
+            return events, False, rows[-1].id
+        events.append({'id': row.id, 'kind': row.kind, 'query_id': row.query_id, 'data': json.loads(row.payload)})
+        expected = row.id + 1
+    return events, False, 0
+
+
+def events_after(cursor, limit=100):
+    """Return ``(events, reset)`` for ids above ``cursor``.
+
+    ``reset`` is true when the client's cursor cannot be resumed (the events
+    after it were pruned, or the database was reset); ``events`` is then
+    empty and the client should reload and follow from ``current_cursor()``.
+    """
+    events, reset, _ = _read(cursor, limit)
+    return events, reset
+
+
+def _wait(broker, cursor, held, timeout):
+    # While events are held behind a gap, ``latest`` is already past the
+    # cursor; wait for something newer, or re-check when the grace runs out.
+    if held:
+        broker.wait(max(held, broker.latest), min(timeout, current_app.config['LIVE_INBOX_GAP_GRACE']))
+        return True
+    return broker.wait(cursor, timeout)
+
+
+def wait_for_events(cursor, timeout):
+    """Long-poll: events after ``cursor``, waiting up to ``timeout`` seconds for some."""
+    events, reset, held = _read(cursor, 100)
+    if events or reset or timeout <= 0:
+        return events, reset
+    # Give the connection back to the pool while idle.
+    db.session.close()
+    if _wait(get_broker(), cursor, held, timeout):
+        return events_after(cursor)
+    return [], False
+
+
+def _sse(event_id=None, kind=None, data=None, comment=None):
+    if comment is not None:
+        return f': {comment}\n\n'
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if kind:
+        lines.append(f'event: {kind}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(cursor):
+    """Yield SSE frames from ``cursor`` for ``LIVE_INBOX_STREAM_SECONDS``.
+
+    The stream ends on purpose so a worker is never held indefinitely; the
+    browser reconnects after ``retry`` and resumes with ``Last-Event-ID``.
+    """
+    config = current_app.config
+    broker = get_broker()
+    deadline = time.monotonic() + config['LIVE_INBOX_STREAM_SECONDS']
+    heartbeat = config['LIVE_INBOX_HEARTBEAT']
+    yield f"retry: {config['LIVE_INBOX_RETRY_MS']}\n\n"
+    while True:
+        events, reset, held = _read(cursor, 100)
+        db.session.close()
+        if reset:
+            yield _sse(kind='reset', data={'cursor': cursor})
+            return
+        for item in events:
+            cursor = item['id']
+            yield _sse(item['id'], item['kind'], item['data'])
+        if events:
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if not _wait(broker, cursor, held, min(heartbeat, remaining)):
+            yield _sse(comment='keep-alive')
+
+
+def prune_events(older_than_hours=None):
+    """Delete events past ``LIVE_INBOX_RETENTION_HOURS``; return how many."""
+    hours = older_than_hours if older_than_hours is not None else current_app.config['LIVE_INBOX_RETENTION_HOURS']
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    through = db.session.execute(select(func.max(QueryEvent.id)).where(QueryEvent.created_at < cutoff)).scalar()
+    if through is None:
+        return 0
+    result = db.session.execute(delete(QueryEvent).where(QueryEvent.id <= through))
+    # Cursors at or below the watermark can no longer be resumed (see ``_read``).
+    table = ChangeCounter.__table__
+    if not db.session.execute(update(table).where(table.c.name == PRUNED_COUNTER).values(value=through)).rowcount:
+        db.session.execute(insert(table).values(name=PRUNED_COUNTER, value=through))
+    db.session.commit()
+    return result.rowcount
+
+
+def init_app(app):
+    app.extensions.setdefault('live_inbox', {'broker': None, 'lock': threading.Lock()})
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+        for field, _ in TRACKED_FIELDS:
+            event.listen(getattr(Query, field), 'set', _load_previous, active_history=True, retval=True)
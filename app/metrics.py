@@ -0,0 +1,326 @@
+"""
+In-process metrics in the Prometheus text format.
+
+The registry is a handful of counters, histograms and gauges kept in
+process memory and updated from request hooks, Flask's template signals, a
+timing wrapper around the database pool and explicit ``cache_lookup``
+calls in the caching layers:
+
+- ``http_request_duration_seconds`` / ``http_requests_total`` per endpoint
+  (``main.packages``, ``admin.query_inbox``...), method and status;
+- ``form_submissions_total`` per endpoint and outcome (a redirect after a
+  POST is ``accepted``, a re-rendered form ``rejected``);
+- ``cache_requests_total`` per namespace and ``hit``/``miss``;
+- ``db_pool_checkout_seconds`` and the pool size gauges;
+- ``template_render_seconds`` per template.
+
+``GET /metrics`` serves them to a ``METRICS_TOKEN`` bearer or a logged-in
+staff user.  Under gunicorn every worker has its own registry, so with
+``METRICS_DIR`` set each process writes a snapshot to
+``METRICS_DIR/<pid>.json`` (at most every ``METRICS_FLUSH_INTERVAL``
+seconds, and at exit) and ``/metrics`` merges all snapshots: counters and
+histograms are summed over every file, gauges over live processes only.
+Point ``METRICS_DIR`` at a directory that is emptied on deploy.
+"""
+import atexit
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+
+from flask import current_app, g, request
+from flask.signals import before_render_template, template_rendered
+from flask_login import current_user
+
+from . import db
+
+FORM_MIMETYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def state(self):
+        return [[list(labels), value] for labels, value in self.values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.values = {}  # labels -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, value, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        entry[0][index] += 1
+        entry[1] += value
+
+    def state(self):
+        return [[list(labels), [list(counts), total]] for labels, (counts, total) in self.values.items()]
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels, read):
+        self.name, self.help, self.labels = name, help, labels
+        self.read = read  # () -> {labels tuple: value}, evaluated at snapshot time
+
+    def state(self):
+        return [[list(labels), value] for labels, value in self.read().items()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _add(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, tuple(labels)))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, tuple(labels), tuple(buckets)))
+
+    def gauge(self, name, help, labels, read):
+        return self._add(Gauge(name, help, tuple(labels), read))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'metrics': {
+                    metric.name: {'type': metric.kind, 'help': metric.help, 'labels': list(metric.labels),
+                                  'buckets': list(getattr(metric, 'buckets', ())), 'values': metric.state()}
+                    for metric in self.metrics.values()
+                },
+            }
+
+
+# One registry per process, shared by the public and lazily built admin apps.
+registry = Registry()
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint.', ('endpoint', 'method'))
+REQUESTS = registry.counter(
+    'http_requests_total', 'Responses by endpoint and status.', ('endpoint', 'method', 'status'))
+FORM_SUBMISSIONS = registry.counter(
+    'form_submissions_total', 'Form POSTs by endpoint and outcome.', ('endpoint', 'outcome'))
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Cache lookups by namespace.', ('namespace', 'result'))
+POOL_CHECKOUT = registry.histogram(
+    'db_pool_checkout_seconds', 'Time to get a connection from the pool.',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+TEMPLATE_RENDER = registry.histogram('template_render_seconds', 'Template render time.', ('template',))
+_pools = []
+
+
+def _pool_sizes():
+    values = {}
+    for pool in _pools:
+        for name in ('size', 'checkedout', 'overflow', 'checkedin'):
+            method = getattr(pool, name, None)
+            if method is not None:
+                # QueuePool reports unused overflow capacity as a negative number.
+                values[(name,)] = values.get((name,), 0) + max(method(), 0)
+    return values
+
+
+registry.gauge('db_pool_connections', 'Pool size, checked-out, overflow and idle connections.', ('state',),
+               _pool_sizes)
+
+
+def cache_lookup(namespace, hit):
+    """Count a cache read in ``namespace``."""
+    with registry.lock:
+        CACHE_REQUESTS.inc(namespace, 'hit' if hit else 'miss')
+
+
+def _time_pool(pool):
+    # The pool has no event before a checkout starts, so its public
+    # ``connect`` is wrapped instead.
+    if any(timed is pool for timed in _pools):
+        return  # shared with the lazily built admin app
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            with registry.lock:
+                POOL_CHECKOUT.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    _pools.append(pool)
+
+
+def _start_request():
+    g._metrics_started = time.perf_counter()
+
+
+def _finish_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return response
+    # Unmatched URLs share one label so scanners cannot grow the series count.
+    endpoint = request.endpoint or 'unmatched'
+    status = response.status_code
+    with registry.lock:
+        REQUEST_DURATION.observe(time.perf_counter() - started, endpoint, request.method)
+        REQUESTS.inc(endpoint, request.method, str(status))
+        if request.method == 'POST' and request.mimetype in FORM_MIMETYPES:
+            outcome = 'error' if status >= 500 else 'accepted' if 300 <= status < 400 else 'rejected'
+            FORM_SUBMISSIONS.inc(endpoint, outcome)
+    _maybe_flush(current_app.config)
+    return response
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('_metrics_templates', []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stack = g.get('_metrics_templates')
+    if stack:
+        with registry.lock:
+            TEMPLATE_RENDER.observe(time.perf_counter() - stack.pop(), template.name or 'string')
+
+
+_flush_state = {'last': 0.0, 'atexit': False}
+
+
+def _snapshot_path(directory, pid=None):
+    return os.path.join(directory, f'{pid or os.getpid()}.json')
+
+
+def flush(directory):
+    """Write this process's snapshot to ``directory``."""
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory)
+    temp = f'{path}.tmp'
+    with open(temp, 'w') as handle:
+        json.dump(registry.snapshot(), handle)
+    os.replace(temp, path)
+    _flush_state['last'] = time.monotonic()
+
+
+def _maybe_flush(config):
+    directory = config['METRICS_DIR']
+    if directory and time.monotonic() - _flush_state['last'] >= config['METRICS_FLUSH_INTERVAL']:
+        try:
+            flush(directory)
+        except OSError:
+            current_app.logger.warning('Could not write metrics snapshot to %s', directory, exc_info=True)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect(directory=None):
+    """Merged snapshots: this process only, or every process writing to ``directory``."""
+    if not directory:
+        return registry.snapshot()['metrics']
+    flush(directory)
+    merged = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as handle:
+                snapshot = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        alive = snapshot['pid'] == os.getpid() or _alive(snapshot['pid'])
+        for name, metric in snapshot['metrics'].items():
+            if metric['type'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, dict(metric, values=[]))
+            index = {tuple(labels): position for position, (labels, _) in enumerate(target['values'])}
+            for labels, value in metric['values']:
+                position = index.get(tuple(labels))
+                if position is None:
+                    index[tuple(labels)] = len(target['values'])
+                    target['values'].append([labels, value])
+                elif metric['type'] == 'histogram':
+                    counts, total = target['values'][position][1]
+                    target['values'][position][1] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+                else:
+                    target['values'][position][1] += value
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def render(metrics):
+    """Prometheus text exposition (format 0.0.4) of ``collect()`` output."""
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for labels, value in sorted(metric['values'], key=lambda item: item[0]):
+            if metric['type'] != 'histogram':
+                lines.append(f'{name}{_labels(metric["labels"], labels)} {value}')
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(metric["labels"], labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(metric["labels"], labels)} {total}')
+            lines.append(f'{name}_count{_labels(metric["labels"], labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized():
+    """A ``METRICS_TOKEN`` bearer token, or a logged-in staff session."""
+    token = current_app.config['METRICS_TOKEN']
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer '):
+        return hmac.compare_digest(header[len('Bearer '):].strip(), token)
+    return current_user.is_authenticated
+
+
+def init_app(app):
+    app.extensions['metrics'] = {'enabled': app.config['METRICS_ENABLED']}
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    with app.app_context():
+        _time_pool(db.engine.pool)
+    if app.config['METRICS_DIR'] and not _flush_state['atexit']:
+        atexit.register(flush, app.config['METRICS_DIR'])
+        _flush_state['atexit'] = True
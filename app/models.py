@@ -113,6 +113,37 @@ class Language(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     is_default = db.Column(db.Boolean, default=False)
 
+# One row per customer, keyed on normalized email (see app/customers.py); counters are kept
+# current from Query writes so the related-tickets panel needs no scan of ``query``.
+class Customer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email_normalized = db.Column(db.String(100), unique=True, nullable=False)
+    phone_normalized = db.Column(db.String(20), nullable=True, index=True)
+    name = db.Column(db.String(100), nullable=True)
+    email = db.Column(db.String(100), nullable=True)
+    phone = db.Column(db.String(20), nullable=True)
+    ticket_count = db.Column(db.Integer, nullable=False, default=0)
+    open_ticket_count = db.Column(db.Integer, nullable=False, default=0)
+    first_contact_at = db.Column(db.DateTime, nullable=True)
+    last_contact_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)  # normalized, see app/tags.py
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+
+query_tag = db.Table(
+    'query_tag',
+    db.Column('query_id', db.Integer, db.ForeignKey('query.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    # Tag filters and facet counts read (tag_id, query_id) without touching ``query``.
+    db.Index('ix_query_tag_tag_query', 'tag_id', 'query_id'),
+)
+
+
 class Query(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_name = db.Column(db.String(100), nullable=False)
@@ -125,7 +156,8 @@ class Query(db.Model):
     message = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
-    sla_deadline = db.Column(db.DateTime, nullable=True)
+    sla_deadline = db.Column(db.DateTime, nullable=True, index=True)
+    sla_state = db.Column(db.String(20), default='ok', index=True)  # ok, due_soon, overdue; None once closed (``flask sweep-sla``)
     response_due_at = db.Column(db.DateTime, nullable=True)
     first_response_at = db.Column(db.DateTime, nullable=True)
     resolved_at = db.Column(db.DateTime, nullable=True)
@@ -134,11 +166,21 @@ class Query(db.Model):
     last_contact_channel = db.Column(db.String(50), nullable=True)
     last_response_summary = db.Column(db.Text, nullable=True)
     ticket_number = db.Column(db.String(20), unique=True, index=True)
-    tags = db.Column(db.String(255), nullable=True)  # comma separated labels
     source = db.Column(db.String(50), nullable=True)  # web, whatsapp, phone, etc.
+    external_id = db.Column(db.String(100), nullable=True)  # id in the source channel, for bulk ingestion dedupe
+    ingest_key = db.Column(db.String(32), nullable=True)  # idempotency key of a write-behind queued submission
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True)
     assigned_staff = db.relationship('User', backref='assigned_queries', lazy=True)
+    customer = db.relationship('Customer', backref=db.backref('queries', lazy='dynamic'), lazy=True)
+    tags = db.relationship('Tag', secondary=query_tag, lazy=True, order_by='Tag.name')
     responses = db.relationship('QueryResponse', backref='query', lazy=True, cascade='all, delete-orphan', order_by='QueryResponse.created_at')
 
+    __table_args__ = (
+        db.Index('uq_query_source_external_id', 'source', 'external_id', unique=True),
+        db.Index('uq_query_ingest_key', 'ingest_key', unique=True),
+        db.Index('ix_query_customer_created', 'customer_id', 'created_at'),
+    )
+
     def is_overdue(self):
         if not self.sla_deadline:
             return False
@@ -186,16 +228,171 @@ class QueryResponse(db.Model):
     attachment_urls = db.Column(db.Text, nullable=True)
     used_template_id = db.Column(db.Integer, db.ForeignKey('query_response_template.id'), nullable=True)
     status_after = db.Column(db.String(50), nullable=True)
+    delivery_status = db.Column(db.String(20), nullable=True)  # queued, sent, failed
+    delivered_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
     staff = db.relationship('User', backref=db.backref('query_responses', lazy=True))
 
+    __table_args__ = (
+        # Keyset paging of a ticket's thread, newest first (``app.conversation``).
+        db.Index('ix_query_response_thread', 'query_id', 'id'),
+    )
+
+
+# Written in the same transaction as the QueryResponse it delivers; sent by ``flask send-outbox``.
+class OutboundEmail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    query_response_id = db.Column(db.Integer, db.ForeignKey('query_response.id'), nullable=True)
+    to_address = db.Column(db.String(100), nullable=False)
+    to_name = db.Column(db.String(100), nullable=True)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    attachment_urls = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    message_id = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    query_response = db.relationship('QueryResponse', backref=db.backref('outbound_emails', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_outbound_email_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+
+# One row per ticket per change made by an inbox bulk action (``app.bulk_actions``).
+class QueryAudit(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # No foreign key: the audit trail outlives archival of the ticket (``app.archive``).
+    query_id = db.Column(db.Integer, nullable=False, index=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    action = db.Column(db.String(30), nullable=False)  # assign, status, priority, tag, close
+    field = db.Column(db.String(50), nullable=False)
+    old_value = db.Column(db.String(255), nullable=True)
+    new_value = db.Column(db.String(255), nullable=True)
+    batch_id = db.Column(db.String(32), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ChangeCounter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+# Change log behind the live inbox feed; ``change_counter`` keeps its prune watermark (see app/live.py).
+class QueryEvent(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}  # never reuse an id after pruning
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    query_id = db.Column(db.Integer, nullable=True)
+    kind = db.Column(db.String(30), nullable=False)  # created, status, assigned, priority, responded, bulk
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+
+def _archive_columns(table):
+    # Same columns and ids as the live table, without foreign keys, unique
+    # constraints or defaults: archive rows are only ever copied in.
+    return [db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+                      autoincrement=False)
+            for column in table.columns]
+
+
+# Cold storage for old closed tickets, moved by ``flask archive-queries`` (see app/archive.py).
+class ArchivedQuery(db.Model):
+    __table__ = db.Table(
+        'query_archive', db.metadata,
+        *_archive_columns(Query.__table__),
+        db.Column('tag_names', db.Text, nullable=True),  # comma-separated, restored into query_tag
+        db.Column('archived_at', db.DateTime, nullable=False),
+        db.Index('ix_query_archive_ticket_number', 'ticket_number'),
+        db.Index('ix_query_archive_source_external_id', 'source', 'external_id'),
+        db.Index('ix_query_archive_customer_created', 'customer_id', 'created_at'),
+        db.Index('ix_query_archive_created_at', 'created_at'),
+    )
+
+    assigned_staff = db.relationship('User', primaryjoin='foreign(ArchivedQuery.assigned_staff_id) == User.id',
+                                     viewonly=True, lazy=True)
+    responses = db.relationship('ArchivedQueryResponse',
+                                primaryjoin='foreign(ArchivedQueryResponse.query_id) == ArchivedQuery.id',
+                                viewonly=True, lazy=True, order_by='ArchivedQueryResponse.created_at')
+
+    @property
+    def tag_list(self):
+        return [name for name in (self.tag_names or '').split(',') if name]
+
+
+class ArchivedQueryResponse(db.Model):
+    __table__ = db.Table(
+        'query_response_archive', db.metadata,
+        *_archive_columns(QueryResponse.__table__),
+        db.Column('archived_at', db.DateTime, nullable=False),
+        db.Index('ix_query_response_archive_thread', 'query_id', 'created_at', 'id'),
+    )
+
+    staff = db.relationship('User', primaryjoin='foreign(ArchivedQueryResponse.staff_id) == User.id',
+                            viewonly=True, lazy=True)
+
+
+# Checkpoint of an archival run; ``--resume`` continues after ``last_query_id`` with the same cutoff.
+class ArchiveRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cutoff = db.Column(db.DateTime, nullable=False)
+    batch_size = db.Column(db.Integer, nullable=False)
+    last_query_id = db.Column(db.Integer, nullable=False, default=0)
+    archived_count = db.Column(db.Integer, nullable=False, default=0)
+    response_count = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, done
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+
+def new_ticket_number():
+    return f"Q-{uuid.uuid4().hex[:8].upper()}"
+
+
+def taken_ticket_numbers(tickets):
+    """The ticket numbers in ``tickets`` already used by a live or archived query."""
+    taken = set()
+    for table in (Query.__table__, ArchivedQuery.__table__):
+        for start in range(0, len(tickets), 1000):
+            chunk = tickets[start:start + 1000]
+            taken.update(db.session.execute(
+                db.select(table.c.ticket_number).where(table.c.ticket_number.in_(chunk))
+            ).scalars())
+    return taken
+
+
+def new_ticket_numbers(count):
+    """``count`` distinct ticket numbers not used by any live or archived query."""
+    numbers = set()
+    while len(numbers) < count:
+        batch = {new_ticket_number() for _ in range(count - len(numbers))}
+        numbers |= batch - taken_ticket_numbers(list(batch))
+    return list(numbers)
+
+
+def default_sla_deadline(received_at=None):
+    return (received_at or datetime.utcnow()) + timedelta(hours=12)
+
 
 @event.listens_for(Query, 'before_insert')
 def _assign_ticket_and_sla(mapper, connection, target):
     if not target.ticket_number:
-        target.ticket_number = f"Q-{uuid.uuid4().hex[:8].upper()}"
+        # The unique index only covers live tickets; archived ones keep theirs too.
+        archive = ArchivedQuery.__table__
+        ticket_number = new_ticket_number()
+        while connection.execute(
+                db.select(archive.c.id).where(archive.c.ticket_number == ticket_number)).first() is not None:
+            ticket_number = new_ticket_number()
+        target.ticket_number = ticket_number
     if not target.sla_deadline:
-        target.sla_deadline = datetime.utcnow() + timedelta(hours=12)
+        target.sla_deadline = default_sla_deadline()
     if not target.response_due_at:
         target.response_due_at = target.sla_deadline
@@ -0,0 +1,319 @@
+"""
+Transactional outbox for customer email.
+
+Staff replies no longer talk to SMTP inside the request: ``queue_query_email``
+adds an ``OutboundEmail`` row to the session, so it commits (or rolls back)
+together with the ``QueryResponse``.  ``flask send-outbox`` runs a pool of
+worker threads; each claims a batch with a lease, sends it over one reused
+SMTP connection and writes the outcome back to the outbox row and to
+``QueryResponse.delivery_status``.  Failures are retried with exponential
+backoff; a 5xx rejection of the message itself (every recipient refused,
+or after DATA) and rows out of attempts are dead-lettered
+(``status='dead'``) until ``flask send-outbox --retry-dead``.  When the
+server cannot be used at all (connect, HELO, STARTTLS, login or MAIL FROM
+fails) the rest of the batch is put back for ``OUTBOX_RETRY_BACKOFF``
+seconds without using up an attempt and the worker pauses as long.
+Delivery is at-least-once; the Message-ID stays the same across retries.
+"""
+import logging
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid, parseaddr
+
+from sqlalchemy import and_, case, func, or_, update
+
+from . import db, tracing
+from .models import OutboundEmail
+
+log = logging.getLogger(__name__)
+
+
+def queue_query_email(query_obj, response_entry, subject, body, attachments=None):
+    """Add the outbox row for a staff reply; it commits with the response."""
+    email = OutboundEmail(
+        query_response=response_entry,
+        to_address=query_obj.customer_email,
+        to_name=query_obj.customer_name,
+        subject=subject,
+        body=body,
+        attachment_urls=','.join(attachments) if attachments else None,
+    )
+    response_entry.delivery_status = 'queued'
+    db.session.add(email)
+    return email
+
+
+def build_message(email, sender):
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = formataddr((email.to_name or '', email.to_address))
+    message['Subject'] = email.subject
+    message['Message-ID'] = email.message_id
+    body = email.body
+    if email.attachment_urls:
+        body += '\n\nAttachments:\n' + '\n'.join(email.attachment_urls.split(','))
+    message.set_content(body)
+    return message
+
+
+class SenderUnavailable(Exception):
+    """The SMTP server takes no mail right now; no message is to blame."""
+
+
+class SMTPSender:
+    """Sends messages over one SMTP connection, reconnecting when it drops."""
+
+    def __init__(self, config):
+        self.config = config
+        self.connection = None
+
+    def _connect(self):
+        config = self.config
+        smtp_class = smtplib.SMTP_SSL if config['MAIL_USE_SSL'] else smtplib.SMTP
+        connection = None
+        try:
+            connection = smtp_class(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT'])
+            if config['MAIL_USE_TLS']:
+                connection.starttls()
+            if config['MAIL_USERNAME']:
+                connection.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        except OSError as exc:  # smtplib errors are OSErrors too
+            if connection is not None:
+                connection.close()
+            raise SenderUnavailable(repr(exc)) from exc
+        return connection
+
+    def send(self, message):
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self._connect()
+            try:
+                self.connection.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.connection = None
+                if attempt:
+                    raise
+            except (smtplib.SMTPHeloError, smtplib.SMTPSenderRefused) as exc:
+                # Our HELO or envelope sender is refused: every message would be.
+                self.close()
+                raise SenderUnavailable(repr(exc)) from exc
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.connection = None
+
+
+class LoggingSender:
+    """Used when ``MAIL_SERVER`` is unset: logs instead of sending."""
+
+    def send(self, message):
+        log.info('Sending email to %s | Subject: %s', message['To'], message['Subject'])
+
+    def close(self):
+        pass
+
+
+def make_sender(config):
+    return SMTPSender(config) if config['MAIL_SERVER'] else LoggingSender()
+
+
+def _is_permanent(exc):
+    """Whether the server rejected this message for good, as opposed to failing for now."""
+    if not isinstance(exc, OSError):  # smtplib errors are OSErrors too
+        # A message that cannot be built (bad header, ...) fails the same way every time.
+        return True
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPDataError) and exc.smtp_code >= 500
+
+
+def claim_batch(config):
+    """Lease up to ``OUTBOX_BATCH_SIZE`` due emails to this worker."""
+    now = datetime.utcnow()
+    due = or_(
+        and_(OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now),
+        and_(OutboundEmail.status == 'sending', OutboundEmail.locked_until < now),
+    )
+    candidates = db.session.execute(
+        db.select(OutboundEmail.id).where(due).order_by(OutboundEmail.next_attempt_at)
+        .limit(config['OUTBOX_BATCH_SIZE']).with_for_update(skip_locked=True)
+    ).scalars().all()
+    locked_until = now + timedelta(seconds=config['OUTBOX_LEASE_SECONDS'])
+    domain = parseaddr(config['MAIL_DEFAULT_SENDER'])[1].rpartition('@')[2] or None
+    claimed = []
+    for email_id in candidates:
+        # Conditional update: only one worker wins a row even without SKIP LOCKED.
+        # A row still ``sending`` lost its worker mid-send: that counts as an attempt.
+        result = db.session.execute(
+            update(OutboundEmail).where(OutboundEmail.id == email_id, due).values(
+                attempts=case((OutboundEmail.status == 'sending', OutboundEmail.attempts + 1),
+                              else_=OutboundEmail.attempts),
+                status='sending',
+                locked_until=locked_until,
+                message_id=func.coalesce(OutboundEmail.message_id, make_msgid(domain=domain)),
+            )
+        )
+        if result.rowcount:
+            claimed.append(email_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return OutboundEmail.query.filter(OutboundEmail.id.in_(claimed)).all()
+
+
+def _record_success(email, now):
+    email.status = 'sent'
+    email.sent_at = now
+    email.locked_until = None
+    email.last_error = None
+    if email.query_response:
+        email.query_response.delivery_status = 'sent'
+        email.query_response.delivered_at = now
+
+
+def _dead_letter(email, exc):
+    email.status = 'dead'
+    email.locked_until = None
+    if email.query_response:
+        email.query_response.delivery_status = 'failed'
+    log.warning('Email %s dead-lettered after %d attempts: %r', email.id, email.attempts, exc)
+    return 'dead'
+
+
+def _record_failure(email, exc, config, now):
+    email.attempts += 1
+    email.locked_until = None
+    email.last_error = repr(exc)[:2000]
+    if _is_permanent(exc) or email.attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+        return _dead_letter(email, exc)
+    delay = min(config['OUTBOX_RETRY_BACKOFF'] * 2 ** (email.attempts - 1), config['OUTBOX_MAX_BACKOFF'])
+    email.status = 'pending'
+    email.next_attempt_at = now + timedelta(seconds=delay)
+    return 'retry'
+
+
+def _defer(emails, exc, config, now):
+    """Put ``emails`` back for a later run without using up an attempt."""
+    exc = exc.__cause__ or exc
+    for email in emails:
+        email.status = 'pending'
+        email.locked_until = None
+        email.last_error = repr(exc)[:2000]
+        email.next_attempt_at = now + timedelta(seconds=config['OUTBOX_RETRY_BACKOFF'])
+    log.warning('SMTP server unavailable, deferring %d emails: %r', len(emails), exc)
+    return len(emails)
+
+
+@tracing.traced('outbox.deliver_batch', root=True)
+def deliver_batch(sender, config):
+    """Send one claimed batch; return outcome counts, or ``None`` when idle."""
+    emails = claim_batch(config)
+    if not emails:
+        return None
+    counts = {'sent': 0, 'retry': 0, 'dead': 0, 'deferred': 0}
+    for position, email in enumerate(emails):
+        if email.attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+            # Reclaimed after its lease expired on the last allowed attempt.
+            email.last_error = email.last_error or 'lease expired while sending'
+            counts[_dead_letter(email, email.last_error)] += 1
+            continue
+        try:
+            sender.send(build_message(email, config['MAIL_DEFAULT_SENDER']))
+        except SenderUnavailable as exc:
+            counts['deferred'] += _defer(emails[position:], exc, config, datetime.utcnow())
+            break
+        except Exception as exc:
+            # Any failure is recorded on this row alone, so the outcomes of the
+            # messages already sent in the batch are still committed below.
+            outcome = _record_failure(email, exc, config, datetime.utcnow())
+            if isinstance(exc, OSError) and not isinstance(
+                    exc, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                # Network-level failure: reconnect for the next message.
+                sender.close()
+        else:
+            _record_success(email, datetime.utcnow())
+            outcome = 'sent'
+        counts[outcome] += 1
+    db.session.commit()
+    return counts
+
+
+def _worker(app, stop, once, totals, lock):
+    with app.app_context():
+        sender = make_sender(app.config)
+        try:
+            while not stop.is_set():
+                try:
+                    counts = deliver_batch(sender, app.config)
+                except Exception:
+                    log.exception('Outbox worker failed to deliver a batch')
+                    db.session.rollback()
+                    counts = None
+                if counts:
+                    with lock:
+                        for key, value in counts.items():
+                            totals[key] += value
+                    if not counts['deferred']:
+                        continue
+                    # The server is down or refuses our login: wait before trying again.
+                    if once:
+                        return
+                    stop.wait(app.config['OUTBOX_RETRY_BACKOFF'])
+                    continue
+                # Idle: release the SMTP connection until there is work again.
+                sender.close()
+                if once:
+                    return
+                stop.wait(app.config['OUTBOX_POLL_INTERVAL'])
+        finally:
+            sender.close()
+            db.session.remove()
+
+
+def run_workers(app, workers=None, once=False):
+    """Run the sender pool until interrupted (or, with ``once``, until idle)."""
+    stop = threading.Event()
+    totals = {'sent': 0, 'retry': 0, 'dead': 0, 'deferred': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=_worker, args=(app, stop, once, totals, lock), name=f'outbox-worker-{n}', daemon=True)
+        for n in range(workers or app.config['OUTBOX_WORKERS'])
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return totals
+
+
+def retry_dead():
+    """Move dead-lettered emails back to the queue; return how many."""
+    emails = OutboundEmail.query.filter_by(status='dead').all()
+    for email in emails:
+        email.status = 'pending'
+        email.attempts = 0
+        email.next_attempt_at = datetime.utcnow()
+        if email.query_response:
+            email.query_response.delivery_status = 'queued'
+    db.session.commit()
+    return len(emails)
+
+
+def stats():
+    rows = db.session.execute(
+        db.select(OutboundEmail.status, func.count()).group_by(OutboundEmail.status)
+    ).all()
+    return dict(rows)
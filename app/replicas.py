@@ -0,0 +1,166 @@
+"""
+Read-replica routing.
+
+``db.session`` is a ``RoutingSession``.  With ``DB_REPLICA_URLS`` set, the
+plain SELECTs of a GET view decorated with ``replica_reads`` (public pages,
+admin dashboard and exports) go to one replica chosen for the whole request.
+Everything else stays on the primary:
+
+- flushes, INSERT/UPDATE/DELETE, ``SELECT ... FOR UPDATE`` and ``text()``;
+- views without the decorator (``query_detail`` and the other admin
+  forms, CLI commands, background jobs);
+- a visitor for ``DB_REPLICA_MAX_LAG`` seconds after a request of theirs
+  wrote, so pages they open next read their own writes;
+- every request for ``DB_REPLICA_MAX_LAG`` seconds after cached content
+  was invalidated (``invalidate_fragments``), so fragments and response
+  bodies refilled then are not built from rows the replica lacks and kept
+  until the next edit;
+- replicas more than ``DB_REPLICA_MAX_LAG`` seconds behind, or that fail
+  the lag check.  The lag is measured at most every
+  ``DB_REPLICA_LAG_CHECK_INTERVAL`` seconds per process; non-PostgreSQL
+  replicas (a second SQLite file in development) report no lag.
+
+Objects loaded from a replica can still be modified and committed: the
+flush is sent to the primary.
+"""
+import functools
+import logging
+import random
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text
+
+log = logging.getLogger(__name__)
+
+_PIN_KEY = '_db_primary_until'
+_INVALIDATED_KEY = 'db-replicas:invalidated-at'
+# Seconds since the last replayed transaction, or 0 when everything received is replayed.
+_LAG_SQL = text(
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.lag = 0.0  # None while the replica is unreachable
+        self.checked_at = None
+        self._lock = threading.Lock()
+
+    def usable(self, max_lag, interval):
+        now = time.monotonic()
+        if (self.checked_at is None or now - self.checked_at >= interval) and self._lock.acquire(blocking=False):
+            # One thread measures; the others use the previous value meanwhile.
+            try:
+                self.lag = self._measure()
+                self.checked_at = now
+            finally:
+                self._lock.release()
+        return self.lag is not None and self.lag <= max_lag
+
+    def _measure(self):
+        if self.engine.dialect.name != 'postgresql':
+            return 0.0
+        try:
+            with self.engine.connect() as connection:
+                return float(connection.execute(_LAG_SQL).scalar() or 0)
+        except Exception:
+            log.warning('Replica %s failed its lag check', self.engine.url, exc_info=True)
+            return None
+
+
+class RoutingSession(Session):
+    """``db.session`` class that sends the reads of ``replica_reads`` views to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.db_wrote = True
+            elif _readable(clause):
+                engine = _request_replica()
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _readable(clause):
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+
+def _request_replica():
+    if not g.get('db_replica_reads') or g.get('db_wrote'):
+        return None
+    if 'db_replica' not in g:
+        g.db_replica = _choose_replica()
+    return g.db_replica
+
+
+def _choose_replica():
+    replicas = current_app.extensions.get('replicas')
+    if not replicas or _pinned() or _recently_invalidated():
+        return None
+    config = current_app.config
+    usable = [replica for replica in replicas
+              if replica.usable(config['DB_REPLICA_MAX_LAG'], config['DB_REPLICA_LAG_CHECK_INTERVAL'])]
+    return random.choice(usable).engine if usable else None
+
+
+def _pinned():
+    # Without a session cookie there is no pin; not touching the session keeps
+    # anonymous pages free of ``Vary: Cookie``.
+    if current_app.config['SESSION_COOKIE_NAME'] not in request.cookies:
+        return False
+    return session.get(_PIN_KEY, 0) > time.time()
+
+
+def _recently_invalidated():
+    from . import cache
+
+    invalidated_at = cache.get(_INVALIDATED_KEY)
+    return invalidated_at is not None and invalidated_at + current_app.config['DB_REPLICA_MAX_LAG'] > time.time()
+
+
+def note_invalidation():
+    """Read the primary for ``DB_REPLICA_MAX_LAG`` seconds while invalidated caches refill."""
+    if current_app.extensions.get('replicas'):
+        from . import cache
+
+        cache.set(_INVALIDATED_KEY, time.time(), timeout=0)
+
+
+def replica_reads(f):
+    """Serve the SELECTs of a GET/HEAD request for this view from a replica."""
+
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            g.db_replica_reads = True
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def _pin_writer(response):
+    if g.get('db_wrote'):
+        session[_PIN_KEY] = time.time() + current_app.config['DB_REPLICA_MAX_LAG']
+    return response
+
+
+def init_app(app):
+    urls = [url.strip() for url in app.config['DB_REPLICA_URLS'].split(',') if url.strip()]
+    if not urls:
+        return
+    from . import database
+
+    if 'replicas' not in app.extensions:  # else shared with the public app (app.lazy_admin)
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        replicas = [Replica(create_engine(url, **options)) for url in urls]
+        app.extensions['replicas'] = replicas
+        if app.config['METRICS_ENABLED']:
+            for replica in replicas:
+                database._instrument(replica.engine, app.extensions['database']['profile'])
+    app.after_request(_pin_writer)
@@ -0,0 +1,105 @@
+"""
+Prebuilt statements for the hot public-page reads.
+
+Each statement is a Core ``select()`` of just the columns its template uses,
+built once at import with ``bindparam`` for anything that varies.  Reusing
+the same statement object lets SQLAlchemy skip rebuilding it and
+regenerating its cache key, so every execution hits the compiled cache
+directly, and the result rows are plain ``Row`` tuples (attribute access
+like ``row.title``) rather than identity-mapped ORM instances.  It runs
+through ``db.session``, so replica routing and the request transaction
+apply as for any other read.
+
+``benchmarks/repository_cpu.py`` compares the per-request CPU with the ORM
+queries these replace.
+"""
+from sqlalchemy import bindparam, select, true
+
+from .models import Banner, Event, FAQ, Package, Page, Testimonial, db
+
+HOME_CARDS = 3
+HOME_TESTIMONIALS = 3
+
+_package = Package.__table__
+_event = Event.__table__
+_banner = Banner.__table__
+_testimonial = Testimonial.__table__
+_page = Page.__table__
+_faq = FAQ.__table__
+
+_HOME_CARDS = select(
+    _package.c.id, _package.c.title, _package.c.description, _package.c.rating, _package.c.price, _package.c.image,
+).limit(HOME_CARDS)
+
+_EVENTS = select(_event.c.id, _event.c.title, _event.c.date, _event.c.destination, _event.c.image, _event.c.link)
+
+_BANNERS = (
+    select(_banner.c.id, _banner.c.title, _banner.c.image, _banner.c.link)
+    .where(_banner.c.position == bindparam('position'), _banner.c.is_active == true())
+    .order_by(_banner.c.order)
+)
+
+_TOP_TESTIMONIALS = (
+    select(_testimonial.c.id, _testimonial.c.name, _testimonial.c.location, _testimonial.c.rating,
+           _testimonial.c.message, _testimonial.c.image)
+    .where(_testimonial.c.is_active == true())
+    .order_by(_testimonial.c.created_at.desc())
+    .limit(HOME_TESTIMONIALS)
+)
+
+_PAGE = (
+    select(_page.c.id, _page.c.slug, _page.c.title, _page.c.content, _page.c.meta_title, _page.c.meta_description)
+    .where(_page.c.slug == bindparam('slug'), _page.c.is_active == true())
+    .limit(1)
+)
+
+_ACTIVE_FAQS = (
+    select(_faq.c.id, _faq.c.question, _faq.c.answer)
+    .where(_faq.c.is_active == true())
+    .order_by(_faq.c.order, _faq.c.created_at)
+)
+
+
+class Deferred:
+    """Rows of ``fetch(*args)``, queried on first iteration.
+
+    Lets a view hand a template rows that are only read when the
+    ``{% cache %}`` fragment around them misses.
+    """
+
+    __slots__ = ('_fetch', '_args', '_rows')
+
+    def __init__(self, fetch, *args):
+        self._fetch = fetch
+        self._args = args
+        self._rows = None
+
+    def __iter__(self):
+        if self._rows is None:
+            self._rows = self._fetch(*self._args)
+        return iter(self._rows)
+
+
+def home_cards():
+    return db.session.execute(_HOME_CARDS).all()
+
+
+def events():
+    return db.session.execute(_EVENTS).all()
+
+
+def active_banners(position='home'):
+    return db.session.execute(_BANNERS, {'position': position}).all()
+
+
+def top_testimonials():
+    return db.session.execute(_TOP_TESTIMONIALS).all()
+
+
+def page_by_slug(slug):
+    """The active page ``slug`` as a row, or ``None``."""
+    return db.session.execute(_PAGE, {'slug': slug}).first()
+
+
+def active_faqs():
+    return db.session.execute(_ACTIVE_FAQS).all()
@@ -1,34 +1,52 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
-from .models import Package, Event, Page, Banner, FAQ, Testimonial, Query, db
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, Response
+from .models import Package, Query, db
 from .forms import ContactForm
-from . import cache
+from .compression import cached_response
+from .service_worker import service_worker_script
+from .ingest_queue import enqueue_query
+from .replicas import replica_reads
+from . import metrics, repository
+from .repository import Deferred
 
 main = Blueprint('main', __name__)
 
+
+def _submit_query(form, query_type, source):
+    """Store a contact form submission and return its ticket number."""
+    fields = dict(
+        customer_name=form.name.data,
+        customer_email=form.email.data,
+        customer_phone=form.phone.data,
+        message=form.message.data,
+        query_type=query_type,
+        source=source,
+    )
+    if current_app.config['INGEST_QUEUE_ENABLED']:
+        return enqueue_query(**fields)
+    query = Query(**fields)
+    db.session.add(query)
+    db.session.commit()
+    return query.ticket_number
+
+
 @main.route('/', methods=['GET', 'POST'])
+@replica_reads
 def home():
-    cards = Package.query.limit(3).all()
-    events = Event.query.all()
-    banners = Banner.query.filter_by(position='home', is_active=True).order_by(Banner.order).all()
-    testimonials = Testimonial.query.filter_by(is_active=True).order_by(Testimonial.created_at.desc()).limit(3).all()
+    # Deferred: they only run when their cached fragment misses.
+    cards = Deferred(repository.home_cards)
+    events = Deferred(repository.events)
+    banners = Deferred(repository.active_banners, 'home')
+    testimonials = Deferred(repository.top_testimonials)
     form = ContactForm()
     if form.validate_on_submit():
-        query = Query(
-            customer_name=form.name.data,
-            customer_email=form.email.data,
-            customer_phone=form.phone.data,
-            message=form.message.data,
-            query_type='General Inquiry',
-            source='home-form'
-        )
-        db.session.add(query)
-        db.session.commit()
-        flash('Thanks! Your query has been sent to our team.', 'success')
+        ticket_number = _submit_query(form, 'General Inquiry', 'home-form')
+        flash(f'Thanks! Your query has been sent to our team. Your ticket number is {ticket_number}.', 'success')
         return redirect(url_for('main.home'))
     return render_template('home.html', cards=cards, events=events, banners=banners, testimonials=testimonials, form=form)
 
 @main.route('/packages')
-@cache.cached(timeout=300)
+@cached_response(timeout=300)
+@replica_reads
 def packages():
     # Get search and filter parameters
     search_query = request.args.get('search', '').strip()
@@ -100,40 +118,35 @@ def packages():
                          destinations_list=destinations_list)
 
 @main.route('/package/<int:id>')
-@cache.cached(timeout=600)
+@cached_response(timeout=600)
+@replica_reads
 def package_detail(id):
     package = Package.query.get_or_404(id)
     return render_template('package_detail.html', package=package)
 
 @main.route('/about')
+@replica_reads
 def about():
-    page = Page.query.filter_by(slug='about', is_active=True).first()
+    page = repository.page_by_slug('about')
     if page:
         return render_template('about.html', page=page)
     return render_template('about.html')
 
 @main.route('/contact', methods=['GET', 'POST'])
+@replica_reads
 def contact():
-    page = Page.query.filter_by(slug='contact', is_active=True).first()
+    page = repository.page_by_slug('contact')
     form = ContactForm()
     if form.validate_on_submit():
-        query = Query(
-            customer_name=form.name.data,
-            customer_email=form.email.data,
-            customer_phone=form.phone.data,
-            message=form.message.data,
-            query_type='Contact Form',
-            source='contact-page'
-        )
-        db.session.add(query)
-        db.session.commit()
-        flash('Your query has been sent successfully!', 'success')
+        ticket_number = _submit_query(form, 'Contact Form', 'contact-page')
+        flash(f'Your query has been sent successfully! Your ticket number is {ticket_number}.', 'success')
         return redirect(url_for('main.contact'))
     return render_template('contact.html', form=form, page=page)
 
 @main.route('/faq')
+@replica_reads
 def faq():
-    faqs = FAQ.query.filter_by(is_active=True).order_by(FAQ.order, FAQ.created_at).all()
+    faqs = Deferred(repository.active_faqs)
     return render_template('faq.html', faqs=faqs)
 
 @main.route('/offline')
@@ -141,15 +154,17 @@ def offline():
     return render_template('offline.html')
 
 @main.route('/terms-and-conditions')
+@replica_reads
 def terms_and_conditions():
-    page = Page.query.filter_by(slug='term-and-conditions', is_active=True).first()
+    page = repository.page_by_slug('term-and-conditions')
     if page:
         return render_template('page.html', page=page)
     return render_template('page.html')
 
 @main.route('/privacy-policy')
+@replica_reads
 def privacy_policy():
-    page = Page.query.filter_by(slug='privacy-policy', is_active=True).first()
+    page = repository.page_by_slug('privacy-policy')
     if page:
         return render_template('page.html', page=page)
     return render_template('page.html')
@@ -157,3 +172,20 @@ def privacy_policy():
 @main.route('/.well-known/appspecific/com.chrome.devtools.json')
 def chrome_devtools_config():
     return current_app.send_static_file('.well-known/appspecific/com.chrome.devtools.json')
+
+@main.route('/metrics')
+def metrics_endpoint():
+    if not metrics.authorized():
+        return Response('Authentication required\n', status=401, mimetype='text/plain')
+    body = metrics.render(metrics.collect(current_app.config['METRICS_DIR']))
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+@main.route('/service-worker.js')
+def service_worker():
+    response = Response(service_worker_script(), mimetype='application/javascript')
+    # Served from the site root so the worker's scope covers every page;
+    # browsers must always revalidate it to pick up a new cache version.
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Service-Worker-Allowed'] = '/'
+    return response
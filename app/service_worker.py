@@ -0,0 +1,122 @@
+"""
+Content-hashed static assets and a generated, versioned service worker.
+
+``build_asset_manifest`` copies the public static assets to
+``gen/assets/`` under content-hashed names and records the mapping, which
+``asset_url`` uses in templates.  ``build_service_worker`` renders
+``service-worker.js`` from the manifest so the precache list and cache
+version change exactly when an asset changes.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+from flask import current_app, render_template, url_for
+
+
+def _static_path(app, filename):
+    return os.path.join(app.static_folder, *filename.split('/'))
+
+
+def _file_hash(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:10]
+
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def build_asset_manifest(app):
+    """Copy ``SW_HASHED_ASSETS`` to hashed names and write the asset manifest."""
+    output_dir = app.config['ASSET_OUTPUT_DIR']
+    assets = {}
+    for filename in app.config['SW_HASHED_ASSETS']:
+        source = _static_path(app, filename)
+        if not os.path.exists(source):
+            continue
+        stem, ext = os.path.splitext(filename)
+        hashed = f'{output_dir}/{stem}.{_file_hash(source)}{ext}'
+        target = _static_path(app, hashed)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+        assets[filename] = hashed
+
+    # The purged stylesheet from ``flask build-css`` is already content-hashed.
+    css_manifest = _load_json(_static_path(app, app.config['CSS_PURGE_MANIFEST']))
+    if css_manifest.get('stylesheet'):
+        assets['css/site.css'] = css_manifest['stylesheet']
+
+    path = _static_path(app, app.config['ASSET_MANIFEST'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(assets, fh, indent=2, sort_keys=True)
+    return assets
+
+
+def service_worker_context(app, assets):
+    """Template context for ``service-worker.js``."""
+    static_url = app.static_url_path.rstrip('/')
+    precache = [f'{static_url}/{hashed}' for hashed in sorted(assets.values())]
+    precache += list(app.config['SW_PRECACHE_PAGES'])
+    version = hashlib.md5(json.dumps(precache).encode('utf-8')).hexdigest()[:10]
+    return {
+        'version': version,
+        'precache': precache,
+        'offline_url': '/offline',
+        # Only the content-hashed copies; the manifests and critical CSS under gen/ change in place.
+        'hashed_prefix': f"{static_url}/{app.config['ASSET_OUTPUT_DIR']}/",
+        'static_prefix': f'{static_url}/',
+        'swr_routes': app.config['SW_STALE_WHILE_REVALIDATE_ROUTES'],
+        'network_first_routes': app.config['SW_NETWORK_FIRST_ROUTES'],
+        'bypass_routes': app.config['SW_BYPASS_ROUTES'],
+        'max_entries': app.config['SW_RUNTIME_MAX_ENTRIES'],
+    }
+
+
+def build_service_worker(app):
+    """Write the asset manifest and ``gen/service-worker.js``; return its context."""
+    assets = build_asset_manifest(app)
+    script = render_template('service-worker.js', **service_worker_context(app, assets))
+    path = _static_path(app, app.config['SW_OUTPUT'])
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(script)
+    return service_worker_context(app, assets)
+
+
+def _assets():
+    state = current_app.extensions['service_worker']
+    if state.get('assets') is None or current_app.debug:
+        state['assets'] = _load_json(_static_path(current_app, current_app.config['ASSET_MANIFEST']))
+    return state['assets']
+
+
+def asset_url(filename):
+    """URL of the hashed copy of a static file, or the plain static URL."""
+    return url_for('static', filename=_assets().get(filename, filename))
+
+
+def service_worker_script():
+    """The generated service worker, rendered on the fly when no build exists."""
+    state = current_app.extensions['service_worker']
+    if state.get('script') is None or current_app.debug:
+        path = _static_path(current_app, current_app.config['SW_OUTPUT'])
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as fh:
+                state['script'] = fh.read()
+        else:
+            state['script'] = render_template('service-worker.js', **service_worker_context(current_app, _assets()))
+    return state['script']
+
+
+def init_app(app):
+    app.extensions.setdefault('service_worker', {'assets': None, 'script': None})
+    app.jinja_env.globals.update(asset_url=asset_url)
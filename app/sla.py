@@ -0,0 +1,110 @@
+"""
+Scheduled SLA sweeper.
+
+``Query.sla_state`` (``ok`` / ``due_soon`` / ``overdue``, ``None`` once a
+ticket is resolved or closed) is kept current by ``sweep`` instead of being
+derived from ``datetime.utcnow()`` on every read, so the inbox and
+dashboard filter with an indexed equality check.  Each transition is a
+range scan on ``ix_query_sla_deadline`` for rows not already in the target
+state, applied as ``UPDATE ... WHERE id IN (...)`` batches of
+``SLA_SWEEP_BATCH_SIZE`` rows with a commit per batch.  With
+``SLA_AUTO_ESCALATE`` overdue tickets that were never escalated are
+escalated in the same way.
+
+Run it from cron with ``flask sweep-sla`` or ``POST /api/cron/sla-sweep``.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, case, or_, update
+
+from . import db, tracing
+from .live import record_event
+from .models import Query
+
+CLOSED_STATUSES = ('Resolved', 'Closed')
+AUTO_ESCALATION_REASON = 'SLA breached (auto-escalated)'
+
+
+def sla_state_for(status, sla_deadline, now=None):
+    """The state ``sweep`` would give a ticket right now."""
+    if status in CLOSED_STATUSES:
+        return None
+    if not sla_deadline:
+        return 'ok'
+    now = now or datetime.utcnow()
+    if sla_deadline < now:
+        return 'overdue'
+    if sla_deadline < now + timedelta(minutes=current_app.config['SLA_DUE_SOON_MINUTES']):
+        return 'due_soon'
+    return 'ok'
+
+
+def sla_state_expression(now=None):
+    """SQL form of ``sla_state_for`` for an open ticket, for set-based updates."""
+    now = now or datetime.utcnow()
+    soon = now + timedelta(minutes=current_app.config['SLA_DUE_SOON_MINUTES'])
+    return case(
+        (Query.sla_deadline == None, 'ok'),  # noqa: E711
+        (Query.sla_deadline < now, 'overdue'),
+        (Query.sla_deadline < soon, 'due_soon'),
+        else_='ok',
+    )
+
+
+def _is_open():
+    return or_(Query.status == None, Query.status.notin_(CLOSED_STATUSES))  # noqa: E711
+
+
+def _batched_update(condition, values, batch_size):
+    """Apply ``values`` to rows matching ``condition`` in id batches; return the row count."""
+    total = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Query.id).where(condition).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return total
+        db.session.execute(
+            update(Query).where(Query.id.in_(ids)).values(**values).execution_options(synchronize_session=False)
+        )
+        record_event('bulk', {'action': 'sla_sweep', 'count': len(ids), 'query_ids': ids,
+                              'changes': {key: value for key, value in values.items() if key != 'updated_at'}})
+        db.session.commit()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+
+
+@tracing.traced('sla.sweep', root=True)
+def sweep(now=None):
+    """Bring ``sla_state`` up to date and auto-escalate breaches; return counts."""
+    config = current_app.config
+    now = now or datetime.utcnow()
+    soon = now + timedelta(minutes=config['SLA_DUE_SOON_MINUTES'])
+    batch_size = config['SLA_SWEEP_BATCH_SIZE']
+    open_ticket = _is_open()
+    not_in = lambda state: or_(Query.sla_state == None, Query.sla_state != state)  # noqa: E711
+
+    counts = {
+        'overdue': _batched_update(
+            and_(open_ticket, Query.sla_deadline < now, not_in('overdue')),
+            {'sla_state': 'overdue'}, batch_size),
+        'due_soon': _batched_update(
+            and_(open_ticket, Query.sla_deadline >= now, Query.sla_deadline < soon, not_in('due_soon')),
+            {'sla_state': 'due_soon'}, batch_size),
+        'ok': _batched_update(
+            and_(open_ticket, Query.sla_deadline >= soon, not_in('ok')),
+            {'sla_state': 'ok'}, batch_size),
+        'closed': _batched_update(
+            and_(Query.sla_state != None, Query.status.in_(CLOSED_STATUSES)),  # noqa: E711
+            {'sla_state': None}, batch_size),
+        'escalated': 0,
+    }
+    if config['SLA_AUTO_ESCALATE']:
+        counts['escalated'] = _batched_update(
+            and_(Query.sla_state == 'overdue', Query.escalated_at == None, open_ticket),  # noqa: E711
+            {'priority': 'Escalated', 'escalated_at': now, 'escalation_reason': AUTO_ESCALATION_REASON,
+             'updated_at': now},
+            batch_size)
+    return counts
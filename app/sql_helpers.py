@@ -0,0 +1,27 @@
+"""
+Small Core helpers shared by the set-based write paths.
+"""
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def insert_ignore(connection, table, values, index_elements):
+    """Insert ``values`` into ``table``, skipping rows that hit the unique ``index_elements``.
+
+    A concurrent writer may insert the same key first; on PostgreSQL and
+    SQLite those rows are dropped with ``ON CONFLICT DO NOTHING``.
+    """
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        module = postgresql if dialect == 'postgresql' else sqlite
+        stmt = module.insert(table).on_conflict_do_nothing(index_elements=index_elements)
+    else:
+        stmt = insert(table)
+    connection.execute(stmt, values)
+
+
+def string_agg(connection, column, separator=','):
+    """``column`` values of a group joined by ``separator``."""
+    if connection.dialect.name == 'postgresql':
+        return func.string_agg(column, separator)
+    return func.group_concat(column, separator)
@@ -0,0 +1,190 @@
+"""
+Per-request SQL profiling.
+
+With ``SQL_PROFILER`` enabled, SQLAlchemy ``before/after_cursor_execute``
+events time every statement issued while a request is active and the
+request hooks below summarise them: statement count, total DB time, the
+``SQL_PROFILER_SLOWEST`` slowest statements and statements repeated at
+least ``SQL_PROFILER_REPEAT_THRESHOLD`` times (the N+1 pattern, e.g. a lazy
+``assigned_staff`` load per inbox row).  Statements are grouped on their
+SQL text with expanded ``IN (...)`` lists collapsed, so the same lookup
+with different parameters counts as a repeat.
+
+Each response gets a ``Server-Timing`` header (``db`` and ``app``
+durations, shown in the browser's network panel) and a summary is kept in
+a rolling window of ``SQL_PROFILER_WINDOW_SECONDS``, listed worst endpoint
+first at ``/admin/sql-profile``.  The window is per process and shared by
+the public and lazily built admin apps in it.
+
+When the setting is off nothing is registered, so requests and statements
+pay nothing for the feature.
+"""
+import re
+import threading
+import time
+from collections import deque
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_TIMER_KEY = 'sql_profiler_start'
+
+
+def normalize_statement(statement):
+    """Statement text with whitespace collapsed and parameter lists folded to ``(?...)``."""
+    return _IN_LIST.sub('(?...)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class RequestProfile:
+    """Statements issued by one request."""
+
+    __slots__ = ('started', 'count', 'db_time', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_time = 0.0
+        self.statements = {}  # normalized SQL -> [executions, total seconds, slowest seconds]
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.db_time += duration
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, duration, duration]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+
+    def summary(self, slowest, repeat_threshold):
+        by_duration = sorted(self.statements.items(), key=lambda item: item[1][2], reverse=True)
+        return {
+            'statements': self.count,
+            'db_ms': self.db_time * 1000,
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'slowest': [(sql, entry[2] * 1000) for sql, entry in by_duration[:slowest]],
+            'repeated': sorted(
+                ((sql, entry[0], entry[1] * 1000) for sql, entry in self.statements.items()
+                 if entry[0] >= repeat_threshold),
+                key=lambda item: item[1], reverse=True,
+            ),
+        }
+
+
+class RequestLog:
+    """Rolling window of request summaries, bounded in age and length."""
+
+    def __init__(self, maxlen=5000):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, sample):
+        with self._lock:
+            self._samples.append(sample)
+
+    def recent(self, window_seconds):
+        cutoff = time.time() - window_seconds
+        with self._lock:
+            while self._samples and self._samples[0]['at'] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+# Module-level so the lazily built admin app reads what the public app recorded.
+request_log = RequestLog()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and '_sql_profile' in g:
+        conn.info.setdefault(_TIMER_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_TIMER_KEY)
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    if has_request_context():
+        profile = g.get('_sql_profile')
+        if profile is not None:
+            profile.add(normalize_statement(statement), duration)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its timer.
+    starts = exception_context.connection.info.get(_TIMER_KEY) if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _start_profile():
+    g._sql_profile = RequestProfile()
+
+
+def _finish_profile(response):
+    profile = g.pop('_sql_profile', None)
+    if profile is None:
+        return response
+    config = current_app.config
+    summary = profile.summary(config['SQL_PROFILER_SLOWEST'], config['SQL_PROFILER_REPEAT_THRESHOLD'])
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={summary["db_ms"]:.1f};desc="{summary["statements"]} statements", app;dur={summary["total_ms"]:.1f}',
+    )
+    summary.update(at=time.time(), endpoint=request.endpoint or request.path, method=request.method,
+                   status=response.status_code)
+    request_log.add(summary)
+    if summary['repeated']:
+        sql, executions, _ = summary['repeated'][0]
+        current_app.logger.debug('Possible N+1 in %s: %d executions of %s', summary['endpoint'], executions, sql)
+    return response
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def worst_endpoints(window_seconds=None, limit=25):
+    """Per-endpoint aggregates over the window, most total DB time first."""
+    window_seconds = window_seconds or current_app.config['SQL_PROFILER_WINDOW_SECONDS']
+    grouped = {}
+    for sample in request_log.recent(window_seconds):
+        grouped.setdefault((sample['method'], sample['endpoint']), []).append(sample)
+    rows = []
+    for (method, endpoint), samples in grouped.items():
+        worst = max(samples, key=lambda sample: sample['db_ms'])
+        rows.append({
+            'method': method,
+            'endpoint': endpoint,
+            'requests': len(samples),
+            'avg_statements': sum(sample['statements'] for sample in samples) / len(samples),
+            'max_statements': max(sample['statements'] for sample in samples),
+            'total_db_ms': sum(sample['db_ms'] for sample in samples),
+            'p95_db_ms': _percentile([sample['db_ms'] for sample in samples], 0.95),
+            'p95_total_ms': _percentile([sample['total_ms'] for sample in samples], 0.95),
+            'n_plus_one': sum(1 for sample in samples if sample['repeated']),
+            'worst': worst,
+        })
+    rows.sort(key=lambda row: row['total_db_ms'], reverse=True)
+    return rows[:limit]
+
+
+def init_app(app):
+    app.extensions['sql_profiler'] = {'enabled': app.config['SQL_PROFILER']}
+    if not app.config['SQL_PROFILER']:
+        return
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
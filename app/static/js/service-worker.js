@@ -1,54 +1,16 @@
-// Service Worker for offline functionality
-const CACHE_NAME = 'pilgrim-package-v1';
-const OFFLINE_URL = '/offline';
+// Retired: the service worker is now generated by `flask build-sw` and served
+// from /service-worker.js. Browsers that registered this file replace it with
+// this no-op, which clears the old 'pilgrim-package-v1' cache and unregisters.
+self.addEventListener('install', () => self.skipWaiting());
 
-// Files to cache
-const urlsToCache = [
-    '/',
-    '/static/css/style.css',
-    '/static/js/script.js',
-    '/static/img/logo.png',
-    OFFLINE_URL
-];
-
-// Install event - cache resources
-self.addEventListener('install', event => {
-    event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then(cache => {
-                return cache.addAll(urlsToCache);
-            })
-    );
-});
-
-// Fetch event - serve from cache when offline
-self.addEventListener('fetch', event => {
-    event.respondWith(
-        caches.match(event.request)
-            .then(response => {
-                // Return cached version or fetch from network
-                return response || fetch(event.request);
-            })
-            .catch(() => {
-                // If both cache and network fail, show offline page
-                if (event.request.destination === 'document') {
-                    return caches.match(OFFLINE_URL);
-                }
-            })
-    );
-});
-
-// Activate event - clean up old caches
 self.addEventListener('activate', event => {
     event.waitUntil(
-        caches.keys().then(cacheNames => {
-            return Promise.all(
-                cacheNames.map(cacheName => {
-                    if (cacheName !== CACHE_NAME) {
-                        return caches.delete(cacheName);
-                    }
-                })
-            );
-        })
+        caches.keys()
+            .then(cacheNames => Promise.all(
+                cacheNames
+                    .filter(cacheName => cacheName === 'pilgrim-package-v1')
+                    .map(cacheName => caches.delete(cacheName))
+            ))
+            .then(() => self.registration.unregister())
     );
 });
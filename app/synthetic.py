@@ -0,0 +1,318 @@
+"""
+Synthetic data for capacity testing.
+
+``generate`` streams packages, events, testimonials and queries with their
+response threads into the database in chunks of ``chunk_size`` rows, so
+memory stays flat however many millions of rows are asked for.  Chunks are
+written with ``COPY ... FROM STDIN`` on PostgreSQL and a raw DBAPI
+``executemany`` elsewhere, one commit per chunk.
+
+The data is reproducible for a given ``seed`` and shaped like production:
+
+- destinations are weighted towards the Char Dham and Uttarakhand circuits,
+  durations run 2-16 days and prices scale with both;
+- tickets arrive mostly in business hours over the last ``days`` days, get
+  the usual 12 hour SLA and a log-normal first response time, and older
+  tickets are more likely to be resolved or closed; ``sla_state`` is what
+  ``sla.sweep`` would set;
+- each answered ticket has a thread of responses (``responses_per_query``
+  on average) spaced after the first response, the last one carrying the
+  ticket's final status;
+- a few repeat customers account for many tickets; each chunk resolves
+  its ``Customer`` rows (``app.customers``), links the tickets and
+  refreshes those customers' counters, as bulk ingestion does.
+
+Query ids are assigned here (after the current maximum) so responses can
+point at them without a read-back; run it against a database nobody else is
+writing to.  ``flask generate-data`` is the command-line entry point.
+"""
+import csv
+import io
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from . import db
+from .customers import refresh_counters, resolve_customer_ids
+from .models import Event, Package, Query, QueryResponse, Testimonial, User
+from .sla import CLOSED_STATUSES, sla_state_for
+
+_EPOCH = datetime(1970, 1, 1)
+
+DESTINATIONS = {
+    # destination: (relative weight, base price per day)
+    'Uttarakhand': (30, 3200), 'Char Dham': (20, 4200), 'Jammu & Kashmir': (12, 3800), 'Varanasi': (8, 2500),
+    'Punjab': (5, 2200), 'Tirupati': (6, 2600), 'Rameswaram': (4, 2400), 'Dwarka': (4, 2500), 'Puri': (4, 2100),
+    'Shirdi': (3, 2000), 'Ujjain': (2, 1900), 'Bodh Gaya': (2, 2300),
+}
+DURATION_DAYS = {2: 6, 3: 14, 4: 12, 5: 12, 6: 14, 7: 10, 8: 8, 10: 10, 12: 6, 14: 5, 16: 3}
+QUERY_TYPES = {'General Inquiry': 40, 'Contact Form': 25, 'Booking': 20, 'Payment': 8, 'Cancellation': 7}
+SOURCES = {'home-form': 45, 'contact-page': 30, 'whatsapp': 15, 'phone': 10}
+CHANNELS = {'email': 80, 'phone': 15, 'chat': 5}
+FIRST_NAMES = ['Aarav', 'Ananya', 'Rohan', 'Priya', 'Vikram', 'Meera', 'Arjun', 'Kavya', 'Rahul', 'Sneha',
+               'Harpreet', 'Lakshmi', 'Suresh', 'Deepa', 'Imran', 'Fatima', 'John', 'Mary', 'Gopal', 'Radha']
+LAST_NAMES = ['Sharma', 'Verma', 'Iyer', 'Nair', 'Singh', 'Gupta', 'Reddy', 'Das', 'Patel', 'Khan', 'Joshi', 'Rao']
+SLA_HOURS = 12
+
+PACKAGE_COLUMNS = ('title', 'description', 'price', 'rating', 'image', 'gallery_images', 'duration', 'destination',
+                   'best_time', 'group_size', 'overview', 'itinerary', 'itinerary_days', 'inclusions', 'exclusions',
+                   'highlights', 'cancellation_policy', 'version')
+EVENT_COLUMNS = ('title', 'date', 'destination', 'image', 'link')
+TESTIMONIAL_COLUMNS = ('name', 'location', 'rating', 'message', 'image', 'is_active', 'created_at')
+QUERY_COLUMNS = ('id', 'customer_name', 'customer_email', 'customer_phone', 'query_type', 'status',
+                 'assigned_staff_id', 'priority', 'message', 'created_at', 'updated_at', 'sla_deadline', 'sla_state',
+                 'response_due_at', 'first_response_at', 'resolved_at', 'escalated_at', 'escalation_reason',
+                 'last_contact_channel', 'last_response_summary', 'ticket_number', 'source', 'customer_id')
+RESPONSE_COLUMNS = ('query_id', 'staff_id', 'subject', 'body', 'channel', 'status_after', 'delivery_status',
+                    'delivered_at', 'created_at')
+
+
+class _Picker:
+    """Weighted choice over a ``{value: weight}`` mapping with precomputed cumulative weights."""
+
+    def __init__(self, weights):
+        self.values = list(weights)
+        self.cumulative = list(accumulate(weights.values()))
+
+    def __call__(self, rng):
+        return rng.choices(self.values, cum_weights=self.cumulative)[0]
+
+
+_destination = _Picker({name: weight for name, (weight, _) in DESTINATIONS.items()})
+_duration = _Picker(DURATION_DAYS)
+_query_type = _Picker(QUERY_TYPES)
+_source = _Picker(SOURCES)
+_channel = _Picker(CHANNELS)
+_rating = _Picker({5: 60, 4: 28, 3: 9, 2: 2, 1: 1})
+
+
+def _stamp(seconds):
+    """Epoch seconds as the text both SQLite and PostgreSQL read as a timestamp."""
+    return (_EPOCH + timedelta(seconds=int(seconds))).isoformat(' ', 'microseconds')
+
+
+def _name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def _customer_name(customer):
+    # The same customer writes under the same name every time.
+    return f'{FIRST_NAMES[customer % len(FIRST_NAMES)]} {LAST_NAMES[customer // len(FIRST_NAMES) % len(LAST_NAMES)]}'
+
+
+def _package_rows(rng, count):
+    for number in range(count):
+        destination = _destination(rng)
+        days = _duration(rng)
+        price = int(DESTINATIONS[destination][1] * days * rng.uniform(0.8, 1.4)) // 100 * 100
+        stops = [f'Day {day}: {destination} darshan and sightseeing' for day in range(1, days + 1)]
+        yield (
+            f'{destination} Yatra {days}D #{number}', f'{days} day pilgrimage to {destination}.', price,
+            f'{min(5.0, rng.gauss(4.4, 0.3)):.1f}', f'images/packages/{rng.randrange(60)}.jpg',
+            ','.join(f'images/gallery/{rng.randrange(200)}.jpg' for _ in range(4)),
+            f'{days} Days / {days - 1:02d} Nights', destination, rng.choice(['April to June', 'September to November',
+                                                                            'October to March', 'All year']),
+            f'{rng.choice([2, 4, 6, 10])}-{rng.choice([15, 20, 30, 40])}',
+            f'<p>A {days} day journey through {destination} with guided temple visits.</p>',
+            '\n'.join(stops), '\n'.join(f'<h4>{stop}</h4><p>Hotel stay and meals.</p>' for stop in stops),
+            'Accommodation\nDaily breakfast and dinner\nAC transport\nTour guide',
+            'Airfare\nPersonal expenses\nPony and palki charges', 'Temple darshan\nEvening aarti\nRiver ghats',
+            'Free cancellation up to 15 days before departure.', '1',
+        )
+
+
+def _event_rows(rng, count, now):
+    for number in range(count):
+        destination = _destination(rng)
+        day = now + timedelta(days=rng.randrange(-60, 240))
+        yield (f'{destination} Utsav {number}', day.strftime('%d %b %Y'), destination,
+               f'images/events/{rng.randrange(30)}.jpg', f'/packages?destination={destination}')
+
+
+def _testimonial_rows(rng, count, start, span):
+    for _ in range(count):
+        yield (_name(rng), _destination(rng), _rating(rng), 'Everything was arranged well; the darshan was peaceful.',
+               None, rng.random() < 0.9, _stamp(start + rng.random() * span))
+
+
+def _arrival(rng, start, span):
+    """A ticket arrival time, busiest 09:00-20:00 IST (03:30-14:30 UTC)."""
+    moment = start + rng.random() * span
+    if rng.random() < 0.75:
+        day = moment - moment % 86400
+        moment = day + 12600 + rng.random() * 39600
+    return moment
+
+
+def _ticket_rows(rng, count, first_id, staff_ids, responses_per_query, now, start, span):
+    """Yield ``(query row, [response rows])`` for ``count`` tickets; ``customer_id`` is left to the caller."""
+    now_seconds = (now - _EPOCH).total_seconds()
+    customers = max(1, int(count * 0.6))
+    chain_p = 1 / max(responses_per_query, 1.0)
+    for offset in range(count):
+        query_id = first_id + offset
+        created = min(_arrival(rng, start, span), now_seconds - 60)
+        age_days = (now_seconds - created) / 86400
+        # Fresh tickets are mostly open; month-old ones mostly done.
+        done = 1 - math.exp(-age_days / 4)
+        roll = rng.random()
+        if roll < done * 0.55:
+            status = 'Closed'
+        elif roll < done * 0.9:
+            status = 'Resolved'
+        elif roll < done * 0.9 + 0.12:
+            status = 'Responded'
+        elif roll < done * 0.9 + 0.2:
+            status = 'In Progress'
+        else:
+            status = 'Open'
+        deadline = created + SLA_HOURS * 3600
+        first_response = created + rng.lognormvariate(math.log(3 * 3600), 0.9)
+        answered = status != 'Open' and first_response < now_seconds
+        customer = int(customers * rng.paretovariate(1.2)) % customers
+        staff_id = rng.choice(staff_ids) if staff_ids and (answered or rng.random() < 0.4) else None
+        priority = 'Escalated' if rng.random() < 0.05 else 'Urgent' if rng.random() < 0.1 else 'Normal'
+        channel = _channel(rng)
+
+        responses, moment = [], first_response
+        if answered:
+            # Geometric thread length with mean responses_per_query.
+            length = 1
+            while rng.random() > chain_p and length < 20:
+                length += 1
+            for number in range(length):
+                if moment >= now_seconds:
+                    break
+                last = number == length - 1
+                responses.append((
+                    query_id, staff_id, f'Re: your {_destination(rng)} enquiry',
+                    'Namaste, thank you for writing to us. Please find the details below.', channel,
+                    status if last else 'Responded', 'sent', _stamp(moment), _stamp(moment),
+                ))
+                moment += rng.lognormvariate(math.log(10 * 3600), 1.0)
+        updated = min(moment, now_seconds) if responses else created
+        resolved = updated if status in CLOSED_STATUSES else None
+        escalated = created + rng.random() * SLA_HOURS * 3600 if priority == 'Escalated' else None
+        deadline_at = _EPOCH + timedelta(seconds=deadline)
+        yield (
+            query_id, _customer_name(customer), f'pilgrim{customer}@example.com', f'9{customer:09d}'[:10], _query_type(rng), status,
+            staff_id, priority, f'Looking for a {_duration(rng)} day trip to {_destination(rng)} for my family.',
+            _stamp(created), _stamp(updated), _stamp(deadline), sla_state_for(status, deadline_at, now),
+            _stamp(deadline), _stamp(first_response) if responses else None, _stamp(resolved) if resolved else None,
+            _stamp(escalated) if escalated else None, 'Escalated by staff' if escalated else None,
+            channel if responses else None, responses[-1][2] if responses else None, f'S-{query_id:010d}',
+            _source(rng), None,
+        ), responses
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_value(value):
+    return '\\N' if value is None else value
+
+
+def _write(table, columns, rows):
+    """Append ``rows`` (tuples in ``columns`` order) to ``table`` on the session's connection."""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    cursor = connection.connection.cursor()
+    names = ', '.join(f'"{column}"' for column in columns)
+    try:
+        if dialect.name == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([[_csv_value(value) for value in row] for row in rows])
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({names}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+        elif dialect.paramstyle in ('qmark', 'format', 'pyformat'):
+            marker = '?' if dialect.paramstyle == 'qmark' else '%s'
+            cursor.executemany(f'INSERT INTO {table} ({names}) VALUES ({", ".join([marker] * len(columns))})', rows)
+        else:
+            db.session.execute(db.metadata.tables[table].insert(), [dict(zip(columns, row)) for row in rows])
+    finally:
+        cursor.close()
+
+
+def _load(label, table, columns, rows, chunk_size, progress):
+    written, started = 0, time.perf_counter()
+    for chunk in _chunks(rows, chunk_size):
+        _write(table, columns, chunk)
+        db.session.commit()
+        written += len(chunk)
+        if progress:
+            progress(label, written, time.perf_counter() - started)
+    return written
+
+
+def _staff_ids():
+    ids = db.session.execute(select(User.id)).scalars().all()
+    if ids:
+        return ids
+    users = [User(username=f'synthetic-staff-{number}') for number in range(8)]
+    for user in users:
+        user.set_password(f'synthetic-{random.random()}')
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+def generate(packages=0, events=0, testimonials=0, queries=0, responses_per_query=2.0, days=365, seed=0,
+             chunk_size=None, progress=None):
+    """Write synthetic rows; return ``{table: rows written}``.
+
+    ``progress(label, rows_so_far, seconds)`` is called after every chunk.
+    """
+    chunk_size = chunk_size or current_app.config['SYNTHETIC_CHUNK_SIZE']
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    end = (now - _EPOCH).total_seconds()
+    span = days * 86400
+    written = {}
+    if packages:
+        written['package'] = _load('packages', Package.__tablename__, PACKAGE_COLUMNS, _package_rows(rng, packages),
+                                   chunk_size, progress)
+    if events:
+        written['event'] = _load('events', Event.__tablename__, EVENT_COLUMNS, _event_rows(rng, events, now),
+                                 chunk_size, progress)
+    if testimonials:
+        written['testimonial'] = _load('testimonials', Testimonial.__tablename__, TESTIMONIAL_COLUMNS,
+                                       _testimonial_rows(rng, testimonials, end - span, span), chunk_size, progress)
+    if queries:
+        first_id = (db.session.execute(select(func.max(Query.id))).scalar() or 0) + 1
+        tickets = _ticket_rows(rng, queries, first_id, _staff_ids(), responses_per_query, now, end - span, span)
+        written.update(query=0, query_response=0)
+        started = time.perf_counter()
+        for chunk in _chunks(tickets, chunk_size):
+            contacts = [{'customer_name': row[1], 'customer_email': row[2], 'customer_phone': row[3]}
+                        for row, _ in chunk]
+            customer_ids = resolve_customer_ids(contacts)
+            _write(Query.__tablename__, QUERY_COLUMNS,
+                   [row[:-1] + (contact['customer_id'],) for (row, _), contact in zip(chunk, contacts)])
+            responses = [response for _, thread in chunk for response in thread]
+            if responses:
+                _write(QueryResponse.__tablename__, RESPONSE_COLUMNS, responses)
+            refresh_counters(customer_ids)
+            db.session.commit()
+            written['query'] += len(chunk)
+            written['query_response'] += len(responses)
+            if progress:
+                progress('queries', written['query'], time.perf_counter() - started)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # Ids were written explicitly; move the sequence past them.
+            db.session.execute(db.text("SELECT setval(pg_get_serial_sequence('query', 'id'), "
+                                       "(SELECT max(id) FROM query))"))
+            db.session.commit()
+    return written
@@ -0,0 +1,84 @@
+"""
+Ticket tags.
+
+Tags live in ``tag`` and the ``query_tag`` association table (primary key
+``(query_id, tag_id)`` plus an ``(tag_id, query_id)`` index), replacing the
+old comma-separated ``query.tags`` column.  Filtering on a tag is an
+``EXISTS`` probe on that index and facet counts are a ``GROUP BY`` over it,
+so neither reads or pattern-matches ticket rows.  Tagging and untagging
+many tickets are single ``INSERT ... SELECT`` / ``DELETE`` statements (see
+``app.bulk_actions``).
+"""
+from sqlalchemy import exists, func, select
+
+from . import db
+from .models import Query, Tag, query_tag
+from .sql_helpers import insert_ignore
+
+MAX_LENGTH = Tag.__table__.c.name.type.length
+
+
+def normalize_tag(name):
+    """Lower-case with whitespace collapsed; ``None`` when nothing is left."""
+    name = ' '.join((name or '').split()).lower()[:MAX_LENGTH]
+    return name or None
+
+
+def parse_tags(value):
+    """Normalized, de-duplicated tag names from a comma-separated string or a list."""
+    items = value.split(',') if isinstance(value, str) else (value or [])
+    names = []
+    for item in items:
+        name = normalize_tag(str(item))
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def ensure_tags(names, connection=None):
+    """Return ``{name: id}`` for ``names``, creating the missing tags."""
+    connection = connection or db.session.connection()
+    table = Tag.__table__
+    lookup = lambda: dict(connection.execute(select(table.c.name, table.c.id).where(table.c.name.in_(names))).all())
+    ids = lookup() if names else {}
+    missing = [name for name in names if name not in ids]
+    if missing:
+        insert_ignore(connection, table, [{'name': name} for name in missing], ['name'])
+        ids = lookup()
+    return ids
+
+
+def link_tags(pairs, connection=None):
+    """Attach ``[(query_id, tag_name)]``; pairs that already exist are skipped."""
+    if not pairs:
+        return
+    connection = connection or db.session.connection()
+    ids = ensure_tags(sorted({name for _, name in pairs}), connection)
+    insert_ignore(connection, query_tag, [
+        {'query_id': query_id, 'tag_id': ids[name]} for query_id, name in set(pairs)
+    ], ['query_id', 'tag_id'])
+
+
+def tag_id_for(name):
+    return select(Tag.id).where(Tag.name == name).scalar_subquery()
+
+
+def has_tag(name):
+    """Condition on ``Query`` for tickets carrying tag ``name``."""
+    return exists().where(query_tag.c.query_id == Query.id, query_tag.c.tag_id == tag_id_for(name))
+
+
+def tag_facets(conditions=(), limit=20):
+    """``[(tag, ticket count)]`` over the tickets matching ``conditions``, most used first."""
+    count = func.count().label('tickets')
+    stmt = (
+        select(Tag.name, count)
+        .select_from(query_tag)
+        .join(Tag, Tag.id == query_tag.c.tag_id)
+        .group_by(Tag.name)
+        .order_by(count.desc(), Tag.name)
+        .limit(limit)
+    )
+    if conditions:
+        stmt = stmt.where(query_tag.c.query_id.in_(select(Query.id).where(*conditions)))
+    return db.session.execute(stmt).all()
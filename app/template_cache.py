@@ -0,0 +1,76 @@
+"""
+Persistent Jinja bytecode cache for short-lived (serverless) workers.
+
+Every new worker otherwise re-parses and re-compiles each template on its
+first render.  ``init_app`` points the Jinja environment at a filesystem
+bytecode cache, and ``flask precompile-templates`` fills it at deploy time
+so cold workers only unmarshal code objects.  Stale entries are discarded
+by Jinja itself: each bucket stores a checksum of the template source.
+"""
+import os
+import tempfile
+import time
+
+from jinja2 import FileSystemBytecodeCache
+from jinja2.bccache import Bucket
+
+from .metrics import cache_lookup
+
+TEMPLATE_EXTENSIONS = ('.html', '.js')
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """``FileSystemBytecodeCache`` that survives a read-only deploy bundle.
+
+    Keys use only the template name (not its absolute path), so a cache
+    built in the deploy sandbox stays valid where the bundle is unpacked.
+    """
+
+    def get_bucket(self, environment, name, filename, source):
+        key = self.get_cache_key(name)
+        checksum = self.get_source_checksum(source)
+        bucket = Bucket(environment, key, checksum)
+        self.load_bytecode(bucket)
+        cache_lookup('template_bytecode', bucket.code is not None)
+        return bucket
+
+    def dump_bytecode(self, bucket):
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            # Read-only filesystem: keep serving with the in-memory template.
+            pass
+
+
+def _cache_dir(app):
+    path = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if not os.path.isabs(path):
+        path = os.path.join(app.root_path, path)
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        if not os.path.isdir(path):
+            path = os.path.join(tempfile.gettempdir(), 'pilgrim-jinja-cache')
+            os.makedirs(path, exist_ok=True)
+    return path
+
+
+def precompile_templates(app, clear=False):
+    """Compile every template into the bytecode cache; return ``{name: ms}``."""
+    env = app.jinja_env
+    if env.bytecode_cache is None:
+        raise RuntimeError('JINJA_BYTECODE_CACHE is disabled')
+    if clear:
+        env.bytecode_cache.clear()
+    env.cache.clear()
+    timings = {}
+    for name in env.list_templates(filter_func=lambda n: n.endswith(TEMPLATE_EXTENSIONS)):
+        start = time.perf_counter()
+        env.get_template(name)
+        timings[name] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def init_app(app):
+    if app.config['JINJA_BYTECODE_CACHE']:
+        app.jinja_env.bytecode_cache = TemplateBytecodeCache(_cache_dir(app))
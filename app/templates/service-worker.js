@@ -0,0 +1,127 @@
+// Service Worker for offline functionality.
+// Generated by `flask build-sw` from the asset manifest; do not edit the output.
+const VERSION = {{ version|tojson }};
+const PRECACHE = 'pilgrim-precache-' + VERSION;
+const PAGES_CACHE = 'pilgrim-pages-' + VERSION;
+const ASSETS_CACHE = 'pilgrim-assets';
+const STATIC_CACHE = 'pilgrim-static';
+const OFFLINE_URL = {{ offline_url|tojson }};
+
+const PRECACHE_URLS = {{ precache|tojson }};
+const HASHED_PREFIX = {{ hashed_prefix|tojson }};
+const STATIC_PREFIX = {{ static_prefix|tojson }};
+const STALE_WHILE_REVALIDATE = {{ swr_routes|tojson }}.map(pattern => new RegExp(pattern));
+const NETWORK_FIRST = {{ network_first_routes|tojson }}.map(pattern => new RegExp(pattern));
+const BYPASS = {{ bypass_routes|tojson }}.map(pattern => new RegExp(pattern));
+const MAX_ENTRIES = {{ max_entries|tojson }};
+
+// Keep runtime caches bounded by evicting the oldest entries.
+function trimCache(cacheName) {
+    const limit = MAX_ENTRIES[cacheName.replace('-' + VERSION, '')] || 50;
+    return caches.open(cacheName).then(cache => cache.keys().then(keys => {
+        if (keys.length <= limit) {
+            return;
+        }
+        return Promise.all(keys.slice(0, keys.length - limit).map(key => cache.delete(key)));
+    }));
+}
+
+function putInCache(cacheName, request, response) {
+    if (!response || !response.ok || response.type === 'opaque') {
+        return Promise.resolve();
+    }
+    return caches.open(cacheName)
+        .then(cache => cache.put(request, response))
+        .then(() => trimCache(cacheName));
+}
+
+// Hashed assets never change, so any cached copy is valid forever.
+function cacheFirst(event, cacheName) {
+    return caches.match(event.request).then(cached => {
+        if (cached) {
+            return cached;
+        }
+        return fetch(event.request).then(response => {
+            event.waitUntil(putInCache(cacheName, event.request, response.clone()));
+            return response;
+        });
+    });
+}
+
+function staleWhileRevalidate(event, cacheName) {
+    return caches.open(cacheName).then(cache => cache.match(event.request).then(cached => {
+        const network = fetch(event.request).then(response => {
+            event.waitUntil(putInCache(cacheName, event.request, response.clone()));
+            return response;
+        });
+        if (cached) {
+            event.waitUntil(network.catch(() => undefined));
+            return cached;
+        }
+        return network.catch(() => caches.match(OFFLINE_URL));
+    }));
+}
+
+function networkFirst(event, cacheName) {
+    return fetch(event.request)
+        .then(response => {
+            event.waitUntil(putInCache(cacheName, event.request, response.clone()));
+            return response;
+        })
+        .catch(() => caches.match(event.request).then(cached => {
+            if (cached) {
+                return cached;
+            }
+            if (event.request.mode === 'navigate') {
+                return caches.match(OFFLINE_URL);
+            }
+            return Response.error();
+        }));
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(PRECACHE)
+            .then(cache => cache.addAll(PRECACHE_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+// Drop caches from previous versions.
+self.addEventListener('activate', event => {
+    const current = [PRECACHE, PAGES_CACHE, ASSETS_CACHE, STATIC_CACHE];
+    event.waitUntil(
+        caches.keys()
+            .then(cacheNames => Promise.all(
+                cacheNames
+                    .filter(cacheName => current.indexOf(cacheName) === -1)
+                    .map(cacheName => caches.delete(cacheName))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+    const path = url.pathname;
+    if (BYPASS.some(pattern => pattern.test(path))) {
+        return;
+    }
+
+    if (path.startsWith(HASHED_PREFIX)) {
+        event.respondWith(cacheFirst(event, ASSETS_CACHE));
+    } else if (path.startsWith(STATIC_PREFIX)) {
+        event.respondWith(staleWhileRevalidate(event, STATIC_CACHE));
+    } else if (STALE_WHILE_REVALIDATE.some(pattern => pattern.test(path))) {
+        event.respondWith(staleWhileRevalidate(event, PAGES_CACHE));
+    } else if (NETWORK_FIRST.some(pattern => pattern.test(path)) || request.mode === 'navigate') {
+        event.respondWith(networkFirst(event, PAGES_CACHE));
+    }
+});
@@ -0,0 +1,462 @@
+"""
+Request tracing.
+
+With ``TRACING_ENABLED`` each request becomes a trace of nested spans:
+
+    GET /package/<int:id>            (request, from before_request to teardown)
+      view main.package_detail
+        cache.get                    (Flask-Caching backend calls)
+        sql SELECT                   (one per statement, with the SQL text)
+        template package_detail.html
+          sql SELECT                 (lazy loads while rendering)
+      compress                       (Flask-Compress and cached variants)
+
+The current span lives in a ``ContextVar``.  Trace context follows the
+W3C ``traceparent`` format: an incoming header continues the caller's
+trace, and ``current_traceparent()`` / ``span(..., parent=...)`` carry it
+into background work.  Rows queued by the write-behind ingestion path
+keep the submitting request's context, and the flusher's batch span links
+to it.  Jobs (ingest flush, outbox delivery, SLA sweep, archival) open
+root spans of their own.
+
+Sampling is decided once per trace: ``TRACING_SAMPLE_RATE`` of new traces
+are recorded and an incoming ``traceparent`` keeps its sampled flag.
+Unsampled traces only carry ids, so tracing can stay on in production at
+a low rate.  Finished spans are batched and written every
+``TRACING_EXPORT_INTERVAL`` seconds by the exporters in
+``TRACING_EXPORTERS``: ``jsonl`` appends one JSON object per span to
+``TRACING_JSONL_PATH``; ``otlp`` posts OTLP/HTTP JSON to
+``TRACING_OTLP_ENDPOINT`` (``/v1/traces`` of a local OpenTelemetry
+collector, Jaeger or Tempo).
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import cache, compress
+
+log = logging.getLogger(__name__)
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+_current = ContextVar('trace_span', default=None)
+_SQL_KEY = 'tracing_spans'
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'sampled', 'name', 'kind', 'start', 'end',
+                 'attributes', 'error', 'links')
+
+    def __init__(self, name, trace_id, parent_id, sampled, kind=KIND_INTERNAL, attributes=None, links=None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.links = links or []
+
+    @property
+    def traceparent(self):
+        return f'00-{self.trace_id}-{self.span_id}-{"01" if self.sampled else "00"}'
+
+    def set(self, key, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def as_dict(self):
+        return {
+            'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+            'name': self.name, 'kind': self.kind, 'start_ns': self.start, 'end_ns': self.end,
+            'duration_ms': (self.end - self.start) / 1e6, 'attributes': self.attributes,
+            'error': self.error, 'links': self.links,
+        }
+
+
+def parse_traceparent(value):
+    """``(trace_id, parent_span_id, sampled)`` from a ``traceparent`` header, or ``None``."""
+    parts = (value or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or set(parts[1]) == {'0'}:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+
+def _sample(rate):
+    return rate >= 1 or random.random() < rate
+
+
+def _start(name, parent=None, kind=KIND_INTERNAL, attributes=None, links=None, rate=None):
+    """Open a span under ``parent`` (a Span, a traceparent string or ``None`` for a new trace)."""
+    if isinstance(parent, Span):
+        return Span(name, parent.trace_id, parent.span_id, parent.sampled, kind, attributes, links)
+    context = parse_traceparent(parent) if parent else None
+    if context:
+        trace_id, parent_id, sampled = context
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+        sampled = _sample(rate if rate is not None else current_app.config['TRACING_SAMPLE_RATE'])
+    return Span(name, trace_id, parent_id, sampled, kind, attributes, links)
+
+
+def _finish(span, error=None):
+    span.end = time.time_ns()
+    if error is not None:
+        span.error = f'{type(error).__name__}: {error}'
+    if span.sampled:
+        _exporter().add(span)
+
+
+def enabled():
+    try:
+        return current_app.extensions['tracing']['enabled']
+    except (RuntimeError, KeyError):
+        return False
+
+
+def current_span():
+    return _current.get()
+
+
+def current_traceparent():
+    """``traceparent`` of the active span, for handing work to another process or thread."""
+    span = _current.get()
+    return span.traceparent if span else None
+
+
+@contextmanager
+def span(name, attributes=None, parent=None, root=False, links=None, kind=KIND_INTERNAL):
+    """Trace a block as a child of the current span.
+
+    Without a current span nothing is recorded unless ``root`` (start a new
+    trace, e.g. for a background job) or ``parent`` (a ``traceparent``
+    string to continue) is given.  Yields the span, or ``None``.
+    """
+    parent = parent or _current.get()
+    if not enabled() or (parent is None and not root):
+        yield None
+        return
+    current = _start(name, parent, kind, attributes, links)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        _finish(current, exc)
+        raise
+    else:
+        _finish(current)
+    finally:
+        _current.reset(token)
+
+
+def traced(name, root=False):
+    """Decorator form of ``span``."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, root=root):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def link_to(traceparents):
+    """Span links for the given ``traceparent`` strings (sampled ones only)."""
+    links = []
+    for value in traceparents:
+        context = parse_traceparent(value)
+        if context and context[2]:
+            links.append({'trace_id': context[0], 'span_id': context[1]})
+    return links
+
+
+# Request, view, SQL, template, cache and compression instrumentation.
+
+def _start_request():
+    current = _start(
+        f'{request.method} {request.url_rule.rule if request.url_rule else request.path}',
+        request.headers.get('traceparent'),
+        KIND_SERVER,
+        {'http.method': request.method, 'http.target': request.full_path.rstrip('?'),
+         'http.route': request.url_rule.rule if request.url_rule else None},
+    )
+    g._trace_request = (current, _current.set(current))
+
+
+def _end_request(response):
+    entry = g.get('_trace_request')
+    if entry is not None:
+        entry[0].set('http.status_code', response.status_code)
+        response.headers['traceparent'] = entry[0].traceparent
+    return response
+
+
+def _teardown_request(exc):
+    # A template that raised never sends template_rendered.
+    for child, token in reversed(g.pop('_trace_templates', [])):
+        _finish(child, exc)
+        _current.reset(token)
+    entry = g.pop('_trace_request', None)
+    if entry is None:
+        return
+    current, token = entry
+    _finish(current, exc)
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Streamed responses tear down in another context.
+        _current.set(None)
+
+
+def _wrap_dispatch(app):
+    dispatch = app.dispatch_request
+
+    def traced_dispatch():
+        with span(f'view {request.endpoint}'):
+            return dispatch()
+
+    app.dispatch_request = traced_dispatch
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    words = statement.split(None, 1)
+    child = _start(f'sql {words[0].upper() if words else ""}', parent, KIND_CLIENT,
+                   {'db.system': conn.dialect.name, 'db.statement': statement[:2000], 'db.executemany': executemany})
+    conn.info.setdefault(_SQL_KEY, []).append(child)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get(_SQL_KEY)
+    if spans:
+        child = spans.pop()
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            child.set('db.rows', cursor.rowcount)
+        _finish(child)
+
+
+def _handle_error(exception_context):
+    spans = exception_context.connection.info.get(_SQL_KEY) if exception_context.connection else None
+    if spans:
+        _finish(spans.pop(), exception_context.original_exception)
+
+
+def _before_render(sender, template, context, **extra):
+    parent = _current.get()
+    if parent is None:
+        return
+    child = _start(f'template {template.name or "string"}', parent)
+    g.setdefault('_trace_templates', []).append((child, _current.set(child)))
+
+
+def _rendered(sender, template, context, **extra):
+    stack = g.get('_trace_templates')
+    if stack:
+        child, token = stack.pop()
+        _finish(child)
+        _current.reset(token)
+
+
+def _wrap_cache_backend(backend):
+    if getattr(backend, '_traced', False):
+        return
+    for method in ('get', 'set', 'get_many', 'set_many', 'delete', 'add'):
+        original = getattr(backend, method, None)
+        if original is None:
+            continue
+
+        def traced_call(*args, _method=method, _original=original, **kwargs):
+            parent = _current.get()
+            if parent is not None and parent.name.startswith('cache.'):
+                # get_many and friends call get/set on some backends.
+                return _original(*args, **kwargs)
+            with span(f'cache.{_method}', {'cache.key': str(args[0])[:200] if args else None}):
+                return _original(*args, **kwargs)
+
+        setattr(backend, method, traced_call)
+    backend._traced = True
+
+
+def _wrap_compress(app):
+    functions = app.after_request_funcs.get(None, [])
+    for index, function in enumerate(functions):
+        if getattr(function, '__self__', None) is compress:
+            def traced_compress(response, _function=function):
+                with span('compress', {'http.response_content_length': response.content_length}) as current:
+                    result = _function(response)
+                    if current is not None:
+                        current.set('http.content_encoding', result.headers.get('Content-Encoding'))
+                    return result
+            functions[index] = traced_compress
+
+
+# Exporters.
+
+class JsonLinesExporter:
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, spans):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a') as handle:
+            for item in spans:
+                handle.write(json.dumps(item.as_dict(), default=str) + '\n')
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OtlpHttpExporter:
+    """OTLP/HTTP with the JSON encoding; needs no OpenTelemetry packages."""
+
+    def __init__(self, endpoint, service_name, headers=None, timeout=5):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.service_name = service_name
+        self.headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+        self.timeout = timeout
+
+    def encode(self, spans):
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [{
+                    'traceId': item.trace_id,
+                    'spanId': item.span_id,
+                    'parentSpanId': item.parent_id or '',
+                    'name': item.name,
+                    'kind': item.kind,
+                    'startTimeUnixNano': str(item.start),
+                    'endTimeUnixNano': str(item.end),
+                    'attributes': [{'key': key, 'value': _otlp_value(value)}
+                                   for key, value in item.attributes.items() if value is not None],
+                    'links': [{'traceId': link['trace_id'], 'spanId': link['span_id']} for link in item.links],
+                    'status': {'code': 2, 'message': item.error} if item.error else {'code': 1},
+                } for item in spans],
+            }],
+        }]}
+
+    def export(self, spans):
+        body = json.dumps(self.encode(spans)).encode('utf-8')
+        http_request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+            response.read()
+
+
+class BatchExporter:
+    """Buffers finished spans and hands them to the exporters from a background thread."""
+
+    def __init__(self, exporters, interval, max_queue):
+        self.exporters = exporters
+        self.interval = interval
+        self.queue = deque(maxlen=max_queue)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def add(self, item):
+        self.queue.append(item)
+        if self.pid != os.getpid():
+            self._start()
+
+    def _start(self):
+        # Per process: a worker forked from a preloading master needs its own thread.
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            spans = []
+            while self.queue:
+                spans.append(self.queue.popleft())
+        if not spans:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception:
+                log.warning('Exporting %d spans with %s failed', len(spans), type(exporter).__name__, exc_info=True)
+
+
+_exporters = {}
+
+
+def _exporter():
+    return current_app.extensions['tracing']['exporter']
+
+
+def _build_exporter(config):
+    exporters = []
+    names = [name.strip() for name in config['TRACING_EXPORTERS'].split(',') if name.strip()]
+    if 'jsonl' in names:
+        exporters.append(JsonLinesExporter(config['TRACING_JSONL_PATH']))
+    if 'otlp' in names:
+        headers = dict(pair.split('=', 1) for pair in config['TRACING_OTLP_HEADERS'].split(',') if '=' in pair)
+        exporters.append(OtlpHttpExporter(config['TRACING_OTLP_ENDPOINT'], config['TRACING_SERVICE_NAME'], headers))
+    # Keyed on the settings so the lazily built admin app shares the public app's buffer.
+    key = (tuple(names), config['TRACING_JSONL_PATH'], config['TRACING_OTLP_ENDPOINT'])
+    if key not in _exporters:
+        _exporters[key] = BatchExporter(exporters, config['TRACING_EXPORT_INTERVAL'], config['TRACING_MAX_QUEUE'])
+        atexit.register(_exporters[key].flush)
+    return _exporters[key]
+
+
+def init_app(app):
+    config = app.config
+    state = app.extensions.setdefault('tracing', {'enabled': config['TRACING_ENABLED'], 'exporter': None})
+    if not config['TRACING_ENABLED']:
+        return
+    if state['exporter'] is None:
+        state['exporter'] = _build_exporter(config)
+    app.before_request(_start_request)
+    app.after_request(_end_request)
+    app.teardown_request(_teardown_request)
+    _wrap_dispatch(app)
+    _wrap_compress(app)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    _wrap_cache_backend(app.extensions['cache'][cache])
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
@@ -0,0 +1,105 @@
+"""
+Cold-start benchmark: import time and memory of ``create_app()``.
+
+Runs ``python -X importtime`` in a fresh interpreter for each start-up mode
+(eager admin blueprint vs. ``LAZY_ADMIN_BLUEPRINT``), summarises the
+slowest top-level packages (by self time), and reports wall time and RSS after
+``create_app()``.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --top 15 --json results/import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+elapsed = time.perf_counter() - start
+rss_kb = 0
+try:
+    with open('/proc/self/status') as fh:
+        for line in fh:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print('@@RESULT@@' + json.dumps({'create_app_seconds': elapsed, 'rss_kb': rss_kb}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return ``{top-level package: self time in us}`` from ``-X importtime``."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, _cumulative_us, name = line[len('import time:'):].split('|')
+        except ValueError:
+            continue
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+    return packages
+
+
+def run_mode(lazy_admin):
+    env = dict(os.environ)
+    env['LAZY_ADMIN_BLUEPRINT'] = 'true' if lazy_admin else 'false'
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith('@@RESULT@@'):
+            result = json.loads(line[len('@@RESULT@@'):])
+    if result is None:
+        raise RuntimeError(f'create_app() failed:\n{proc.stderr[-2000:]}')
+    modules = parse_importtime(proc.stderr)
+    result['total_import_us'] = sum(modules.values())
+    result['modules'] = modules
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--top', type=int, default=10, help='number of slowest packages to show')
+    parser.add_argument('--json', dest='json_path', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for label, lazy_admin in (('eager', False), ('lazy', True)):
+        result = run_mode(lazy_admin)
+        results[label] = result
+        print(f"[{label}] create_app(): {result['create_app_seconds'] * 1000:.1f} ms, "
+              f"RSS {result['rss_kb'] / 1024:.1f} MiB, imports {result['total_import_us'] / 1000:.1f} ms")
+        slowest = sorted(result['modules'].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, self_us in slowest:
+            print(f"    {name:<28}{self_us / 1000:>9.1f} ms")
+
+    eager, lazy = results['eager'], results['lazy']
+    print(f"lazy vs eager: {(eager['create_app_seconds'] - lazy['create_app_seconds']) * 1000:+.1f} ms saved, "
+          f"{(eager['rss_kb'] - lazy['rss_kb']) / 1024:+.1f} MiB saved")
+
+    if args.json_path:
+        summary = {
+            label: {key: value for key, value in result.items() if key != 'modules'}
+            for label, result in results.items()
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, 'w', encoding='utf-8') as fh:
+            json.dump(summary, fh, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Sustained contact-form submissions/sec: direct insert vs. ingestion queue.
+
+Posts ``--count`` valid contact forms through the test client in each mode
+and reports submissions/sec and p50/p95 request latency, then how long the
+queue takes to drain into the ``query`` table.  ``--db-latency-ms`` adds a
+delay to every statement on the main database to stand in for the round
+trip to a remote Postgres.
+
+    python benchmarks/ingest_throughput.py
+    python benchmarks/ingest_throughput.py --count 2000 --db-latency-ms 5 --json results/ingest.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def make_app(tmp, db_latency):
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ['INGEST_QUEUE_PATH'] = os.path.join(tmp, 'ingest.sqlite3')
+    from sqlalchemy import event
+
+    from app import create_app, db
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, INGEST_FLUSH_IN_PROCESS=False)
+    with app.app_context():
+        db.create_all()
+        if db_latency:
+            event.listen(db.engine, 'before_cursor_execute', lambda *args: time.sleep(db_latency))
+    return app
+
+
+def run(app, count, queued):
+    from app import db
+    from app.ingest_queue import drain
+    from app.models import Query
+
+    app.config['INGEST_QUEUE_ENABLED'] = queued
+    with app.app_context():
+        rows_before = db.session.query(Query).count()
+    client = app.test_client()
+    timings = []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        response = client.post('/contact', data={
+            'name': f'Pilgrim {i}', 'email': f'pilgrim{i}@example.com',
+            'phone': '9999999999', 'message': 'Char Dham group enquiry',
+        })
+        timings.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 302, response.status_code
+    elapsed = time.perf_counter() - start
+    result = {
+        'submissions_per_sec': count / elapsed,
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 0.95),
+    }
+    with app.app_context():
+        if queued:
+            start = time.perf_counter()
+            totals = drain(app)
+            result['drain_seconds'] = time.perf_counter() - start
+            result['drain_rows_per_sec'] = totals['inserted'] / result['drain_seconds']
+        result['rows'] = db.session.query(Query).count() - rows_before
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=500, help='submissions per mode')
+    parser.add_argument('--db-latency-ms', type=float, default=2.0, help='simulated round trip per statement')
+    parser.add_argument('--json', dest='json_path', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(tmp, args.db_latency_ms / 1000)
+        for label, queued in (('direct', False), ('queued', True)):
+            results[label] = result = run(app, args.count, queued)
+            line = (f"[{label}] {result['submissions_per_sec']:.0f} submissions/s, "
+                    f"p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, {result['rows']} rows")
+            if queued:
+                line += f"; drained in {result['drain_seconds']:.2f} s ({result['drain_rows_per_sec']:.0f} rows/s)"
+            print(line)
+    print(f"speed-up: {results['queued']['submissions_per_sec'] / results['direct']['submissions_per_sec']:.1f}x")
+
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Per-request CPU of the hot public-page reads: ORM queries vs. ``app.repository``.
+
+Seeds a SQLite file with packages, events, testimonials, banners, FAQs and
+pages, then, for each page's set of reads, runs the ORM queries the views
+used before (``before``) and the prebuilt repository statements
+(``after``) ``--iterations`` times.  The session is removed after every
+iteration, as at the end of a request.  Reports CPU time (``process_time``)
+per request, the best of ``--rounds``, and checks that both return the same
+data.
+
+    python benchmarks/repository_cpu.py
+    python benchmarks/repository_cpu.py --iterations 5000 --json results/repository_cpu.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed(db):
+    from app import synthetic
+    from app.models import FAQ, Banner, Page
+
+    synthetic.generate(packages=500, events=40, testimonials=200, seed=1)
+    for i in range(6):
+        db.session.add(Banner(title=f'Banner {i}', image=f'/static/b{i}.jpg', link='/packages', position='home',
+                              is_active=i != 5, order=i))
+    for i in range(30):
+        db.session.add(FAQ(question=f'Question {i}?', answer='<p>Answer</p>' * 5, is_active=i % 10 != 0, order=i % 7))
+    for slug in ('about', 'contact', 'term-and-conditions', 'privacy-policy'):
+        db.session.add(Page(slug=slug, title=slug.title(), content='<p>Body</p>' * 50, meta_title=slug))
+    db.session.commit()
+
+
+def workloads():
+    from app import repository
+    from app.models import FAQ, Banner, Event, Package, Page, Testimonial
+
+    def home_before():
+        return (list(Package.query.limit(3)), list(Event.query),
+                list(Banner.query.filter_by(position='home', is_active=True).order_by(Banner.order)),
+                list(Testimonial.query.filter_by(is_active=True).order_by(Testimonial.created_at.desc()).limit(3)))
+
+    def home_after():
+        return (repository.home_cards(), repository.events(), repository.active_banners('home'),
+                repository.top_testimonials())
+
+    return {
+        'home': (home_before, home_after, {
+            0: ('id', 'title', 'price'), 1: ('id', 'title', 'date'), 2: ('id', 'title'), 3: ('id', 'name')}),
+        'page_by_slug': (lambda: Page.query.filter_by(slug='about', is_active=True).first(),
+                         lambda: repository.page_by_slug('about'), ('id', 'title', 'content')),
+        'faq': (lambda: list(FAQ.query.filter_by(is_active=True).order_by(FAQ.order, FAQ.created_at)),
+                repository.active_faqs, ('id', 'question')),
+    }
+
+
+def _project(result, fields):
+    if isinstance(fields, dict):
+        return [_project(part, fields[i]) for i, part in enumerate(result)]
+    if isinstance(result, list):
+        return [_project(item, fields) for item in result]
+    return tuple(getattr(result, name) for name in fields)
+
+
+def cpu_per_call(db, fn, iterations, rounds):
+    best = None
+    for _ in range(rounds):
+        started = time.process_time()
+        for _ in range(iterations):
+            fn()
+            db.session.remove()
+        elapsed = (time.process_time() - started) / iterations
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000, help='requests per round')
+    parser.add_argument('--rounds', type=int, default=5, help='rounds per workload; the best is reported')
+    parser.add_argument('--json', dest='json_path', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        from app import create_app, db
+        app = create_app()
+        results = {}
+        with app.app_context():
+            db.create_all()
+            seed(db)
+            for name, (before, after, fields) in workloads().items():
+                if _project(before(), fields) != _project(after(), fields):
+                    raise SystemExit(f'{name}: repository rows differ from the ORM query')
+                db.session.remove()
+                for fn in (before, after):  # warm the compiled cache
+                    fn()
+                    db.session.remove()
+                results[name] = {
+                    'before_us': cpu_per_call(db, before, args.iterations, args.rounds) * 1e6,
+                    'after_us': cpu_per_call(db, after, args.iterations, args.rounds) * 1e6,
+                }
+
+    print(f"{'workload':<16}{'before':>12}{'after':>12}{'speedup':>10}")
+    for name, row in results.items():
+        print(f"{name:<16}{row['before_us']:>10.1f}us{row['after_us']:>10.1f}us"
+              f"{row['before_us'] / row['after_us']:>9.1f}x")
+
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,427 @@
+"""
+Benchmark suite: seeded volumes, hot-function micro-benchmarks and HTTP load.
+
+Seeds a SQLite file (default) or the database at ``--database-url`` with
+``--scale`` volumes of packages, queries and responses (``app.synthetic``),
+then runs
+
+- micro-benchmarks of hot code paths: inbox search and filters, the public
+  package search view, SLA badges for a page of tickets, the package Excel
+  export and HTML sanitization of a package form;
+- an HTTP load harness against ``create_app()`` (through the test client, or
+  a running server with ``--url``) for ``/``, ``/packages``,
+  ``/package/<id>``, ``/admin/queries`` and ``/admin/``.
+
+Every result has p50/p95/p99 latency and throughput.  With a baseline at
+``--baseline`` each row is compared against it and the run exits with
+status 1 when a p95 grew, or a throughput dropped, by more than
+``--tolerance``.  Baselines are machine-specific: store one with
+``--save-baseline`` on the machine that compares against it.
+
+    python benchmarks/suite.py --scale small --save-baseline
+    python benchmarks/suite.py --scale small
+    python benchmarks/suite.py --scale medium --database-url postgresql://localhost/pilgrim_bench
+    python benchmarks/suite.py --only http --url http://127.0.0.1:8000 --cookie "session=..."
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCALES = {
+    'tiny': {'packages': 200, 'queries': 2_000, 'responses': 5_000},
+    'small': {'packages': 1_000, 'queries': 20_000, 'responses': 50_000},
+    'medium': {'packages': 10_000, 'queries': 100_000, 'responses': 500_000},
+    'large': {'packages': 100_000, 'queries': 1_000_000, 'responses': 5_000_000},
+}
+HTML_BODY = (
+    '<h3>Day {day}</h3><p>Early <strong>darshan</strong> at the temple, then a <em>guided walk</em> '
+    'through the old town. <a href="https://example.com/day{day}" title="Map">Route map</a></p>'
+    '<ul><li>Breakfast at the hotel</li><li>Evening aarti <span class="badge">included</span></li></ul>'
+    '<table class="table"><tr><th>Stay</th><td class="x">Deluxe room</td></tr></table>'
+    '<script>alert("x")</script><div class="note" onclick="steal()">Carry warm clothes.</div>'
+)
+# The tag and attribute allow-lists of admin_routes.new_package/edit_package.
+SANITIZE_TAGS = ['p', 'br', 'strong', 'em', 'u', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'a',
+                 'blockquote', 'img', 'table', 'tr', 'td', 'th', 'tbody', 'thead', 'tfoot', 'span', 'div']
+SANITIZE_ATTRIBUTES = {'a': ['href', 'title'], 'img': ['src', 'alt', 'title'], 'table': ['class'], 'tr': ['class'],
+                       'td': ['class'], 'th': ['class'], 'span': ['class'], 'div': ['class']}
+PACKAGE_HTML_FIELDS = 10
+
+ROUTES = ['/', '/packages', '/package/<id>', '/admin/queries', '/admin/']
+PACKAGES_VARIANTS = ['/packages', '/packages?search=temple', '/packages?destination=Uttarakhand&sort=price',
+                     '/packages?price=10000_25000&duration=4-7', '/packages?page=3&sort=rating']
+INBOX_VARIANTS = ['/admin/queries', '/admin/queries?status=Open', '/admin/queries?search=pilgrim%2012',
+                  '/admin/queries?sla=overdue&priority=Urgent', '/admin/queries?page=5']
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(timings, elapsed, errors=0):
+    return {
+        'n': len(timings),
+        'errors': errors,
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'per_sec': len(timings) / elapsed if elapsed else 0.0,
+    }
+
+
+# Seeding
+
+def seed(volumes, seed_value):
+    """Fill an empty database with ``volumes`` of data; return the admin user id."""
+    from app import db
+    from app.models import FAQ, Banner, Page, User
+    from app.synthetic import generate
+
+    users = [User(username=name) for name in ['bench-admin'] + [f'staff-{n}' for n in range(8)]]
+    for user in users:
+        user.set_password('bench')
+    db.session.add_all(users)
+    db.session.add_all(Banner(title=f'Banner {n}', image='images/banner.jpg', position='home', order=n)
+                       for n in range(4))
+    db.session.add_all(FAQ(question=f'Question {n}?', answer='Answer.', order=n) for n in range(25))
+    db.session.add_all(Page(slug=slug, title=slug.title(), content='<p>Content</p>')
+                       for slug in ('about', 'contact', 'privacy-policy'))
+    db.session.commit()
+
+    def progress(label, rows, seconds):
+        print(f'\r  {label}: {rows} rows in {seconds:.1f} s', end='', flush=True)
+
+    written = generate(packages=volumes['packages'], events=12, testimonials=30, queries=volumes['queries'],
+                       responses_per_query=volumes['responses'] / max(volumes['queries'], 1), seed=seed_value,
+                       progress=progress)
+    print('\r  ' + ', '.join(f'{rows} {table}' for table, rows in written.items()))
+    return users[0].id
+
+
+def prepare(app, volumes, seed_value, reseed):
+    """Seed unless the database already holds these volumes; return (admin id, package ids)."""
+    from sqlalchemy import func, select
+
+    from app import db
+    from app.models import Package, Query, User
+
+    with app.app_context():
+        if reseed:
+            db.drop_all()
+        db.create_all()
+        counts = (db.session.execute(select(func.count(Package.id))).scalar(),
+                  db.session.execute(select(func.count(Query.id))).scalar())
+        if counts == (volumes['packages'], volumes['queries']):
+            print(f'Reusing seeded database ({counts[0]} packages, {counts[1]} queries)')
+            admin_id = db.session.execute(select(User.id).where(User.username == 'bench-admin')).scalar()
+        elif any(counts):
+            raise SystemExit(f'The database holds {counts[0]} packages and {counts[1]} queries, not the requested '
+                             f'volumes; pass --reseed to drop and re-seed it.')
+        else:
+            print(f"Seeding {volumes['packages']} packages, {volumes['queries']} queries, "
+                  f"{volumes['responses']} responses")
+            admin_id = seed(volumes, seed_value)
+        package_ids = db.session.execute(select(Package.id)).scalars().all()
+    return admin_id, package_ids
+
+
+# Micro-benchmarks
+
+def measure(function, iterations, warmup=2):
+    for _ in range(warmup):
+        function()
+    timings = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return summarize(timings, time.perf_counter() - started)
+
+
+def micro_benchmarks(app, scale):
+    import bleach
+    from flask import request
+    from sqlalchemy import func, select
+
+    from app import db
+    from app.admin_routes import _inbox_filters, export_packages
+    from app.models import Query
+    from app.routes import packages
+
+    runs = max(1, scale)
+    results = {}
+
+    def inbox(query_string):
+        def run():
+            with app.test_request_context(f'/admin/queries?{query_string}'):
+                conditions = _inbox_filters(request.args, datetime.utcnow())
+                db.session.execute(select(func.count(Query.id)).where(*conditions)).scalar()
+                db.session.execute(select(Query).where(*conditions)
+                                   .order_by(Query.priority.desc(), Query.created_at.desc()).limit(15)).all()
+                db.session.rollback()
+        return run
+
+    def package_search():
+        with app.test_request_context('/packages?search=temple&destination=Uttarakhand&sort=price&page=2'):
+            # The undecorated view: filters, pagination and render without the response cache.
+            packages.__wrapped__()
+            db.session.rollback()
+
+    with app.app_context():
+        tickets = db.session.execute(
+            select(Query).order_by(Query.created_at.desc()).limit(500)
+        ).scalars().all()
+
+    def sla_badges():
+        for ticket in tickets:
+            ticket.sla_badge_context()
+            ticket.is_overdue()
+
+    def export():
+        with app.test_request_context('/admin/export/packages'):
+            export_packages.__wrapped__()
+            db.session.rollback()
+
+    body = ''.join(HTML_BODY.format(day=day) for day in range(1, 9))
+
+    def sanitize():
+        for _ in range(PACKAGE_HTML_FIELDS):
+            bleach.clean(body, tags=SANITIZE_TAGS, attributes=SANITIZE_ATTRIBUTES)
+
+    cases = [
+        ('inbox_search', inbox('search=pilgrim%2012'), 30),
+        ('inbox_filters', inbox('status=Open&priority=Urgent&sla=overdue&from_date=2020-01-01'), 30),
+        ('package_search_view', package_search, 30),
+        (f'sla_badges_x{len(tickets)}', sla_badges, 50),
+        ('export_packages_xlsx', export, 3),
+        (f'sanitize_package_x{PACKAGE_HTML_FIELDS}', sanitize, 50),
+    ]
+    for name, function, iterations in cases:
+        with app.app_context():
+            results[name] = result = measure(function, iterations * runs)
+        print(f"  {name:<28} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+              f"p99 {result['p99_ms']:8.2f} ms  {result['per_sec']:8.1f}/s")
+    return results
+
+
+# HTTP load
+
+def _path_for(route, rng, package_ids):
+    if route == '/packages':
+        return rng.choice(PACKAGES_VARIANTS)
+    if route == '/package/<id>':
+        return f'/package/{rng.choice(package_ids)}'
+    if route == '/admin/queries':
+        return rng.choice(INBOX_VARIANTS)
+    return route
+
+
+def _test_client_fetcher(app, admin_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+
+    def fetch(path):
+        response = client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+        response.close()
+        return response.status_code
+
+    return fetch
+
+
+def _url_fetcher(base_url, cookie):
+    parts = urlsplit(base_url)
+    factory = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    connection = factory(parts.netloc, timeout=30)
+    headers = {'Accept-Encoding': 'gzip, br'}
+    if cookie:
+        headers['Cookie'] = cookie
+
+    def fetch(path):
+        nonlocal connection
+        try:
+            connection.request('GET', parts.path.rstrip('/') + path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = factory(parts.netloc, timeout=30)
+            raise
+
+    return fetch
+
+
+def load_route(route, make_fetcher, requests, concurrency, package_ids, seed_value):
+    counter = itertools.count()
+    timings, errors = [], []
+    lock = threading.Lock()
+
+    def worker(number):
+        fetch = make_fetcher()
+        rng = random.Random(seed_value + number)
+        for _ in range(3):
+            fetch(_path_for(route, rng, package_ids))  # warm connection and caches
+        while next(counter) < requests:
+            path = _path_for(route, rng, package_ids)
+            t0 = time.perf_counter()
+            try:
+                status = fetch(path)
+            except Exception as exc:
+                status = repr(exc)
+            elapsed = (time.perf_counter() - t0) * 1000
+            with lock:
+                timings.append(elapsed)
+                if status != 200:
+                    errors.append((path, status))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = summarize(timings, time.perf_counter() - started, len(errors))
+    if errors:
+        result['first_error'] = list(errors[0])
+    return result
+
+
+def http_benchmarks(app, admin_id, package_ids, args):
+    results = {}
+    for route in ROUTES:
+        if args.url:
+            if route.startswith('/admin') and not args.cookie:
+                print(f'  {route:<28} skipped (pass --cookie with a staff session for admin routes)')
+                continue
+            make_fetcher = lambda: _url_fetcher(args.url, args.cookie)  # noqa: E731
+        else:
+            make_fetcher = lambda: _test_client_fetcher(app, admin_id)  # noqa: E731
+        results[route] = result = load_route(route, make_fetcher, args.requests, args.concurrency,
+                                             package_ids, args.seed)
+        print(f"  {route:<28} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+              f"p99 {result['p99_ms']:8.2f} ms  {result['per_sec']:8.1f} req/s"
+              + (f"  {result['errors']} errors, e.g. {result['first_error']}" if result['errors'] else ''))
+    return results
+
+
+# Baseline comparison
+
+def compare(results, baseline, tolerance):
+    """Print each row against the baseline; return the regressed rows."""
+    regressions = []
+    if baseline['meta'].get('volumes') != results['meta']['volumes'] or \
+            baseline['meta'].get('dialect') != results['meta']['dialect']:
+        print('Baseline was recorded with different volumes or database; comparison skipped.')
+        return regressions
+    print(f"\nAgainst baseline from {baseline['meta']['recorded_at']} (tolerance {tolerance:.0%}):")
+    for section in ('micro', 'http'):
+        for name, current in results.get(section, {}).items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous:
+                continue
+            p95_change = current['p95_ms'] / previous['p95_ms'] - 1 if previous['p95_ms'] else 0.0
+            rate_change = current['per_sec'] / previous['per_sec'] - 1 if previous['per_sec'] else 0.0
+            regressed = p95_change > tolerance or rate_change < -tolerance
+            if regressed:
+                regressions.append(f'{section}:{name}')
+            print(f"  {'REGRESSED' if regressed else 'ok':<9} {section}:{name:<28} p95 {p95_change:+7.1%}  "
+                  f"throughput {rate_change:+7.1%}")
+    return regressions
+
+
+def make_app(args):
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.gettempdir(), f'pilgrim-bench-{args.scale}.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('INGEST_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'pilgrim-bench-ingest.sqlite3'))
+    if args.no_cache:
+        import config
+        config.Config.CACHE_TYPE = 'NullCache'
+        config.Config.COMPRESS_CACHE_RESPONSES = False
+
+    from app import create_app
+    app = create_app(lazy_admin=False)
+    app.config.update(WTF_CSRF_ENABLED=False, INGEST_FLUSH_IN_PROCESS=False)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--packages', type=int, help='override the scale volume')
+    parser.add_argument('--queries', type=int, help='override the scale volume')
+    parser.add_argument('--responses', type=int, help='override the scale volume')
+    parser.add_argument('--database-url', help='default: a SQLite file per scale in the temp directory')
+    parser.add_argument('--reseed', action='store_true', help='drop all tables and seed again')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for data and request mix')
+    parser.add_argument('--only', choices=['micro', 'http'], help='run one part of the suite')
+    parser.add_argument('--iterations', type=int, default=1, help='multiplier for micro-benchmark iterations')
+    parser.add_argument('--requests', type=int, default=300, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads per route')
+    parser.add_argument('--url', help='load a running server instead of the in-process app')
+    parser.add_argument('--cookie', help='Cookie header for admin routes with --url')
+    parser.add_argument('--no-cache', action='store_true', help='disable response and fragment caching')
+    parser.add_argument('--baseline', default=os.path.join(ROOT, 'benchmarks', 'results', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95/throughput change')
+    parser.add_argument('--json', dest='json_path', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    volumes = dict(SCALES[args.scale])
+    for name in volumes:
+        if getattr(args, name) is not None:
+            volumes[name] = getattr(args, name)
+
+    app = make_app(args)
+    admin_id, package_ids = prepare(app, volumes, args.seed, args.reseed)
+    with app.app_context():
+        from app import db
+        dialect = db.engine.dialect.name
+    results = {'meta': {
+        'volumes': volumes, 'dialect': dialect, 'cache': not args.no_cache, 'target': args.url or 'test-client',
+        'concurrency': args.concurrency, 'python': platform.python_version(),
+        'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+    }}
+    if args.only in (None, 'micro'):
+        print('Micro-benchmarks')
+        results['micro'] = micro_benchmarks(app, args.iterations)
+    if args.only in (None, 'http'):
+        print(f'HTTP load ({args.requests} requests per route, {args.concurrency} clients)')
+        results['http'] = http_benchmarks(app, admin_id, package_ids, args)
+
+    for path in filter(None, [args.json_path, args.baseline if args.save_baseline else None]):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f'Wrote {path}')
+
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Cold vs. warm first-request latency of the public routes.
+
+Each route is requested in a fresh interpreter (a cold worker), once
+without the Jinja bytecode cache and once against a cache filled by
+``precompile_templates``; the first request is the cold latency and the
+median of the following requests is the warm latency.  Response caching is
+disabled so every request renders its templates.
+
+    python benchmarks/template_cold_start.py
+    python benchmarks/template_cold_start.py --warm 20 --json results/template_cold_start.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = ['/', '/packages', '/about', '/contact', '/faq', '/offline',
+          '/terms-and-conditions', '/privacy-policy']
+
+PROBE = r"""
+import json, statistics, sys, time
+import config
+config.Config.CACHE_TYPE = 'NullCache'
+config.Config.COMPRESS_CACHE_RESPONSES = False
+from app import create_app, db
+app = create_app()
+with app.app_context():
+    db.create_all()
+    if sys.argv[1] == 'precompile':
+        from app.template_cache import precompile_templates
+        precompile_templates(app, clear=True)
+        print('@@RESULT@@' + json.dumps({}))
+        raise SystemExit
+client = app.test_client()
+timings = []
+for _ in range(1 + int(sys.argv[3])):
+    start = time.perf_counter()
+    response = client.get(sys.argv[2])
+    timings.append((time.perf_counter() - start) * 1000)
+print('@@RESULT@@' + json.dumps({'cold_ms': timings[0], 'warm_ms': statistics.median(timings[1:]),
+                                 'status': response.status_code}))
+"""
+
+
+def run_probe(env, *args):
+    proc = subprocess.run(
+        [sys.executable, '-c', PROBE, *args],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith('@@RESULT@@'):
+            return json.loads(line[len('@@RESULT@@'):])
+    raise RuntimeError(f'probe {args} failed:\n{proc.stderr[-2000:]}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--warm', type=int, default=10, help='warm requests per route')
+    parser.add_argument('--json', dest='json_path', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        env['JINJA_BYTECODE_CACHE_DIR'] = os.path.join(tmp, 'jinja')
+        modes = {
+            'no-cache': dict(env, JINJA_BYTECODE_CACHE='false'),
+            'precompiled': dict(env, JINJA_BYTECODE_CACHE='true'),
+        }
+        run_probe(modes['precompiled'], 'precompile')
+
+        results = {mode: {} for mode in modes}
+        for route in ROUTES:
+            for mode, mode_env in modes.items():
+                results[mode][route] = run_probe(mode_env, 'request', route, str(args.warm))
+
+    print(f"{'route':<24}{'cold':>10}{'cold+bcc':>10}{'saved':>9}{'warm':>9}{'warm+bcc':>10}{'status':>8}")
+    for route in ROUTES:
+        plain, cached = results['no-cache'][route], results['precompiled'][route]
+        print(f"{route:<24}{plain['cold_ms']:>8.1f}ms{cached['cold_ms']:>8.1f}ms"
+              f"{plain['cold_ms'] - cached['cold_ms']:>7.1f}ms"
+              f"{plain['warm_ms']:>7.1f}ms{cached['warm_ms']:>8.1f}ms{cached['status']:>8}")
+
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -7,3 +8,148 @@ class Config:
     CACHE_TYPE = 'simple'
     DEBUG = os.environ.get('DEBUG', 'False').lower() in ('true', '1', 'yes')
     TESTING = os.environ.get('TESTING', 'False').lower() in ('true', '1', 'yes')
+
+    # CSS purge / critical CSS build (``flask build-css``)
+    CSS_PURGE_BOOTSTRAP = 'css/vendor/bootstrap.min.css'
+    CSS_PURGE_SOURCES = ['css/style.css']
+    CSS_PURGE_SCRIPTS = ['script.js']
+    CSS_PURGE_SAFELIST = [s for s in os.environ.get('CSS_PURGE_SAFELIST', '').split(',') if s]
+    CSS_PURGE_OUTPUT_DIR = 'gen/css'
+    CSS_PURGE_MANIFEST = 'gen/css/manifest.json'
+    CSS_CRITICAL_FOLD_CHARS = int(os.environ.get('CSS_CRITICAL_FOLD_CHARS', 6000))
+    CSS_CRITICAL_INLINE = os.environ.get('CSS_CRITICAL_INLINE', 'True').lower() in ('true', '1', 'yes')
+
+    # Compression: per-request levels for uncached responses (Flask-Compress),
+    # and higher one-off levels for variants stored with cached responses.
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_LEVEL = int(os.environ.get('COMPRESS_BR_LEVEL', 4))
+    COMPRESS_CACHE_RESPONSES = os.environ.get('COMPRESS_CACHE_RESPONSES', 'True').lower() in ('true', '1', 'yes')
+    COMPRESS_CACHED_LEVEL = int(os.environ.get('COMPRESS_CACHED_LEVEL', 9))
+    COMPRESS_CACHED_BR_LEVEL = int(os.environ.get('COMPRESS_CACHED_BR_LEVEL', 11))
+    COMPRESS_CACHED_DEFLATE_LEVEL = int(os.environ.get('COMPRESS_CACHED_DEFLATE_LEVEL', 9))
+
+    # Hashed assets and generated service worker (``flask build-sw``)
+    ASSET_OUTPUT_DIR = 'gen/assets'
+    ASSET_MANIFEST = 'gen/asset-manifest.json'
+    SW_OUTPUT = 'gen/service-worker.js'
+    SW_HASHED_ASSETS = ['css/style.css', 'js/script.js', 'img/logo.png']
+    SW_PRECACHE_PAGES = ['/offline']
+    SW_STALE_WHILE_REVALIDATE_ROUTES = [r'^/packages/?$', r'^/package/\d+/?$']
+    SW_NETWORK_FIRST_ROUTES = [r'^/$', r'^/contact/?$']
+    SW_BYPASS_ROUTES = [r'^/admin', r'^/login', r'^/logout', r'^/service-worker\.js$']
+    SW_RUNTIME_MAX_ENTRIES = {'pilgrim-pages': 50, 'pilgrim-assets': 60, 'pilgrim-static': 100}
+
+    # Fast cold start: build the admin app on the first /admin, /login or /logout request
+    LAZY_ADMIN_BLUEPRINT = os.environ.get('LAZY_ADMIN_BLUEPRINT', 'False').lower() in ('true', '1', 'yes')
+    LAZY_ADMIN_PREFIXES = ['/admin', '/login', '/logout']
+
+    # Jinja bytecode cache, filled at deploy time by ``flask precompile-templates``;
+    # relative paths resolve against the ``app`` package
+    JINJA_BYTECODE_CACHE = os.environ.get('JINJA_BYTECODE_CACHE', 'True').lower() in ('true', '1', 'yes')
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR', '.jinja-cache')
+
+    # Template fragment cache (``{% cache key, timeout, tags %}``)
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    FRAGMENT_CACHE_DEFAULT_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_DEFAULT_TIMEOUT', 3600))
+
+    # Write-behind ingestion of public form submissions (``app.ingest_queue``)
+    INGEST_QUEUE_ENABLED = os.environ.get('INGEST_QUEUE_ENABLED', 'False').lower() in ('true', '1', 'yes')
+    INGEST_QUEUE_PATH = os.environ.get('INGEST_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'pilgrim-ingest.sqlite3'))
+    INGEST_FLUSH_IN_PROCESS = os.environ.get('INGEST_FLUSH_IN_PROCESS', 'True').lower() in ('true', '1', 'yes')
+    INGEST_FLUSH_INTERVAL = float(os.environ.get('INGEST_FLUSH_INTERVAL', 0.5))
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 200))
+    INGEST_MAX_ATTEMPTS = int(os.environ.get('INGEST_MAX_ATTEMPTS', 8))
+    INGEST_RETRY_BACKOFF = float(os.environ.get('INGEST_RETRY_BACKOFF', 2.0))
+
+    # Bulk query ingestion API (``POST /api/queries/bulk``) and ``flask ingest-queries``
+    INGEST_API_TOKENS = [t for t in os.environ.get('INGEST_API_TOKENS', '').split(',') if t]
+    BULK_INGEST_MAX_ITEMS = int(os.environ.get('BULK_INGEST_MAX_ITEMS', 10000))
+
+    # Outbound email (``flask send-outbox``); with no MAIL_SERVER messages are only logged
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', '')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'False').lower() in ('true', '1', 'yes')
+    MAIL_USE_SSL = os.environ.get('MAIL_USE_SSL', 'False').lower() in ('true', '1', 'yes')
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'Pilgrim Packages <sales@pilgrimpackages.com>')
+    MAIL_TIMEOUT = float(os.environ.get('MAIL_TIMEOUT', 10))
+    OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', 2))
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 6))
+    OUTBOX_RETRY_BACKOFF = int(os.environ.get('OUTBOX_RETRY_BACKOFF', 30))
+    OUTBOX_MAX_BACKOFF = int(os.environ.get('OUTBOX_MAX_BACKOFF', 3600))
+    OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 300))
+    OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 5))
+
+    # SLA sweeper (``flask sweep-sla`` / ``POST /api/cron/sla-sweep`` with ``Authorization: Bearer $CRON_SECRET``)
+    SLA_DUE_SOON_MINUTES = int(os.environ.get('SLA_DUE_SOON_MINUTES', 120))
+    SLA_AUTO_ESCALATE = os.environ.get('SLA_AUTO_ESCALATE', 'True').lower() in ('true', '1', 'yes')
+    SLA_SWEEP_BATCH_SIZE = int(os.environ.get('SLA_SWEEP_BATCH_SIZE', 500))
+    SLA_SWEEP_INTERVAL = int(os.environ.get('SLA_SWEEP_INTERVAL', 60))
+    CRON_SECRET = os.environ.get('CRON_SECRET')
+
+    # Live inbox feed (SSE at /admin/queries/stream, long-poll at /admin/queries/changes)
+    LIVE_INBOX_BROKER = os.environ.get('LIVE_INBOX_BROKER', 'database')  # 'database' (multi-worker) or 'local'
+    LIVE_INBOX_POLL_INTERVAL = float(os.environ.get('LIVE_INBOX_POLL_INTERVAL', 1.0))
+    LIVE_INBOX_HEARTBEAT = float(os.environ.get('LIVE_INBOX_HEARTBEAT', 15))
+    LIVE_INBOX_STREAM_SECONDS = float(os.environ.get('LIVE_INBOX_STREAM_SECONDS', 25))
+    LIVE_INBOX_LONG_POLL_SECONDS = float(os.environ.get('LIVE_INBOX_LONG_POLL_SECONDS', 20))
+    LIVE_INBOX_RETRY_MS = int(os.environ.get('LIVE_INBOX_RETRY_MS', 2000))
+    LIVE_INBOX_RETENTION_HOURS = int(os.environ.get('LIVE_INBOX_RETENTION_HOURS', 72))
+    # Seconds a gap in event ids is waited on (a transaction still committing) before it is skipped
+    LIVE_INBOX_GAP_GRACE = float(os.environ.get('LIVE_INBOX_GAP_GRACE', 5))
+
+    # Query detail conversation thread (``app.conversation``)
+    THREAD_PAGE_SIZE = int(os.environ.get('THREAD_PAGE_SIZE', 20))
+    THREAD_PREVIEW_CHARS = int(os.environ.get('THREAD_PREVIEW_CHARS', 600))
+
+    # Archival of old closed tickets (``flask archive-queries`` / ``POST /api/cron/archive``)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 120))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    ARCHIVE_PAUSE = float(os.environ.get('ARCHIVE_PAUSE', 0.2))  # seconds between batches
+    ARCHIVE_CRON_MAX_BATCHES = int(os.environ.get('ARCHIVE_CRON_MAX_BATCHES', 10))
+
+    # Per-request SQL profiling (``Server-Timing`` header, /admin/sql-profile); off adds no hooks
+    SQL_PROFILER = os.environ.get('SQL_PROFILER', 'False').lower() in ('true', '1', 'yes')
+    SQL_PROFILER_SLOWEST = int(os.environ.get('SQL_PROFILER_SLOWEST', 5))
+    SQL_PROFILER_REPEAT_THRESHOLD = int(os.environ.get('SQL_PROFILER_REPEAT_THRESHOLD', 5))
+    SQL_PROFILER_WINDOW_SECONDS = int(os.environ.get('SQL_PROFILER_WINDOW_SECONDS', 900))
+
+    # Prometheus metrics at /metrics (``Authorization: Bearer $METRICS_TOKEN`` or a staff login)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() in ('true', '1', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # shared by gunicorn workers; unset = this process only
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+    # Request/job tracing; TRACING_EXPORTERS is a comma-separated mix of ``jsonl`` and ``otlp``
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'False').lower() in ('true', '1', 'yes')
+    TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0.05))  # share of new traces recorded
+    TRACING_EXPORTERS = os.environ.get('TRACING_EXPORTERS', 'jsonl')
+    TRACING_JSONL_PATH = os.environ.get('TRACING_JSONL_PATH', os.path.join(tempfile.gettempdir(), 'pilgrim-traces.jsonl'))
+    TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://localhost:4318')
+    TRACING_OTLP_HEADERS = os.environ.get('TRACING_OTLP_HEADERS', '')  # "key=value,key=value"
+    TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'pilgrim')
+    TRACING_EXPORT_INTERVAL = float(os.environ.get('TRACING_EXPORT_INTERVAL', 5))
+    TRACING_MAX_QUEUE = int(os.environ.get('TRACING_MAX_QUEUE', 20000))  # oldest spans dropped beyond this
+
+    # Synthetic capacity-test data (``flask generate-data``): rows per COPY/executemany chunk and commit
+    SYNTHETIC_CHUNK_SIZE = int(os.environ.get('SYNTHETIC_CHUNK_SIZE', 10000))
+
+    # Connection pooling (app/database.py): ``auto`` = serverless on Vercel/Lambda, server elsewhere
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'auto')
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 300))  # below the pooler/compute idle timeout
+    DB_SERVERLESS_POOL_SIZE = int(os.environ.get('DB_SERVERLESS_POOL_SIZE', 0))  # 0 = NullPool
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 15000))  # server profile; 0 = none
+    DB_CLI_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_CLI_STATEMENT_TIMEOUT_MS', 0))  # flask CLI commands; 0 = none
+    DB_APPLICATION_NAME = os.environ.get('DB_APPLICATION_NAME', 'pilgrim')
+    DB_WARMUP = os.environ.get('DB_WARMUP', 'True').lower() in ('true', '1', 'yes')
+
+    # Read replicas (app/replicas.py): comma-separated URLs for the reads of ``replica_reads`` views
+    DB_REPLICA_URLS = os.environ.get('DB_REPLICA_URLS', '')
+    DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))  # seconds; also how long writers read the primary
+    DB_REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', 10))
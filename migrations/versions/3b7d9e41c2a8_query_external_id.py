@@ -0,0 +1,26 @@
+"""Add external id to query for bulk ingestion dedupe
+
+Revision ID: 3b7d9e41c2a8
+Revises: 2a1c3e2b3f1d
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7d9e41c2a8'
+down_revision = '2a1c3e2b3f1d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('query', sa.Column('external_id', sa.String(length=100), nullable=True))
+    op.create_index('uq_query_source_external_id', 'query', ['source', 'external_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_query_source_external_id', table_name='query')
+    op.drop_column('query', 'external_id')
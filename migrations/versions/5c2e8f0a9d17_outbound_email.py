@@ -0,0 +1,50 @@
+"""Add outbound email outbox and response delivery status
+
+Revision ID: 5c2e8f0a9d17
+Revises: 3b7d9e41c2a8
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e8f0a9d17'
+down_revision = '3b7d9e41c2a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('query_response', sa.Column('delivery_status', sa.String(length=20), nullable=True))
+    op.add_column('query_response', sa.Column('delivered_at', sa.DateTime(), nullable=True))
+
+    op.create_table(
+        'outbound_email',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('query_response_id', sa.Integer(), nullable=True),
+        sa.Column('to_address', sa.String(length=100), nullable=False),
+        sa.Column('to_name', sa.String(length=100), nullable=True),
+        sa.Column('subject', sa.String(length=200), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('attachment_urls', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('message_id', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['query_response_id'], ['query_response.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbound_email_status_next_attempt_at', 'outbound_email', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_outbound_email_status_next_attempt_at', table_name='outbound_email')
+    op.drop_table('outbound_email')
+    op.drop_column('query_response', 'delivered_at')
+    op.drop_column('query_response', 'delivery_status')
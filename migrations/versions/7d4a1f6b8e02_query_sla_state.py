@@ -0,0 +1,44 @@
+"""Persist SLA state on query and index SLA columns
+
+Revision ID: 7d4a1f6b8e02
+Revises: 5c2e8f0a9d17
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4a1f6b8e02'
+down_revision = '5c2e8f0a9d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('query', sa.Column('sla_state', sa.String(length=20), nullable=True))
+    op.create_index('ix_query_sla_state', 'query', ['sla_state'])
+    op.create_index('ix_query_sla_deadline', 'query', ['sla_deadline'])
+
+    # Backfill open tickets; the sweeper keeps the column current from here on.
+    now = datetime.utcnow()
+    soon = now + timedelta(hours=2)
+    open_tickets = "status IS NULL OR status NOT IN ('Resolved', 'Closed')"
+    op.execute(sa.text(
+        f"UPDATE query SET sla_state = 'overdue' WHERE ({open_tickets}) AND sla_deadline < :now"
+    ).bindparams(now=now))
+    op.execute(sa.text(
+        f"UPDATE query SET sla_state = 'due_soon' WHERE ({open_tickets}) AND sla_deadline >= :now AND sla_deadline < :soon"
+    ).bindparams(now=now, soon=soon))
+    op.execute(sa.text(
+        f"UPDATE query SET sla_state = 'ok' WHERE ({open_tickets}) AND (sla_deadline IS NULL OR sla_deadline >= :soon)"
+    ).bindparams(soon=soon))
+
+
+def downgrade():
+    op.drop_index('ix_query_sla_deadline', table_name='query')
+    op.drop_index('ix_query_sla_state', table_name='query')
+    op.drop_column('query', 'sla_state')
@@ -0,0 +1,43 @@
+"""Add query change log for the live inbox feed
+
+Revision ID: 8e5b2c7f1a93
+Revises: 7d4a1f6b8e02
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e5b2c7f1a93'
+down_revision = '7d4a1f6b8e02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'change_counter',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO change_counter (name, value) VALUES ('query_event', 0)")
+
+    op.create_table(
+        'query_event',
+        sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('query_id', sa.Integer(), nullable=True),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_query_event_created_at', 'query_event', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_query_event_created_at', table_name='query_event')
+    op.drop_table('query_event')
+    op.drop_table('change_counter')
@@ -0,0 +1,42 @@
+"""Add query audit log for inbox bulk actions
+
+Revision ID: 9a3c6d2e4b15
+Revises: 8e5b2c7f1a93
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3c6d2e4b15'
+down_revision = '8e5b2c7f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'query_audit',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('query_id', sa.Integer(), nullable=False),
+        sa.Column('staff_id', sa.Integer(), nullable=True),
+        sa.Column('action', sa.String(length=30), nullable=False),
+        sa.Column('field', sa.String(length=50), nullable=False),
+        sa.Column('old_value', sa.String(length=255), nullable=True),
+        sa.Column('new_value', sa.String(length=255), nullable=True),
+        sa.Column('batch_id', sa.String(length=32), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['query_id'], ['query.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['staff_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_query_audit_query_id', 'query_audit', ['query_id'])
+    op.create_index('ix_query_audit_batch_id', 'query_audit', ['batch_id'])
+
+
+def downgrade():
+    op.drop_index('ix_query_audit_batch_id', table_name='query_audit')
+    op.drop_index('ix_query_audit_query_id', table_name='query_audit')
+    op.drop_table('query_audit')
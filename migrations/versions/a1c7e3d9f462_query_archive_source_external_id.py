@@ -0,0 +1,23 @@
+"""Index archived tickets by source item for bulk ingestion dedupe
+
+Revision ID: a1c7e3d9f462
+Revises: f9d2a6b7c851
+Create Date: 2026-10-21 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c7e3d9f462'
+down_revision = 'f9d2a6b7c851'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_query_archive_source_external_id', 'query_archive', ['source', 'external_id'])
+
+
+def downgrade():
+    op.drop_index('ix_query_archive_source_external_id', table_name='query_archive')
@@ -0,0 +1,23 @@
+"""Index query responses for paged conversation threads
+
+Revision ID: a4e7b9c1d203
+Revises: 9a3c6d2e4b15
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e7b9c1d203'
+down_revision = '9a3c6d2e4b15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_query_response_thread', 'query_response', ['query_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_query_response_thread', table_name='query_response')
@@ -0,0 +1,133 @@
+"""Add customer profiles and link queries to them
+
+Revision ID: b5f8c2d3e416
+Revises: a4e7b9c1d203
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5f8c2d3e416'
+down_revision = 'a4e7b9c1d203'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _normalize_phone(phone):
+    # Same rule as app.customers.normalize_phone, frozen for this migration.
+    if not phone:
+        return None
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return None
+    if phone.strip().startswith('+'):
+        return '+' + digits
+    if digits.startswith('00'):
+        return '+' + digits[2:]
+    return digits
+
+
+def upgrade():
+    customer = op.create_table(
+        'customer',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email_normalized', sa.String(length=100), nullable=False),
+        sa.Column('phone_normalized', sa.String(length=20), nullable=True),
+        sa.Column('name', sa.String(length=100), nullable=True),
+        sa.Column('email', sa.String(length=100), nullable=True),
+        sa.Column('phone', sa.String(length=20), nullable=True),
+        sa.Column('ticket_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('open_ticket_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('first_contact_at', sa.DateTime(), nullable=True),
+        sa.Column('last_contact_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email_normalized')
+    )
+    op.create_index('ix_customer_phone_normalized', 'customer', ['phone_normalized'])
+    with op.batch_alter_table('query') as batch_op:
+        batch_op.add_column(sa.Column('customer_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_query_customer_id', 'customer', ['customer_id'], ['id'])
+        batch_op.create_index('ix_query_customer_created', ['customer_id', 'created_at'])
+
+    # Backfill with set-based statements: one customer per normalized email,
+    # name and email from its most recent ticket, phone from the most recent
+    # ticket that has one.
+    conn = op.get_bind()
+    query = sa.table(
+        'query',
+        sa.column('id', sa.Integer), sa.column('customer_email', sa.String), sa.column('customer_name', sa.String),
+        sa.column('customer_phone', sa.String), sa.column('customer_id', sa.Integer),
+        sa.column('status', sa.String), sa.column('created_at', sa.DateTime),
+    )
+    email_key = sa.func.lower(sa.func.trim(query.c.customer_email))
+
+    def latest(*columns, where=sa.true()):
+        # ``position`` 1 is the most recent matching ticket per email.
+        position = sa.func.row_number().over(
+            partition_by=email_key, order_by=(query.c.created_at.desc(), query.c.id.desc()))
+        return sa.select(email_key.label('email_normalized'), *columns, position.label('position')) \
+            .where(query.c.customer_email != None, email_key != '', where).subquery()  # noqa: E711
+
+    newest = latest(sa.func.trim(query.c.customer_email).label('email'), query.c.customer_name.label('name'))
+    conn.execute(customer.insert().from_select(
+        ['email_normalized', 'email', 'name', 'ticket_count', 'open_ticket_count'],
+        sa.select(newest.c.email_normalized, newest.c.email, newest.c.name, sa.literal(0), sa.literal(0))
+        .where(newest.c.position == 1),
+    ))
+    phones = latest(query.c.customer_phone.label('phone'),
+                    where=sa.and_(query.c.customer_phone != None, query.c.customer_phone != ''))  # noqa: E711
+    conn.execute(sa.update(customer).where(
+        customer.c.email_normalized == phones.c.email_normalized, phones.c.position == 1,
+    ).values(phone=phones.c.phone))
+    if conn.dialect.name == 'postgresql':
+        # Same rule as app.customers.normalize_phone, frozen for this migration.
+        digits = sa.func.regexp_replace(customer.c.phone, r'\D', '', 'g')
+        conn.execute(sa.update(customer).where(customer.c.phone != None).values(  # noqa: E711
+            phone_normalized=sa.case(
+                (digits == '', None),
+                (sa.func.ltrim(customer.c.phone).startswith('+'), sa.literal('+') + digits),
+                (digits.startswith('00'), sa.literal('+') + sa.func.substr(digits, 3)),
+                else_=digits,
+            )))
+    else:
+        # No regexp_replace (SQLite): normalize per customer, not per ticket.
+        phones = conn.execute(sa.select(customer.c.id, customer.c.phone).where(customer.c.phone != None)).all()  # noqa: E711
+        normalize = sa.update(customer).where(customer.c.id == sa.bindparam('cid')) \
+            .values(phone_normalized=sa.bindparam('normalized'))
+        for start in range(0, len(phones), BATCH_SIZE):
+            conn.execute(normalize, [{'cid': cid, 'normalized': _normalize_phone(phone)}
+                                     for cid, phone in phones[start:start + BATCH_SIZE]])
+
+    conn.execute(sa.update(query).where(customer.c.email_normalized == email_key).values(customer_id=customer.c.id))
+
+    stats = sa.select(
+        query.c.customer_id,
+        sa.func.count().label('tickets'),
+        sa.func.count(sa.case((sa.or_(query.c.status == None,  # noqa: E711
+                                      query.c.status.notin_(('Resolved', 'Closed'))), 1))).label('open_tickets'),
+        sa.func.min(query.c.created_at).label('first_contact_at'),
+        sa.func.max(query.c.created_at).label('last_contact_at'),
+    ).where(query.c.customer_id != None).group_by(query.c.customer_id).subquery()  # noqa: E711
+    conn.execute(sa.update(customer).where(customer.c.id == stats.c.customer_id).values(
+        ticket_count=stats.c.tickets,
+        open_ticket_count=stats.c.open_tickets,
+        first_contact_at=stats.c.first_contact_at,
+        last_contact_at=stats.c.last_contact_at,
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('query') as batch_op:
+        batch_op.drop_index('ix_query_customer_created')
+        batch_op.drop_constraint('fk_query_customer_id', type_='foreignkey')
+        batch_op.drop_column('customer_id')
+    op.drop_index('ix_customer_phone_normalized', table_name='customer')
+    op.drop_table('customer')
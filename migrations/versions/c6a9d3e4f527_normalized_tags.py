@@ -0,0 +1,85 @@
+"""Move query tags into tag and query_tag tables
+
+Revision ID: c6a9d3e4f527
+Revises: b5f8c2d3e416
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6a9d3e4f527'
+down_revision = 'b5f8c2d3e416'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _normalize(name):
+    # Same rule as app.tags.normalize_tag, frozen for this migration.
+    name = ' '.join((name or '').split()).lower()[:50]
+    return name or None
+
+
+def upgrade():
+    tag = op.create_table(
+        'tag',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    query_tag = op.create_table(
+        'query_tag',
+        sa.Column('query_id', sa.Integer(), nullable=False),
+        sa.Column('tag_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['query_id'], ['query.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('query_id', 'tag_id')
+    )
+    op.create_index('ix_query_tag_tag_query', 'query_tag', ['tag_id', 'query_id'])
+
+    conn = op.get_bind()
+    query = sa.table('query', sa.column('id', sa.Integer), sa.column('tags', sa.String))
+    links = []
+    for query_id, tags in conn.execute(sa.select(query.c.id, query.c.tags).where(query.c.tags != None)):  # noqa: E711
+        for name in {_normalize(item) for item in tags.split(',')} - {None}:
+            links.append((query_id, name))
+    names = sorted({name for _, name in links})
+    for start in range(0, len(names), BATCH_SIZE):
+        op.bulk_insert(tag, [{'name': name} for name in names[start:start + BATCH_SIZE]])
+    ids = dict(conn.execute(sa.select(tag.c.name, tag.c.id)).all())
+    for start in range(0, len(links), BATCH_SIZE):
+        op.bulk_insert(query_tag, [
+            {'query_id': query_id, 'tag_id': ids[name]} for query_id, name in links[start:start + BATCH_SIZE]
+        ])
+
+    with op.batch_alter_table('query') as batch_op:
+        batch_op.drop_column('tags')
+
+
+def downgrade():
+    with op.batch_alter_table('query') as batch_op:
+        batch_op.add_column(sa.Column('tags', sa.String(length=255), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        'SELECT query_tag.query_id, tag.name FROM query_tag JOIN tag ON tag.id = query_tag.tag_id '
+        'ORDER BY query_tag.query_id, tag.name'
+    ))
+    tags = {}
+    for query_id, name in rows:
+        tags.setdefault(query_id, []).append(name)
+    query = sa.table('query', sa.column('id', sa.Integer), sa.column('tags', sa.String))
+    update = sa.update(query).where(query.c.id == sa.bindparam('query_id')).values(tags=sa.bindparam('value'))
+    items = [{'query_id': query_id, 'value': ','.join(names)[:255]} for query_id, names in tags.items()]
+    for start in range(0, len(items), BATCH_SIZE):
+        conn.execute(update, items[start:start + BATCH_SIZE])
+
+    op.drop_index('ix_query_tag_tag_query', table_name='query_tag')
+    op.drop_table('query_tag')
+    op.drop_table('tag')
@@ -0,0 +1,154 @@
+"""Add archive tables for old closed tickets
+
+Revision ID: d7b0e4f5a638
+Revises: c6a9d3e4f527
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b0e4f5a638'
+down_revision = 'c6a9d3e4f527'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# Columns shared by the live and archive tables.
+_QUERY_COLUMNS = (
+    'id', 'customer_name', 'customer_email', 'customer_phone', 'query_type', 'status', 'assigned_staff_id',
+    'priority', 'message', 'created_at', 'updated_at', 'sla_deadline', 'sla_state', 'response_due_at',
+    'first_response_at', 'resolved_at', 'escalated_at', 'escalation_reason', 'last_contact_channel',
+    'last_response_summary', 'ticket_number', 'source', 'external_id', 'customer_id',
+)
+_RESPONSE_COLUMNS = (
+    'id', 'query_id', 'staff_id', 'subject', 'body', 'channel', 'attachment_urls', 'used_template_id',
+    'status_after', 'delivery_status', 'delivered_at', 'created_at',
+)
+
+
+def upgrade():
+    op.create_table(
+        'query_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('customer_name', sa.String(length=100), nullable=False),
+        sa.Column('customer_email', sa.String(length=100), nullable=False),
+        sa.Column('customer_phone', sa.String(length=20), nullable=True),
+        sa.Column('query_type', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('assigned_staff_id', sa.Integer(), nullable=True),
+        sa.Column('priority', sa.String(length=50), nullable=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('sla_deadline', sa.DateTime(), nullable=True),
+        sa.Column('sla_state', sa.String(length=20), nullable=True),
+        sa.Column('response_due_at', sa.DateTime(), nullable=True),
+        sa.Column('first_response_at', sa.DateTime(), nullable=True),
+        sa.Column('resolved_at', sa.DateTime(), nullable=True),
+        sa.Column('escalated_at', sa.DateTime(), nullable=True),
+        sa.Column('escalation_reason', sa.String(length=255), nullable=True),
+        sa.Column('last_contact_channel', sa.String(length=50), nullable=True),
+        sa.Column('last_response_summary', sa.Text(), nullable=True),
+        sa.Column('ticket_number', sa.String(length=20), nullable=True),
+        sa.Column('source', sa.String(length=50), nullable=True),
+        sa.Column('external_id', sa.String(length=100), nullable=True),
+        sa.Column('customer_id', sa.Integer(), nullable=True),
+        sa.Column('tag_names', sa.Text(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_query_archive_ticket_number', 'query_archive', ['ticket_number'], unique=False)
+    op.create_index('ix_query_archive_customer_created', 'query_archive', ['customer_id', 'created_at'], unique=False)
+    op.create_index('ix_query_archive_created_at', 'query_archive', ['created_at'], unique=False)
+
+    op.create_table(
+        'query_response_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('query_id', sa.Integer(), nullable=False),
+        sa.Column('staff_id', sa.Integer(), nullable=True),
+        sa.Column('subject', sa.String(length=200), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('channel', sa.String(length=50), nullable=True),
+        sa.Column('attachment_urls', sa.Text(), nullable=True),
+        sa.Column('used_template_id', sa.Integer(), nullable=True),
+        sa.Column('status_after', sa.String(length=50), nullable=True),
+        sa.Column('delivery_status', sa.String(length=20), nullable=True),
+        sa.Column('delivered_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_query_response_archive_thread', 'query_response_archive',
+                    ['query_id', 'created_at', 'id'], unique=False)
+
+    op.create_table(
+        'archive_run',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('cutoff', sa.DateTime(), nullable=False),
+        sa.Column('batch_size', sa.Integer(), nullable=False),
+        sa.Column('last_query_id', sa.Integer(), nullable=False),
+        sa.Column('archived_count', sa.Integer(), nullable=False),
+        sa.Column('response_count', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Audit rows are kept for archived tickets.  SQLite does not enforce the
+    # constraint (foreign keys are off), so only PostgreSQL drops it.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('query_audit_query_id_fkey', 'query_audit', type_='foreignkey')
+
+
+def downgrade():
+    # Move archived tickets back so no data is lost with the archive tables.
+    bind = op.get_bind()
+    query = sa.table('query', *[sa.column(name) for name in _QUERY_COLUMNS])
+    response = sa.table('query_response', *[sa.column(name) for name in _RESPONSE_COLUMNS])
+    archive = sa.table('query_archive', *[sa.column(name) for name in _QUERY_COLUMNS + ('tag_names',)])
+    response_archive = sa.table('query_response_archive', *[sa.column(name) for name in _RESPONSE_COLUMNS])
+    tag = sa.table('tag', sa.column('id'), sa.column('name'))
+    query_tag = sa.table('query_tag', sa.column('query_id'), sa.column('tag_id'))
+
+    bind.execute(query.insert().from_select(
+        _QUERY_COLUMNS, sa.select(*[archive.c[name] for name in _QUERY_COLUMNS])))
+    bind.execute(response.insert().from_select(
+        _RESPONSE_COLUMNS, sa.select(*[response_archive.c[name] for name in _RESPONSE_COLUMNS])))
+
+    tag_ids = dict(bind.execute(sa.select(tag.c.name, tag.c.id)).all())
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(archive.c.id, archive.c.tag_names)
+            .where(archive.c.id > last_id, archive.c.tag_names != None)  # noqa: E711
+            .order_by(archive.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        links = []
+        for query_id, tag_names in rows:
+            for name in {name for name in tag_names.split(',') if name}:
+                if name not in tag_ids:
+                    tag_ids[name] = bind.execute(tag.insert().values(name=name).returning(tag.c.id)).scalar_one()
+                links.append({'query_id': query_id, 'tag_id': tag_ids[name]})
+        if links:
+            bind.execute(query_tag.insert(), links)
+        last_id = rows[-1][0]
+
+    if bind.dialect.name == 'postgresql':
+        op.create_foreign_key('query_audit_query_id_fkey', 'query_audit', 'query', ['query_id'], ['id'],
+                              ondelete='CASCADE')
+    op.drop_table('archive_run')
+    op.drop_index('ix_query_response_archive_thread', table_name='query_response_archive')
+    op.drop_table('query_response_archive')
+    op.drop_index('ix_query_archive_created_at', table_name='query_archive')
+    op.drop_index('ix_query_archive_customer_created', table_name='query_archive')
+    op.drop_index('ix_query_archive_ticket_number', table_name='query_archive')
+    op.drop_table('query_archive')
+
@@ -0,0 +1,28 @@
+"""Add an idempotency key for write-behind queued queries
+
+Revision ID: e8c1f5a6b749
+Revises: d7b0e4f5a638
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c1f5a6b749'
+down_revision = 'd7b0e4f5a638'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('query', sa.Column('ingest_key', sa.String(length=32), nullable=True))
+    op.create_index('uq_query_ingest_key', 'query', ['ingest_key'], unique=True)
+    op.add_column('query_archive', sa.Column('ingest_key', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    op.drop_column('query_archive', 'ingest_key')
+    op.drop_index('uq_query_ingest_key', table_name='query')
+    op.drop_column('query', 'ingest_key')
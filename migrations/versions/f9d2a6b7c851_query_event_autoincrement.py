@@ -0,0 +1,54 @@
+"""Allocate live inbox event ids from a sequence instead of change_counter
+
+Revision ID: f9d2a6b7c851
+Revises: e8c1f5a6b749
+Create Date: 2026-10-21 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f9d2a6b7c851'
+down_revision = 'e8c1f5a6b749'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # The allocation row becomes the prune watermark: every id up to it is gone.
+    op.execute(
+        "UPDATE change_counter SET name = 'query_event_pruned', "
+        "value = COALESCE((SELECT MIN(id) FROM query_event) - 1, value) WHERE name = 'query_event'"
+    )
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE SEQUENCE query_event_id_seq OWNED BY query_event.id')
+        op.execute(
+            "SELECT setval('query_event_id_seq', GREATEST(COALESCE((SELECT MAX(id) FROM query_event), 0), "
+            "COALESCE((SELECT value FROM change_counter WHERE name = 'query_event_pruned'), 0)) + 1, false)"
+        )
+        op.execute("ALTER TABLE query_event ALTER COLUMN id SET DEFAULT nextval('query_event_id_seq')")
+    else:
+        # SQLite only assigns ids to an INTEGER PRIMARY KEY; rebuild the table.
+        with op.batch_alter_table('query_event', recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+            batch_op.alter_column('id', existing_type=sa.BigInteger(), type_=sa.Integer(),
+                                  autoincrement=True, existing_nullable=False)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('ALTER TABLE query_event ALTER COLUMN id DROP DEFAULT')
+        op.execute('DROP SEQUENCE query_event_id_seq')
+    else:
+        with op.batch_alter_table('query_event', recreate='always') as batch_op:
+            batch_op.alter_column('id', existing_type=sa.Integer(), type_=sa.BigInteger(),
+                                  autoincrement=False, existing_nullable=False)
+    greatest = 'GREATEST' if bind.dialect.name == 'postgresql' else 'MAX'
+    op.execute(
+        "UPDATE change_counter SET name = 'query_event', "
+        f"value = {greatest}(value, COALESCE((SELECT MAX(id) FROM query_event), 0)) WHERE name = 'query_event_pruned'"
+    )
@@ -1,22 +1,231 @@
-import requests
-import time
+"""
+Seed the database with sample packages, their images and events.
+
+Images are fetched by a bounded pool of ``--workers`` threads sharing one
+connection-pooled ``requests`` session.  Each download streams to a
+``.part`` file in ``IMAGE_DIR`` and is renamed to ``<sha256 prefix>.jpg``
+once complete, so identical images are stored once.  ``.seed-images.json``
+in the same directory records which URL produced which file and its hash: a
+re-run skips URLs whose file is present and intact, continues partial
+downloads with an HTTP range request guarded by ``If-Range`` (the ETag or
+Last-Modified recorded beside the ``.part`` file, so a file that changed
+upstream is fetched whole instead of appended to) and retries failures (timeouts,
+connection errors, 429 and 5xx) with exponential backoff, honouring
+``Retry-After``.  Packages that already exist (by title) are left alone,
+so an interrupted seed can simply be run again.
+
+    python seed.py
+    python seed.py --workers 16 --retries 5
+    python seed.py --image-base-url http://127.0.0.1:8000   # serve images from a local stand-in
+"""
+import argparse
+import hashlib
+import json
 import os
-import uuid
-from urllib.parse import urlparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
 from app import create_app, db
 from app.models import Package, Event, User
 
-def download_image(url, save_path):
-    """Download image from URL and save to local path."""
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
-        return True
-    except Exception as e:
-        print(f"Failed to download image from {url}: {e}")
-        return False
+ROOT = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.join(ROOT, 'app', 'static', 'img')
+IMAGE_URL_PREFIX = '/static/img/'
+DEFAULT_IMAGE = '/static/img/default.jpg'
+MANIFEST = '.seed-images.json'
+CHUNK_SIZE = 64 * 1024
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """A download failed; ``retryable`` says whether trying again may help."""
+
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _validator(response):
+    """A strong ``If-Range`` validator for ``response``, or ``None``."""
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After', '')
+    return float(value) if value.isdigit() else None
+
+
+class ImageFetcher:
+    """Concurrent, resumable image downloads into ``directory``."""
+
+    def __init__(self, directory, workers=8, retries=3, backoff=0.5, timeout=10, base_url=None, session=None):
+        self.directory = directory
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.session = session or self._session(workers)
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        self.manifest = self._load_manifest()
+        self.stats = {'downloaded': 0, 'skipped': 0, 'failed': 0, 'resumed': 0, 'retries': 0, 'bytes': 0}
+
+    @staticmethod
+    def _session(workers):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = 'pilgrim-seed/1.0'
+        return session
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        temp = f'{self.manifest_path}.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(temp, self.manifest_path)
+
+    def _source(self, url):
+        """``url``, or the same path and query on ``base_url``."""
+        if not self.base_url:
+            return url
+        parts = urlsplit(url)
+        return self.base_url + parts.path + (f'?{parts.query}' if parts.query else '')
+
+    def _present(self, url):
+        entry = self.manifest.get(url)
+        if not entry:
+            return None
+        path = os.path.join(self.directory, entry['file'])
+        if os.path.exists(path) and _sha256(path) == entry['sha256']:
+            return entry['file']
+        return None
+
+    @staticmethod
+    def _read_validator(path):
+        try:
+            with open(path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _download(self, url):
+        part = os.path.join(self.directory, f".{hashlib.sha1(url.encode('utf-8')).hexdigest()}.part")
+        validator_path = f'{part}.validator'
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        validator = self._read_validator(validator_path) if offset else None
+        # Without a validator the part may belong to an older version of the file.
+        headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if validator else {}
+        try:
+            with self.session.get(self._source(url), headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 416:
+                    # The part file is already complete (or stale): start over.
+                    os.remove(part)
+                    os.remove(validator_path)
+                    raise FetchError('range not satisfiable')
+                if response.status_code in RETRY_STATUSES:
+                    raise FetchError(f'HTTP {response.status_code}', retry_after=_retry_after(response))
+                if response.status_code >= 400:
+                    raise FetchError(f'HTTP {response.status_code}', retryable=False)
+                resumed = bool(headers) and response.status_code == 206
+                if resumed and not response.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+                    os.remove(part)
+                    raise FetchError('unexpected Content-Range')
+                if resumed:
+                    with self.lock:
+                        self.stats['resumed'] += 1
+                else:
+                    # A full body (200): the file is new or changed since the part was written.
+                    validator = _validator(response)
+                    if validator:
+                        with open(validator_path, 'w') as f:
+                            f.write(validator)
+                    elif os.path.exists(validator_path):
+                        os.remove(validator_path)
+                with open(part, 'ab' if resumed else 'wb') as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        with self.lock:
+                            self.stats['bytes'] += len(chunk)
+        except requests.RequestException as exc:
+            raise FetchError(str(exc)) from exc
+        digest = _sha256(part)
+        name = f'{digest[:16]}.jpg'
+        os.replace(part, os.path.join(self.directory, name))
+        if os.path.exists(validator_path):
+            os.remove(validator_path)
+        return name, digest
+
+    def fetch(self, url):
+        """Fetch one URL with retries; return the stored file name or ``None``."""
+        present = self._present(url)
+        if present:
+            with self.lock:
+                self.stats['skipped'] += 1
+            return present
+        for attempt in range(self.retries + 1):
+            try:
+                name, digest = self._download(url)
+            except FetchError as exc:
+                if not exc.retryable or attempt == self.retries:
+                    print(f'\r  failed {url}: {exc}')
+                    with self.lock:
+                        self.stats['failed'] += 1
+                    return None
+                with self.lock:
+                    self.stats['retries'] += 1
+                time.sleep(exc.retry_after or self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+                continue
+            with self.lock:
+                self.manifest[url] = {'file': name, 'sha256': digest}
+                self._save_manifest()
+                self.stats['downloaded'] += 1
+            return name
+
+    def fetch_all(self, urls):
+        """Fetch every distinct URL; return ``{url: file name or None}``."""
+        os.makedirs(self.directory, exist_ok=True)
+        urls = list(dict.fromkeys(urls))
+        results = {}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.fetch, url): url for url in urls}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                print(f'\r  images {done}/{len(urls)}', end='', flush=True)
+        elapsed = time.perf_counter() - started
+        stats = self.stats
+        print(f"\r  images: {stats['downloaded']} downloaded ({stats['bytes'] / 1024:.0f} KB, "
+              f"{stats['resumed']} resumed), {stats['skipped']} already present, {stats['failed']} failed, "
+              f"{stats['retries']} retries in {elapsed:.1f} s")
+        return results
+
 
 def fetch_package_data():
     """Fetch sample pilgrim package data from online sources."""
@@ -107,62 +316,29 @@ def fetch_package_data():
     ]
     return sample_packages
 
-app = create_app()
-
-with app.app_context():
-    # Create admin user (only if not exists)
-    admin = User.query.filter_by(username='admin').first()
-    if not admin:
-        admin = User(username='admin')
-        admin.set_password('admin123')
-        db.session.add(admin)
 
-    # Fetch and seed packages from online sources
-    print("Fetching package data from online sources...")
-    packages_data = fetch_package_data()
+def seed_packages(fetcher):
+    packages_data = [pkg for pkg in fetch_package_data()
+                     if not Package.query.filter_by(title=pkg['title']).first()]
+    if not packages_data:
+        print('Packages already seeded.')
+        return
+    print(f'Fetching images for {len(packages_data)} packages...')
+    urls = [url for pkg in packages_data for url in [pkg['image_url']] + pkg.get('gallery_urls', [])]
+    files = fetcher.fetch_all(urls)
 
     for pkg_data in packages_data:
-        try:
-            print(f"Processing package: {pkg_data['title']}")
-
-            # Download main image
-            image_filename = f"{uuid.uuid4()}.jpg"
-            image_path = os.path.join('pilgrim-packge', 'app', 'static', 'img', image_filename)
-            if download_image(pkg_data['image_url'], image_path):
-                pkg_data['image'] = f'/static/img/{image_filename}'
-            else:
-                pkg_data['image'] = '/static/img/default.jpg'  # fallback
-
-            # Download gallery images
-            gallery_paths = []
-            for gallery_url in pkg_data.get('gallery_urls', []):
-                gallery_filename = f"{uuid.uuid4()}.jpg"
-                gallery_path = os.path.join('pilgrim-packge', 'app', 'static', 'img', gallery_filename)
-                if download_image(gallery_url, gallery_path):
-                    gallery_paths.append(f'/static/img/{gallery_filename}')
-                time.sleep(1)  # Delay to avoid rate limiting
-
-            pkg_data['gallery_images'] = ','.join(gallery_paths)
-
-            # Remove URL keys
-            pkg_data.pop('image_url', None)
-            pkg_data.pop('gallery_urls', None)
-
-            # Create and add package
-            package = Package(**pkg_data)
-            db.session.add(package)
-            db.session.commit()  # Commit each package individually
-            print(f"Successfully added package: {pkg_data['title']}")
-
-            # Delay between packages
-            time.sleep(2)
-
-        except Exception as e:
-            print(f"Error processing package {pkg_data['title']}: {e}")
-            db.session.rollback()
-            continue
-
-    # Seed events (keeping static for now)
+        image_file = files.get(pkg_data.pop('image_url'))
+        pkg_data['image'] = IMAGE_URL_PREFIX + image_file if image_file else DEFAULT_IMAGE
+        pkg_data['gallery_images'] = ','.join(
+            IMAGE_URL_PREFIX + files[url] for url in pkg_data.pop('gallery_urls', []) if files.get(url)
+        )
+        db.session.add(Package(**pkg_data))
+        print(f"Added package: {pkg_data['title']}")
+    db.session.commit()
+
+
+def seed_events():
     events = [
         {
             'title': 'Amarnath Yatra Opening 2025',
@@ -175,12 +351,37 @@ with app.app_context():
     ]
 
     for event_data in events:
-        try:
-            event = Event(**event_data)
-            db.session.add(event)
-        except Exception as e:
-            print(f"Error adding event {event_data['title']}: {e}")
-            continue
-
+        if not Event.query.filter_by(title=event_data['title']).first():
+            db.session.add(Event(**event_data))
     db.session.commit()
-    print("Database seeded successfully!")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the database with sample packages and events.')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent image downloads')
+    parser.add_argument('--retries', type=int, default=3, help='retries per image after the first attempt')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds per connect/read')
+    parser.add_argument('--image-dir', default=IMAGE_DIR)
+    parser.add_argument('--image-base-url', default=os.environ.get('SEED_IMAGE_BASE_URL'),
+                        help='fetch each image path from this server instead (a local stand-in)')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        # Create admin user (only if not exists)
+        admin = User.query.filter_by(username='admin').first()
+        if not admin:
+            admin = User(username='admin')
+            admin.set_password('admin123')
+            db.session.add(admin)
+            db.session.commit()
+
+        fetcher = ImageFetcher(args.image_dir, workers=args.workers, retries=args.retries, timeout=args.timeout,
+                               base_url=args.image_base_url)
+        seed_packages(fetcher)
+        seed_events()
+        print("Database seeded successfully!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+``conversation.load_thread`` paging against a throwaway SQLite database.
+
+    python -m unittest tests.test_conversation
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATABASE = os.path.join(tempfile.mkdtemp(), 'conversation.db')
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{DATABASE}')
+
+from app import conversation, create_app, db  # noqa: E402
+from app.models import Query, QueryResponse  # noqa: E402
+
+
+class LoadThreadTest(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(lazy_admin=False)
+        self.app.config['THREAD_PAGE_SIZE'] = 5
+        self.context = self.app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+        db.create_all()
+        self.addCleanup(db.drop_all)
+        self.addCleanup(db.session.remove)
+        ticket = Query(customer_name='Ali', customer_email='ali@example.com', message='Visa help')
+        db.session.add(ticket)
+        db.session.commit()
+        self.query_id = ticket.id
+
+    def add_responses(self, count):
+        # ``created_at`` comes from the CURRENT_TIMESTAMP default, so responses
+        # written in the same second share it, as they do in production.
+        responses = [QueryResponse(query_id=self.query_id, subject='Re: Visa help', body=f'Reply {number}')
+                     for number in range(1, count + 1)]
+        db.session.add_all(responses)
+        db.session.commit()
+        return [response.id for response in responses]
+
+    def walk(self):
+        pages, before = [], None
+        for _ in range(10):
+            page = conversation.load_thread(self.query_id, before=before)
+            pages.append([response.id for response, *_ in page.entries])
+            if page.older_cursor is None:
+                return pages, page.total
+            before = page.older_cursor
+        self.fail(f'"Load older" never reached the first response: {pages[:3]}')
+
+    def test_walks_a_long_thread_to_its_start(self):
+        ids = self.add_responses(12)
+        pages, total = self.walk()
+        self.assertEqual(total, 12)
+        self.assertEqual(pages, [ids[7:], ids[2:7], ids[:2]])
+
+    def test_single_page_has_no_older_cursor(self):
+        ids = self.add_responses(5)
+        self.assertEqual(self.walk(), ([ids], 5))
+
+    def test_malformed_cursor_returns_the_newest_page(self):
+        ids = self.add_responses(7)
+        page = conversation.load_thread(self.query_id, before='2026-10-19T10:00:00|4')
+        self.assertEqual([response.id for response, *_ in page.entries], ids[2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+``outbox.deliver_batch`` against an aiosmtpd stand-in and a throwaway SQLite database.
+
+    python -m unittest tests.test_outbox
+"""
+import os
+import socket
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATABASE = os.path.join(tempfile.mkdtemp(), 'outbox.db')
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{DATABASE}')
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult, LoginPassword
+except ImportError:  # test-only dependency
+    Controller = None
+
+from app import create_app, db, outbox  # noqa: E402
+from app.models import OutboundEmail, Query, QueryResponse  # noqa: E402
+
+
+class Mailbox:
+    """aiosmtpd handler: refuses ``refused@`` at RCPT and answers DATA with ``data_reply``."""
+
+    def __init__(self):
+        self.messages = []
+        self.data_reply = '250 OK'
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('refused@'):
+            return '550 5.1.1 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.data_reply.startswith('250'):
+            self.messages.append(envelope)
+        return self.data_reply
+
+
+def authenticate(server, session, envelope, mechanism, auth_data):
+    success = isinstance(auth_data, LoginPassword) and auth_data.password == b'secret'
+    # ``handled=False`` makes aiosmtpd answer a failure with 535.
+    return AuthResult(success=success, handled=success)
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+@unittest.skipIf(Controller is None, 'aiosmtpd is not installed')
+class DeliverBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.mailbox = Mailbox()
+        self.smtp = Controller(self.mailbox, hostname='127.0.0.1', port=free_port(),
+                               authenticator=authenticate, auth_require_tls=False)
+        self.smtp.start()
+        self.addCleanup(self.smtp.stop)
+
+        self.app = create_app(lazy_admin=False)
+        self.app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=self.smtp.port, MAIL_USE_TLS=False,
+                               MAIL_USE_SSL=False, MAIL_USERNAME='outbox', MAIL_PASSWORD='secret',
+                               OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_BACKOFF=30)
+        self.config = self.app.config
+        self.context = self.app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+        db.create_all()
+        self.addCleanup(db.drop_all)
+        self.addCleanup(db.session.remove)
+        self.sender = outbox.make_sender(self.config)
+        self.addCleanup(lambda: self.sender.close())
+
+    def queue(self, address='ali@example.com'):
+        ticket = Query(customer_name='Ali', customer_email=address, message='Visa help')
+        response = QueryResponse(query=ticket, subject='Re: Visa help', body='Your visa is ready.')
+        db.session.add_all([ticket, response])
+        email = outbox.queue_query_email(ticket, response, response.subject, response.body)
+        db.session.commit()
+        return email.id
+
+    def reconfigure(self, **settings):
+        self.sender.close()
+        self.config.update(settings)
+        self.sender = outbox.make_sender(self.config)
+
+    def deliver(self):
+        return outbox.deliver_batch(self.sender, self.config)
+
+    def state(self, email_id):
+        db.session.expire_all()
+        email = db.session.get(OutboundEmail, email_id)
+        return email.status, email.attempts, email.query_response.delivery_status
+
+    def make_due(self):
+        OutboundEmail.query.update({'next_attempt_at': datetime.utcnow()})
+        db.session.commit()
+
+    def test_sends_and_writes_back_delivery_status(self):
+        first, second = self.queue(), self.queue('bo@example.com')
+        self.assertEqual(self.deliver()['sent'], 2)
+        self.assertEqual(self.state(first), ('sent', 0, 'sent'))
+        self.assertEqual(self.state(second), ('sent', 0, 'sent'))
+        self.assertEqual([envelope.rcpt_tos for envelope in self.mailbox.messages],
+                         [['ali@example.com'], ['bo@example.com']])
+        self.assertIsNone(self.deliver())
+
+    def test_temporary_rejection_is_retried(self):
+        email_id = self.queue()
+        self.mailbox.data_reply = '451 4.3.0 Try again later'
+        self.assertEqual(self.deliver()['retry'], 1)
+        self.assertEqual(self.state(email_id), ('pending', 1, 'queued'))
+        self.assertIsNone(self.deliver())  # backing off
+
+        self.mailbox.data_reply = '250 OK'
+        self.make_due()
+        self.assertEqual(self.deliver()['sent'], 1)
+        self.assertEqual(self.state(email_id), ('sent', 1, 'sent'))
+
+    def test_dead_letters_after_the_last_attempt(self):
+        email_id = self.queue()
+        self.mailbox.data_reply = '451 4.3.0 Try again later'
+        for _ in range(3):
+            self.make_due()
+            self.deliver()
+        self.assertEqual(self.state(email_id), ('dead', 3, 'failed'))
+
+    def test_refused_recipient_is_dead_lettered(self):
+        refused, accepted = self.queue('refused@example.com'), self.queue()
+        self.assertEqual(self.deliver(), {'sent': 1, 'retry': 0, 'dead': 1, 'deferred': 0})
+        self.assertEqual(self.state(refused), ('dead', 1, 'failed'))
+        self.assertEqual(self.state(accepted), ('sent', 0, 'sent'))
+
+    def test_message_rejected_after_data_is_dead_lettered(self):
+        email_id = self.queue()
+        self.mailbox.data_reply = '554 5.7.1 Message rejected as spam'
+        self.assertEqual(self.deliver()['dead'], 1)
+        self.assertEqual(self.state(email_id), ('dead', 1, 'failed'))
+
+    def test_login_failure_defers_the_batch_without_using_attempts(self):
+        emails = [self.queue(), self.queue('bo@example.com')]
+        self.reconfigure(MAIL_PASSWORD='wrong')
+        for _ in range(5):
+            self.make_due()
+            self.assertEqual(self.deliver()['deferred'], 2)
+        for email_id in emails:
+            self.assertEqual(self.state(email_id), ('pending', 0, 'queued'))
+        self.assertIn('SMTPAuthenticationError', db.session.get(OutboundEmail, emails[0]).last_error)
+
+        self.reconfigure(MAIL_PASSWORD='secret')
+        self.make_due()
+        self.assertEqual(self.deliver()['sent'], 2)
+
+    def test_unreachable_server_defers_the_batch(self):
+        email_id = self.queue()
+        self.reconfigure(MAIL_PORT=free_port())
+        self.assertEqual(self.deliver()['deferred'], 1)
+        self.assertEqual(self.state(email_id), ('pending', 0, 'queued'))
+        self.assertIsNone(self.deliver())  # not due again yet
+
+
+if __name__ == '__main__':
+    unittest.main()
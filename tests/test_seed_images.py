@@ -0,0 +1,169 @@
+"""
+``seed.ImageFetcher`` against a local ``http.server`` stand-in.
+
+    python -m unittest tests.test_seed_images
+"""
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seed import ImageFetcher  # noqa: E402
+
+
+class ImageServer(ThreadingHTTPServer):
+    """Serves ``files`` (path -> bytes) with strong ETags and single byte ranges."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ImageHandler)
+        self.files = {}
+        self.failures = {}  # path -> number of 503s still to send
+        self.requests = []  # (path, Range, If-Range)
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get('Range'), self.headers.get('If-Range')))
+        if server.failures.get(self.path):
+            server.failures[self.path] -= 1
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        start = 0
+        byte_range = self.headers.get('Range')
+        if byte_range and self.headers.get('If-Range') in (None, etag):
+            start = int(byte_range.split('=')[1].split('-')[0])
+        self.send_response(206 if start else 200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'image/jpeg')
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+
+class ImageFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ImageServer()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.addCleanup(self.thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.server.files['/a.jpg'] = os.urandom(200_000)
+        self.server.files['/b.jpg'] = os.urandom(50_000)
+
+    def fetcher(self):
+        return ImageFetcher(self.directory, workers=2, retries=3, backoff=0, timeout=5,
+                            base_url=self.server.base_url)
+
+    def stored(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return f.read()
+
+    def part_of(self, url):
+        return os.path.join(self.directory, f".{hashlib.sha1(url.encode('utf-8')).hexdigest()}.part")
+
+    def test_downloads_then_skips_intact_files(self):
+        urls = ['https://images.example.com/a.jpg', 'https://images.example.com/b.jpg']
+        first = self.fetcher()
+        results = first.fetch_all(urls)
+        self.assertEqual(first.stats['downloaded'], 2)
+        self.assertEqual(self.stored(results[urls[0]]), self.server.files['/a.jpg'])
+
+        again = self.fetcher()
+        self.assertEqual(again.fetch_all(urls), results)
+        self.assertEqual(again.stats['skipped'], 2)
+        self.assertEqual(again.stats['downloaded'], 0)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_resumes_a_partial_download_of_the_same_file(self):
+        url = 'https://images.example.com/a.jpg'
+        body = self.server.files['/a.jpg']
+        part = self.part_of(url)
+        with open(part, 'wb') as f:
+            f.write(body[:80_000])
+        with open(f'{part}.validator', 'w') as f:
+            f.write(f'"{hashlib.md5(body).hexdigest()}"')
+
+        fetcher = self.fetcher()
+        name = fetcher.fetch(url)
+        self.assertEqual(self.stored(name), body)
+        self.assertEqual(fetcher.stats['resumed'], 1)
+        self.assertEqual(fetcher.stats['bytes'], len(body) - 80_000)
+        self.assertEqual(self.server.requests[-1][1], 'bytes=80000-')
+        self.assertFalse(os.path.exists(part) or os.path.exists(f'{part}.validator'))
+
+    def test_refetches_whole_file_when_it_changed_since_the_part(self):
+        url = 'https://images.example.com/a.jpg'
+        old = self.server.files['/a.jpg']
+        part = self.part_of(url)
+        with open(part, 'wb') as f:
+            f.write(old[:80_000])
+        with open(f'{part}.validator', 'w') as f:
+            f.write(f'"{hashlib.md5(old).hexdigest()}"')
+        new = self.server.files['/a.jpg'] = os.urandom(120_000)
+
+        fetcher = self.fetcher()
+        name = fetcher.fetch(url)
+        self.assertEqual(self.stored(name), new)
+        self.assertEqual(fetcher.stats['resumed'], 0)
+        self.assertEqual(fetcher.manifest[url]['sha256'], hashlib.sha256(new).hexdigest())
+
+    def test_part_without_validator_is_not_resumed(self):
+        url = 'https://images.example.com/a.jpg'
+        with open(self.part_of(url), 'wb') as f:
+            f.write(b'stale bytes from an older version')
+
+        fetcher = self.fetcher()
+        name = fetcher.fetch(url)
+        self.assertEqual(self.stored(name), self.server.files['/a.jpg'])
+        self.assertEqual(self.server.requests[-1][1:], (None, None))
+
+    def test_retries_unavailable_responses(self):
+        url = 'https://images.example.com/b.jpg'
+        self.server.failures['/b.jpg'] = 2
+
+        fetcher = self.fetcher()
+        name = fetcher.fetch(url)
+        self.assertEqual(self.stored(name), self.server.files['/b.jpg'])
+        self.assertEqual(fetcher.stats['retries'], 2)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_gives_up_after_the_last_retry(self):
+        self.server.failures['/b.jpg'] = 10
+
+        fetcher = self.fetcher()
+        self.assertIsNone(fetcher.fetch('https://images.example.com/b.jpg'))
+        self.assertEqual(fetcher.stats['failed'], 1)
+        self.assertEqual(len(self.server.requests), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()